@@ -0,0 +1,792 @@
+import os
+import io
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import zipfile
+import argparse
+import tempfile
+import platform
+import datetime
+import contextlib
+import statistics
+import subprocess
+
+# 项目根目录（benchmark.py所在目录）
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 启动耗时预算（毫秒）：导入mod_translator模块的累计耗时不应超过该值
+STARTUP_BUDGET_MS = 150
+
+# 启动时不应被导入的重量级模块，它们应当在首次使用时才导入
+HEAVY_MODULES = ["openai", "requests", "tkinter"]
+
+# 基准测试结果（基线）保存目录
+BASELINE_DIR = os.path.join(ROOT_DIR, ".benchmarks")
+
+# 耗时超过基线该比例时视为性能回退
+REGRESSION_THRESHOLD = 0.2
+
+# 测量翻译示例检索耗时时每批的条目数
+PROMPT_BATCH_SIZE = 40
+
+# translate --fault-mix 使用的模拟API故障组合：各种故障同时出现时所有条目仍应翻译成功
+FAULT_MIX = {"rate_429": 0.1, "rate_500": 0.1, "malformed": 0.05, "drop_keys": 0.02, "truncate": 0.05, "mangle": 0.05}
+
+# 预设的测试规模
+SCALES = {
+    "small": {"mods": 50, "namespaces": 2, "keys": 200, "value_length": 30, "comment_style": "mixed", "zh_mods": 0.3, "zh_keys": 0.5},
+    "medium": {"mods": 250, "namespaces": 2, "keys": 300, "value_length": 40, "comment_style": "mixed", "zh_mods": 0.3, "zh_keys": 0.5},
+    "large": {"mods": 1000, "namespaces": 3, "keys": 300, "value_length": 40, "comment_style": "mixed", "zh_mods": 0.3, "zh_keys": 0.5},
+}
+
+WORDS = ["iron", "copper", "gear", "ingot", "block", "machine", "energy", "crystal", "magic", "storage",
+         "pipe", "fluid", "tank", "furnace", "armor", "sword", "pickaxe", "ore", "dust", "plate",
+         "the", "of", "with", "and", "to", "power", "speed", "upgrade", "module", "portal"]
+PLACEHOLDERS = ["%s", "%d", "%1$s", "§a", "§r", "{0}", "\\n"]
+KEY_PREFIXES = ["item", "block", "entity", "tooltip", "gui", "advancements", "config", "book"]
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+def parse_importtime(stderr_text):
+    """解析 -X importtime 的输出
+
+    Args:
+        stderr_text: 子进程的stderr输出
+
+    Returns:
+        dict: 模块名 -> (自身耗时微秒, 累计耗时微秒)
+    """
+    result = {}
+    for line in stderr_text.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, module_name = match.groups()
+            result[module_name] = (int(self_us), int(cumulative_us))
+    return result
+
+def measure_startup_once(module_name="mod_translator"):
+    """在新的解释器中导入模块一次，返回importtime统计"""
+    cmd = [sys.executable, "-X", "importtime", "-c", f"import {module_name}"]
+    completed = subprocess.run(cmd, cwd=ROOT_DIR, capture_output=True, text=True, encoding="utf-8", errors="replace")
+    if completed.returncode != 0:
+        raise RuntimeError(f"导入 {module_name} 失败:\n{completed.stderr}")
+    return parse_importtime(completed.stderr)
+
+def benchmark_startup(runs=5, budget_ms=STARTUP_BUDGET_MS, top=10):
+    """启动耗时基准测试
+
+    Args:
+        runs: 重复测量次数（取中位数）
+        budget_ms: 耗时预算（毫秒）
+        top: 显示自身耗时最多的前几个模块
+
+    Returns:
+        bool: 是否满足预算且没有提前导入重量级模块
+    """
+    print("\n=== 启动耗时基准测试 ===")
+    print(f"测量次数: {runs}，预算: {budget_ms} ms")
+
+    samples = []
+    last_result = {}
+    for _ in range(runs):
+        last_result = measure_startup_once()
+        if "mod_translator" not in last_result:
+            print("错误: 未能在importtime输出中找到mod_translator")
+            return False
+        samples.append(last_result["mod_translator"][1] / 1000)
+
+    median_ms = statistics.median(samples)
+    print(f"导入耗时: 中位数 {median_ms:.1f} ms，最小 {min(samples):.1f} ms，最大 {max(samples):.1f} ms")
+
+    # 显示自身耗时最多的模块
+    print(f"\n自身耗时最多的 {top} 个模块:")
+    slowest = sorted(last_result.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    for module_name, (self_us, cumulative_us) in slowest:
+        print(f"  - {module_name}: {self_us / 1000:.1f} ms（累计 {cumulative_us / 1000:.1f} ms）")
+
+    ok = True
+    eager_heavy = [name for name in HEAVY_MODULES if name in last_result]
+    if eager_heavy:
+        print(f"\n失败: 启动时导入了重量级模块: {', '.join(eager_heavy)}")
+        ok = False
+
+    if median_ms > budget_ms:
+        print(f"\n失败: 导入耗时 {median_ms:.1f} ms 超出预算 {budget_ms} ms")
+        ok = False
+
+    if ok:
+        print(f"\n通过: 导入耗时在预算内（{median_ms:.1f} / {budget_ms} ms）")
+    return ok
+
+def _random_value(rng, length):
+    """生成长度约为length的英文值，偶尔包含占位符和格式代码"""
+    words = []
+    while sum(len(word) + 1 for word in words) < length:
+        words.append(rng.choice(WORDS))
+    if rng.random() < 0.15:
+        words.insert(rng.randrange(len(words) + 1), rng.choice(PLACEHOLDERS))
+    return " ".join(words).capitalize()
+
+def _render_lang_json(data, comment_style, rng):
+    """把语言数据渲染为JSON文本，按需插入注释"""
+    if comment_style == "mixed":
+        comment_style = rng.choice(["none", "line", "block"])
+    if comment_style == "none":
+        return json.dumps(data, ensure_ascii=False, indent=2)
+    
+    lines = ["{"]
+    items = list(data.items())
+    for i, (key, value) in enumerate(items):
+        if i % 25 == 0:
+            lines.append("  // section %d" % (i // 25) if comment_style == "line" else "  /* section %d */" % (i // 25))
+        comma = "," if i < len(items) - 1 else ""
+        lines.append(f"  {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)}{comma}")
+    lines.append("}")
+    return "\n".join(lines)
+
+def generate_modpack(output_dir, mods=50, namespaces=2, keys=200, value_length=30, comment_style="mixed",
+                     zh_mods=0.3, zh_keys=0.5, seed=42):
+    """生成合成的mod文件，用于可重复的基准测试
+    
+    Args:
+        output_dir: 输出目录
+        mods: mod数量
+        namespaces: 每个mod的命名空间数量
+        keys: 每个命名空间的键数量
+        value_length: 英文值的平均长度（字符）
+        comment_style: 语言文件中的注释风格（none/line/block/mixed）
+        zh_mods: 带有部分中文翻译的mod比例
+        zh_keys: 这些mod中已翻译的键比例
+        seed: 随机种子，相同参数和种子生成完全相同的文件
+        
+    Returns:
+        list: 生成的mod文件路径
+    """
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    mod_paths = []
+    
+    for mod_index in range(mods):
+        mod_path = os.path.join(output_dir, f"synthetic_mod_{mod_index:04d}-1.0.jar")
+        has_zh = rng.random() < zh_mods
+        with zipfile.ZipFile(mod_path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+            zip_ref.writestr("META-INF/MANIFEST.MF", "Manifest-Version: 1.0\n")
+            for ns_index in range(namespaces):
+                namespace = f"synmod{mod_index:04d}" + (f"_{ns_index}" if ns_index else "")
+                en_data = {}
+                for key_index in range(keys):
+                    prefix = KEY_PREFIXES[key_index % len(KEY_PREFIXES)]
+                    en_data[f"{prefix}.{namespace}.entry_{key_index}"] = _random_value(rng, value_length)
+                zip_ref.writestr(f"assets/{namespace}/lang/en_us.json", _render_lang_json(en_data, comment_style, rng))
+                
+                if has_zh:
+                    zh_data = {key: "译文" + value[:10] for key, value in en_data.items() if rng.random() < zh_keys}
+                    zip_ref.writestr(f"assets/{namespace}/lang/zh_cn.json", _render_lang_json(zh_data, "none", rng))
+        mod_paths.append(mod_path)
+    
+    return mod_paths
+
+@contextlib.contextmanager
+def _benchmark_workspace():
+    """在临时目录中运行（带有无需交互的配置文件），结束后恢复工作目录并清理"""
+    previous_cwd = os.getcwd()
+    workspace = tempfile.mkdtemp(prefix="mod_translator_bench_")
+    try:
+        os.chdir(workspace)
+        with open("config.json", 'w', encoding='utf-8') as f:
+            json.dump({"api_url": "http://127.0.0.1/v1", "api_key": "benchmark", "model_id": "benchmark",
+                       "wait_time": 0, "batch_size": 40, "auto_check_update": False}, f)
+        yield workspace
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workspace, ignore_errors=True)
+
+def _fill_fake_translations(translator):
+    """把待翻译条目的原文作为翻译结果写入工作数据库，使合并阶段有数据可处理"""
+    results_by_path = {}
+    for entry_id, rel_path, _, value, _, _ in translator.store.pending_entries():
+        results_by_path.setdefault(rel_path, {})[entry_id] = value
+    for rel_path, results in results_by_path.items():
+        translator.store.record_batch({rel_path: len(results)}, "benchmark", "done", len(results), results=results)
+
+def _timed(func, *args, **kwargs):
+    """运行函数并返回耗时（秒），屏蔽其输出"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        return time.perf_counter() - start
+
+def run_suite_once(params, seed=42):
+    """生成一次合成modpack并测量各个处理阶段的耗时"""
+    sys.path.insert(0, ROOT_DIR)
+    import mod_translator
+    
+    timings = {}
+    with _benchmark_workspace() as workspace:
+        mod_paths = generate_modpack(os.path.join(workspace, "mods"), seed=seed, **params)
+        
+        with contextlib.redirect_stdout(io.StringIO()):
+            translator = mod_translator.ModTranslator()
+        translator.selected_mods = mod_paths
+        
+        timings["process_mods"] = _timed(translator.process_mods)
+        
+        mod_info = translator.store.load_mods()
+        timings["organize_translation_files"] = _timed(translator._organize_translation_files, mod_info)
+        
+        # 单独再整理一次记录峰值内存（tracemalloc会影响耗时，不计入上面的耗时）
+        translator.config.set("measure_peak_memory", True)
+        _timed(translator._organize_translation_files, mod_info)
+        translator.config.set("measure_peak_memory", False)
+        organize_peak_memory = translator.metrics.stages.get("organize", {}).get("peak_memory", 0)
+        
+        # 从工作数据库中查询全部待翻译条目（翻译开始时的队列）
+        timings["pending_entries"] = _timed(translator.store.pending_entries)
+        all_pending = translator.store.pending_entries()
+        
+        _fill_fake_translations(translator)
+        timings["merge_translations"] = _timed(translator.merge_translations)
+        timings["create_output_zip"] = _timed(translator._create_output_zip)
+        
+        # 翻译记忆中有上一个modpack的全部译文时，整理另一个modpack（原文用词相同）并为每批待翻译条目检索翻译示例
+        translator.memory.add((value, "译" + value, "ai") for _, _, _, value, _, _ in all_pending)
+        other_paths = generate_modpack(os.path.join(workspace, "other_mods"), seed=seed + 1, **params)
+        translator.selected_mods = other_paths
+        shutil.rmtree(translator.snapshot_dir, ignore_errors=True)
+        _timed(translator.process_mods)
+        other_info = translator.store.load_mods()
+        timings["organize_with_memory"] = _timed(translator._organize_translation_files, other_info)
+        
+        other_pending = [{"key": key, "value": value} for _, _, key, value, _, _ in translator.store.pending_entries()]
+        batches = [other_pending[start:start + PROMPT_BATCH_SIZE] for start in range(0, len(other_pending), PROMPT_BATCH_SIZE)]
+        timings["prompt_examples"] = _timed(lambda: [translator._select_prompt_examples(batch) for batch in batches])
+        
+        sizes = {
+            "mod_files": len(mod_paths),
+            "pending_entries": len(all_pending),
+            "mod_bytes": sum(os.path.getsize(path) for path in mod_paths),
+            "organize_peak_memory": organize_peak_memory,
+            "memory_records": len(translator.memory),
+            "memory_pending_entries": len(other_pending)
+        }
+        translator.store.close()
+    
+    return timings, sizes
+
+def _baseline_path(name):
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+def compare_with_baseline(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """与基线比较，返回发生回退的项目列表"""
+    regressions = []
+    for name, seconds in results["timings"].items():
+        previous = baseline.get("timings", {}).get(name)
+        if not previous:
+            continue
+        change = (seconds - previous) / previous
+        marker = ""
+        if change > threshold:
+            marker = "  <- 回退"
+            regressions.append(name)
+        print(f"  - {name}: {previous:.3f}s -> {seconds:.3f}s ({change * 100:+.1f}%){marker}")
+    return regressions
+
+def benchmark_suite(scale="small", overrides=None, repeat=3, seed=42, save_baseline=False, threshold=REGRESSION_THRESHOLD):
+    """处理流程基准测试
+    
+    Args:
+        scale: 预设规模（small/medium/large）
+        overrides: 覆盖预设规模的参数
+        repeat: 重复次数（每项取中位数）
+        seed: 随机种子
+        save_baseline: 是否把本次结果保存为新的基线
+        threshold: 判定为回退的耗时增加比例
+        
+    Returns:
+        bool: 是否没有发生回退
+    """
+    params = dict(SCALES[scale])
+    params.update({key: value for key, value in (overrides or {}).items() if value is not None})
+    name = f"suite_{scale}" if not overrides or all(value is None for value in overrides.values()) else \
+        "suite_" + "_".join(f"{key}{value}" for key, value in sorted(params.items()))
+    
+    print("\n=== 处理流程基准测试 ===")
+    print("参数: " + ", ".join(f"{key}={value}" for key, value in params.items()) + f", seed={seed}, repeat={repeat}")
+    
+    samples = {}
+    sizes = {}
+    for run in range(repeat):
+        timings, sizes = run_suite_once(params, seed)
+        for stage, seconds in timings.items():
+            samples.setdefault(stage, []).append(seconds)
+        print(f"第 {run + 1}/{repeat} 次: " + ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in timings.items()))
+    
+    results = {
+        "name": name,
+        "params": params,
+        "seed": seed,
+        "repeat": repeat,
+        "sizes": sizes,
+        "timings": {stage: statistics.median(values) for stage, values in samples.items()},
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds")
+    }
+    
+    print(f"\n中位数耗时（{sizes.get('mod_files', 0)} 个mod，{sizes.get('pending_entries', 0)} 个待翻译条目）:")
+    for stage, seconds in results["timings"].items():
+        print(f"  - {stage}: {seconds:.3f}s")
+    print(f"整理翻译文件的峰值内存: {sizes.get('organize_peak_memory', 0) / 1024 / 1024:.1f} MB")
+    print(f"翻译记忆: {sizes.get('memory_records', 0)} 条记录，第二个modpack有 {sizes.get('memory_pending_entries', 0)} 个待翻译条目")
+    
+    ok = True
+    baseline_path = _baseline_path(name)
+    if os.path.exists(baseline_path):
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n与基线比较（{baseline.get('created_at', '未知时间')}）:")
+        regressions = compare_with_baseline(results, baseline, threshold)
+        if regressions:
+            print(f"\n失败: {len(regressions)} 项耗时比基线增加超过 {threshold * 100:.0f}%: {', '.join(regressions)}")
+            ok = False
+    else:
+        print("\n尚无基线，使用 --save-baseline 保存本次结果作为基线")
+    
+    if save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+        print(f"已保存基线: {baseline_path}")
+    
+    return ok
+
+def benchmark_translate(scale="small", overrides=None, seed=42, mock_options=None):
+    """使用本地模拟API测量翻译阶段的吞吐量（不产生任何费用）
+    
+    Args:
+        scale: 预设规模（small/medium/large）
+        overrides: 覆盖预设规模的参数
+        seed: 随机种子
+        mock_options: 模拟API的行为选项，见mock_api_server.DEFAULT_OPTIONS
+        
+    Returns:
+        bool: 是否所有条目都翻译成功
+    """
+    sys.path.insert(0, ROOT_DIR)
+    import mod_translator
+    import mock_api_server
+    
+    params = dict(SCALES[scale])
+    params.update({key: value for key, value in (overrides or {}).items() if value is not None})
+    mock_options = {key: value for key, value in (mock_options or {}).items() if value is not None}
+    
+    print("\n=== 翻译吞吐量基准测试（模拟API） ===")
+    print("参数: " + ", ".join(f"{key}={value}" for key, value in params.items()) + f", seed={seed}")
+    if mock_options:
+        print("模拟API: " + ", ".join(f"{key}={value}" for key, value in mock_options.items()))
+    
+    server = mock_api_server.start_mock_server(seed=seed, **mock_options)
+    try:
+        with _benchmark_workspace():
+            mod_paths = generate_modpack(os.path.join(os.getcwd(), "mods"), seed=seed, **params)
+            with contextlib.redirect_stdout(io.StringIO()):
+                translator = mod_translator.ModTranslator()
+                translator.config.set("api_url", server.base_url)
+                translator.selected_mods = mod_paths
+                translator.process_mods()
+            
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                start = time.perf_counter()
+                ok = translator.translate_with_ai()
+                elapsed = time.perf_counter() - start
+            
+            report = translator.metrics.to_report()
+            mock_stats = server.state.stats
+            failed = translator.store.status_counts().get("pending", 0)
+            translator.store.close()
+    finally:
+        server.shutdown()
+    
+    translated = report["stages"].get("translate", {}).get("entries", 0)
+    api = report.get("api", {})
+    print(f"\n耗时: {elapsed:.2f}s，已翻译条目: {translated}（{translated / elapsed if elapsed else 0:.1f} 条/秒）")
+    print(f"API请求: {mock_stats['requests']} 次，最大并发: {mock_stats['max_in_flight']}，"
+          f"状态码: {', '.join(f'{code}×{count}' for code, count in sorted(mock_stats['status'].items()))}")
+    if api.get("latency"):
+        latency = api["latency"]
+        print(f"请求延迟: p50 {latency['p50']:.3f}s，p90 {latency['p90']:.3f}s，p99 {latency['p99']:.3f}s")
+    print(f"注入的故障: 格式错误 {mock_stats['malformed']}，遗漏键 {mock_stats['dropped_keys']}，截断 {mock_stats['truncated']}，占位符丢失 {mock_stats['mangled']}")
+    print(f"token: 输入 {api.get('prompt_tokens', 0)}，输出 {api.get('completion_tokens', 0)}（{api.get('tokens_per_second', 0):.1f} token/秒）")
+    batch_sizes = [batch["entries"] for batch in report.get("batches", [])]
+    if batch_sizes:
+        print(f"批次大小: 首批 {batch_sizes[0]}，末批 {batch_sizes[-1]}，最大 {max(batch_sizes)}")
+    
+    if failed:
+        print(f"\n{failed} 个条目翻译失败")
+    return bool(ok) and not failed
+
+def benchmark_download(size_mb=8, drop_after_mb=1, seed=42):
+    """使用本地模拟的下载服务器测试更新下载的断点续传和SHA-256校验
+    
+    依次检查：连接每发送drop_after_mb就断开时能否续传完成并通过校验；上次中断留下的.downloading文件
+    能否在下次下载时继续；服务器不支持Range时能否重新下载；SHA-256不一致的文件是否被拒绝并删除。
+    
+    Args:
+        size_mb: 模拟的更新文件大小（MB）
+        drop_after_mb: 每个响应最多发送的数据量（MB）
+        seed: 随机种子
+        
+    Returns:
+        bool: 是否所有检查都通过
+    """
+    sys.path.insert(0, ROOT_DIR)
+    import hashlib
+    import mod_translator
+    import mock_api_server
+    
+    payload = random.Random(seed).randbytes(int(size_mb * 1024 * 1024))
+    sha256 = hashlib.sha256(payload).hexdigest()
+    drop_after = int(drop_after_mb * 1024 * 1024)
+    
+    print("\n=== 更新下载测试（模拟下载服务器） ===")
+    print(f"参数: size_mb={size_mb}, drop_after_mb={drop_after_mb}, seed={seed}")
+    
+    def run(name, server, expect_ok, expected_sha256=sha256, prepare=None):
+        with _benchmark_workspace():
+            save_path = os.path.join(os.getcwd(), "update.exe")
+            if prepare:
+                prepare(save_path, server)
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                start = time.perf_counter()
+                ok = mod_translator.download_file(server.url, save_path, expected_sha256=expected_sha256)
+                elapsed = time.perf_counter() - start
+            if ok:
+                with open(save_path, 'rb') as f:
+                    ok = f.read() == payload
+            leftover = os.path.exists(f"{save_path}.downloading")
+        server.shutdown()
+        
+        passed = ok == expect_ok and not (not expect_ok and leftover)
+        stats = server.stats
+        print(f"  - {name}: {'通过' if passed else '失败'}（{elapsed:.2f}s，请求 {stats['requests']} 次，续传 {stats['resumed']} 次，"
+              f"发送 {stats['bytes_sent'] / 1024 / 1024:.1f}MB）")
+        if not passed:
+            print("    " + output.getvalue().strip().replace("\n", "\n    "))
+        return passed
+    
+    def leave_partial(save_path, server):
+        # 模拟上次运行中断：已下载一半，并记录了服务器的文件标识
+        with open(f"{save_path}.downloading", 'wb') as f:
+            f.write(payload[:len(payload) // 2])
+        with open(f"{save_path}.downloading.json", 'w', encoding='utf-8') as f:
+            json.dump({"url": server.url, "etag": server.etag, "last_modified": None, "total": len(payload)}, f)
+    
+    results = [
+        run("连接多次中断后续传", mock_api_server.start_mock_file_server(payload, drop_after=drop_after), True),
+        run("继续上次中断的下载", mock_api_server.start_mock_file_server(payload), True, prepare=leave_partial),
+        run("服务器不支持Range", mock_api_server.start_mock_file_server(payload, supports_range=False), True,
+            prepare=leave_partial),
+        run("SHA-256不一致时拒绝", mock_api_server.start_mock_file_server(payload), False, expected_sha256="0" * 64),
+    ]
+    return all(results)
+
+def benchmark_update_check(delay=0.5, timeout=1.0):
+    """使用本地模拟的版本信息服务器测试后台检查更新
+    
+    依次检查：首次检查在后台请求、start()不阻塞，结果由主线程通过take_pending_update取出（只取出一次）；
+    缓存未过期时不再请求；缓存过期后重新请求并取得新的版本信息；服务器无法连接或超过超时时间仍未响应时，
+    start()同样不阻塞、检查在超时后结束、不抛出异常也不报告新版本。
+    
+    Args:
+        delay: 模拟服务器的响应延迟（秒）
+        timeout: 检查更新的请求超时时间（秒），无响应的检查使用比它长的延迟
+        
+    Returns:
+        bool: 是否所有检查都通过
+    """
+    sys.path.insert(0, ROOT_DIR)
+    import socket
+    import mod_translator
+    import mock_api_server
+    
+    ttl = 3600
+    start_budget = 0.05  # start()返回的最长耗时（秒）
+    newer = "999.0.0"
+    
+    print("\n=== 后台检查更新测试（模拟版本信息服务器） ===")
+    print(f"参数: delay={delay}, timeout={timeout}, ttl={ttl}")
+    
+    def check(checker):
+        # 启动后台检查，模拟主菜单在检查结束前后各取一次结果
+        start = time.perf_counter()
+        checker.start()
+        start_time = time.perf_counter() - start
+        early = checker.take_pending_update()
+        finished = checker.wait(timeout + delay + 5)
+        total_time = time.perf_counter() - start
+        update = checker.take_pending_update()
+        again = checker.take_pending_update()
+        return {"start_time": start_time, "early": early, "finished": finished, "total_time": total_time,
+                "version": update.get("version") if update else None, "again": again}
+    
+    def report(name, passed, result, server=None, extra=""):
+        requests = f"，请求 {server.stats['requests']} 次" if server else ""
+        print(f"  - {name}: {'通过' if passed else '失败'}（start() {result['start_time'] * 1000:.1f}ms，"
+              f"检查耗时 {result['total_time']:.2f}s{requests}，新版本 {result['version'] or '无'}{extra}）")
+        return passed
+    
+    results = []
+    with _benchmark_workspace() as workspace:
+        cache_path = os.path.join(workspace, "update_cache.json")
+        server = mock_api_server.start_mock_version_server({"version": newer, "release_date": "2099-01-01"}, delay=delay)
+        
+        # 首次检查：请求在后台进行，检查结束前主线程取不到结果，结束后只取到一次
+        result = check(mod_translator.UpdateChecker(cache_path, ttl, url=server.url, timeout=timeout + delay))
+        passed = (result["start_time"] < start_budget and result["early"] is None and result["finished"]
+                  and result["version"] == newer and result["again"] is None and server.stats["requests"] == 1)
+        results.append(report("首次检查（后台请求，主线程取得结果）", passed, result, server))
+        
+        # 缓存未过期：不再请求
+        result = check(mod_translator.UpdateChecker(cache_path, ttl, url=server.url, timeout=timeout + delay))
+        passed = result["finished"] and result["version"] == newer and server.stats["requests"] == 1
+        results.append(report("缓存未过期时使用缓存", passed, result, server))
+        
+        # 缓存过期：重新请求，取得服务器上新的版本信息
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        cache["checked_at"] -= ttl + 1
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        server.version_info = {"version": "999.1.0", "release_date": "2099-02-01"}
+        result = check(mod_translator.UpdateChecker(cache_path, ttl, url=server.url, timeout=timeout + delay))
+        passed = result["finished"] and result["version"] == "999.1.0" and server.stats["requests"] == 2
+        results.append(report("缓存过期后重新请求", passed, result, server))
+        server.shutdown()
+        
+        # 无法连接：使用刚释放的本地端口（连接被拒绝）
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            closed_url = f"http://127.0.0.1:{sock.getsockname()[1]}/version.json"
+        try:
+            result = check(mod_translator.UpdateChecker(os.path.join(workspace, "unreachable.json"), ttl, url=closed_url,
+                                                        timeout=timeout))
+            passed = result["start_time"] < start_budget and result["finished"] and result["version"] is None
+        except Exception as e:
+            print(f"    抛出了异常: {e}")
+            result, passed = {"start_time": 0, "total_time": 0, "version": None}, False
+        results.append(report("无法连接时不阻塞、不抛出异常", passed, result))
+        
+        # 服务器无响应：超时后结束
+        slow_server = mock_api_server.start_mock_version_server({"version": newer}, delay=timeout + 2)
+        result = check(mod_translator.UpdateChecker(os.path.join(workspace, "slow.json"), ttl, url=slow_server.url, timeout=timeout))
+        passed = (result["start_time"] < start_budget and result["finished"] and result["version"] is None
+                  and result["total_time"] < timeout + 1)
+        results.append(report("服务器无响应时超时结束", passed, result, slow_server))
+        slow_server.shutdown()
+    return all(results)
+
+def _replace_jar_text(jar_path, old_value, new_value):
+    """把mod文件中英文语言文件里的一个值替换为新的值（模拟mod更新）"""
+    with zipfile.ZipFile(jar_path, 'r') as zip_ref:
+        files = {info.filename: zip_ref.read(info) for info in zip_ref.infolist()}
+    old_text = json.dumps(old_value, ensure_ascii=False)
+    for name, data in files.items():
+        if name.endswith("/en_us.json") and old_text in data.decode("utf-8"):
+            files[name] = data.decode("utf-8").replace(old_text, json.dumps(new_value, ensure_ascii=False)).encode("utf-8")
+    with zipfile.ZipFile(jar_path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        for name, data in files.items():
+            zip_ref.writestr(name, data)
+
+def benchmark_incremental(seed=42):
+    """检查mod更新后原文发生变化的条目会重新进入翻译队列
+    
+    依次检查：监视模式下mod更新后，原文变化的已翻译条目重新等待翻译、原文未变化的条目保留译文；
+    合并后通过菜单重新处理时同样如此；条目正由其他工作进程翻译时，旧原文的译文不会被保存。
+    
+    Args:
+        seed: 随机种子
+        
+    Returns:
+        bool: 是否所有检查都通过
+    """
+    sys.path.insert(0, ROOT_DIR)
+    import mod_translator
+    
+    print("\n=== 增量处理检查（mod更新后原文变化的条目） ===")
+    results = []
+    with _benchmark_workspace() as workspace:
+        mod_paths = generate_modpack(os.path.join(workspace, "mods"), mods=3, keys=30, zh_mods=0, seed=seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            translator = mod_translator.ModTranslator()
+            translator.selected_mods = mod_paths
+            translator.process_mods()
+            results_by_path = {}
+            for entry_id, rel_path, _, value, _, _ in translator.store.pending_entries():
+                results_by_path.setdefault(rel_path, {})[entry_id] = "译" + value
+            for rel_path, path_results in results_by_path.items():
+                translator.store.record_batch({rel_path: len(path_results)}, "benchmark", "done", len(path_results), results=path_results)
+        store = translator.store
+        
+        def namespace_of(jar_path):
+            return "synmod" + re.match(r"synthetic_mod_(\d+)", os.path.basename(jar_path)).group(1)
+        
+        def entries_of(jar_path):
+            return store.query("SELECT id, key, source, status, result FROM entries WHERE key LIKE ? ORDER BY id",
+                               (f"%.{namespace_of(jar_path)}.%",))
+        
+        def change_values(jar_path, count):
+            # 修改没有转义字符的值，返回被修改的键
+            rows = [row for row in entries_of(jar_path) if "\\" not in row[2]][:count]
+            for _, _, source, _, _ in rows:
+                _replace_jar_text(jar_path, json.loads(source), json.loads(source) + " Mk2")
+            return {row[1] for row in rows}
+        
+        def check(name, jar_path, changed_keys):
+            rows = entries_of(jar_path)
+            stale = [row[1] for row in rows if row[1] in changed_keys and (row[3] != mod_translator.WorkStore.PENDING or row[4] is not None)]
+            lost = [row[1] for row in rows if row[1] not in changed_keys
+                    and row[3] not in (mod_translator.WorkStore.TRANSLATED, mod_translator.WorkStore.RESOLVED)]
+            passed = not stale and not lost and len(changed_keys) > 0
+            print(f"  - {name}: {'通过' if passed else '失败'}（修改 {len(changed_keys)} 个条目，"
+                  f"仍保留旧译文 {len(stale)} 个，未变化却丢失译文 {len(lost)} 个）")
+            results.append(passed)
+        
+        # 监视模式：检测到mod文件更新
+        changed_keys = change_values(mod_paths[0], 3)
+        with contextlib.redirect_stdout(io.StringIO()):
+            translator._apply_mod_changes([], [mod_paths[0]], [])
+        check("监视模式下mod更新", mod_paths[0], changed_keys)
+        
+        # 菜单：合并后重新处理全部mod（未变化的条目沿用合并时保存的译文）
+        with contextlib.redirect_stdout(io.StringIO()):
+            translator.merge_translations()
+        changed_keys = change_values(mod_paths[1], 3)
+        with contextlib.redirect_stdout(io.StringIO()):
+            translator.process_mods()
+        check("重新处理mod文件", mod_paths[1], changed_keys)
+        
+        # 正在由其他工作进程翻译的条目：原文变化后旧原文的译文被丢弃
+        rows, _ = store.claim_entries("other-worker", 1000, 60)
+        entry_id, rel_path, key, source = rows[0][:4]
+        jar_path = next(path for path in mod_paths if f".{namespace_of(path)}." in key)
+        _replace_jar_text(jar_path, source, source + " v2")
+        with contextlib.redirect_stdout(io.StringIO()):
+            translator._apply_mod_changes([], [jar_path], [])
+        stored = store.record_batch({rel_path: 1}, "benchmark", "done", 1, results={entry_id: "旧译文"}, owner="other-worker")
+        passed = stored == 0 and store.query("SELECT status FROM entries WHERE id = ?", (entry_id,))[0][0] == mod_translator.WorkStore.PENDING
+        print(f"  - 翻译期间原文变化: {'通过' if passed else '失败'}（保存了 {stored} 个旧原文的译文）")
+        results.append(passed)
+        store.close()
+    return all(results)
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="Minecraft模组汉化工具基准测试")
+    subparsers = parser.add_subparsers(dest="command")
+
+    startup_parser = subparsers.add_parser("startup", help="使用 -X importtime 测量启动耗时")
+    startup_parser.add_argument("--runs", type=int, default=5, help="测量次数")
+    startup_parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS, help="耗时预算（毫秒）")
+
+    def add_modpack_arguments(sub_parser):
+        sub_parser.add_argument("--mods", type=int, help="mod数量")
+        sub_parser.add_argument("--namespaces", type=int, help="每个mod的命名空间数量")
+        sub_parser.add_argument("--keys", type=int, help="每个命名空间的键数量")
+        sub_parser.add_argument("--value-length", type=int, help="英文值的平均长度")
+        sub_parser.add_argument("--comment-style", choices=["none", "line", "block", "mixed"], help="语言文件的注释风格")
+        sub_parser.add_argument("--zh-mods", type=float, help="带有部分中文翻译的mod比例")
+        sub_parser.add_argument("--zh-keys", type=float, help="这些mod中已翻译的键比例")
+        sub_parser.add_argument("--seed", type=int, default=42, help="随机种子")
+
+    generate_parser = subparsers.add_parser("generate", help="生成合成的mod文件")
+    generate_parser.add_argument("output_dir", help="输出目录")
+    generate_parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="预设规模")
+    add_modpack_arguments(generate_parser)
+
+    suite_parser = subparsers.add_parser("suite", help="在合成modpack上测量各处理阶段的耗时")
+    suite_parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="预设规模")
+    suite_parser.add_argument("--repeat", type=int, default=3, help="重复次数（取中位数）")
+    suite_parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    suite_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="判定为回退的耗时增加比例")
+    add_modpack_arguments(suite_parser)
+
+    translate_parser = subparsers.add_parser("translate", help="使用本地模拟API测量翻译吞吐量")
+    translate_parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="预设规模")
+    translate_parser.add_argument("--latency", help="模拟API的延迟分布，例如 uniform:0.05,0.2")
+    translate_parser.add_argument("--rate-429", type=float, help="模拟API返回429的概率")
+    translate_parser.add_argument("--rate-500", type=float, help="模拟API返回500的概率")
+    translate_parser.add_argument("--malformed", type=float, help="模拟API返回无法解析的JSON的概率")
+    translate_parser.add_argument("--drop-keys", type=float, help="模拟API遗漏每个键的概率")
+    translate_parser.add_argument("--truncate", type=float, help="模拟API返回被截断内容的概率")
+    translate_parser.add_argument("--mangle", type=float, help="模拟API删除值中占位符的概率")
+    translate_parser.add_argument("--fault-mix", action="store_true",
+                                  help="同时注入限流、服务器错误、格式错误、遗漏键、截断和占位符丢失（单独指定的故障选项优先），有条目翻译失败时返回非零退出码")
+    add_modpack_arguments(translate_parser)
+
+    download_parser = subparsers.add_parser("download", help="使用本地模拟的下载服务器测试更新下载的断点续传和校验")
+    download_parser.add_argument("--size-mb", type=int, default=8, help="模拟的更新文件大小（MB）")
+    download_parser.add_argument("--drop-after-mb", type=int, default=1, help="每个响应最多发送的数据量（MB），超过后断开连接")
+    download_parser.add_argument("--seed", type=int, default=42, help="随机种子")
+
+    incremental_parser = subparsers.add_parser("incremental", help="检查mod更新后原文变化的条目重新进入翻译队列")
+    incremental_parser.add_argument("--seed", type=int, default=42, help="随机种子")
+
+    update_check_parser = subparsers.add_parser("update-check", help="使用本地模拟的版本信息服务器测试后台检查更新")
+    update_check_parser.add_argument("--delay", type=float, default=0.5, help="模拟服务器的响应延迟（秒）")
+    update_check_parser.add_argument("--timeout", type=float, default=1.0, help="检查更新的请求超时时间（秒）")
+
+    args = parser.parse_args()
+
+    if args.command == "startup":
+        ok = benchmark_startup(runs=args.runs, budget_ms=args.budget_ms)
+    elif args.command == "download":
+        ok = benchmark_download(args.size_mb, args.drop_after_mb, args.seed)
+    elif args.command == "incremental":
+        ok = benchmark_incremental(args.seed)
+    elif args.command == "update-check":
+        ok = benchmark_update_check(args.delay, args.timeout)
+    elif args.command in ("generate", "suite", "translate"):
+        overrides = {
+            "mods": args.mods,
+            "namespaces": args.namespaces,
+            "keys": args.keys,
+            "value_length": args.value_length,
+            "comment_style": args.comment_style,
+            "zh_mods": args.zh_mods,
+            "zh_keys": args.zh_keys
+        }
+        if args.command == "translate":
+            mock_options = {
+                "latency": args.latency,
+                "rate_429": args.rate_429,
+                "rate_500": args.rate_500,
+                "malformed": args.malformed,
+                "drop_keys": args.drop_keys,
+                "truncate": args.truncate,
+                "mangle": args.mangle
+            }
+            if args.fault_mix:
+                mock_options = {key: FAULT_MIX.get(key) if value is None else value for key, value in mock_options.items()}
+            ok = benchmark_translate(args.scale, overrides, args.seed, mock_options)
+        elif args.command == "generate":
+            params = dict(SCALES[args.scale])
+            params.update({key: value for key, value in overrides.items() if value is not None})
+            mod_paths = generate_modpack(args.output_dir, seed=args.seed, **params)
+            print(f"已在 {args.output_dir} 生成 {len(mod_paths)} 个mod文件")
+            ok = True
+        else:
+            ok = benchmark_suite(args.scale, overrides, args.repeat, args.seed, args.save_baseline, args.threshold)
+    else:
+        parser.print_help()
+        return 0
+
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
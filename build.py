@@ -1,6 +1,7 @@
 import os
 import sys
 import shutil
+import hashlib
 import subprocess
 
 def check_pyinstaller():
@@ -88,6 +89,15 @@ def build_executable():
         if os.path.exists("README.md"):
             shutil.copy("README.md", "dist/README.md")
             print("已复制说明文件: README.md")
+        
+        # 发布时把SHA-256写入version.json的sha256字段，程序下载更新后会先校验再安装
+        exe_path = "dist/Minecraft模组汉化工具.exe"
+        if os.path.exists(exe_path):
+            digest = hashlib.sha256()
+            with open(exe_path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+            print(f"SHA-256: {digest.hexdigest()}（发布时写入version.json的sha256字段）")
             
         return True
     except subprocess.CalledProcessError as e:
@@ -0,0 +1,482 @@
+import re
+import sys
+import json
+import math
+import zlib
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 本地模拟的OpenAI兼容翻译接口（chat completions），用于离线测试翻译的并发、重试和限流。
+# 使用方法: python mock_api_server.py --port 8000，然后把配置中的API URL设置为 http://127.0.0.1:8000/v1
+
+# 模拟译文时可能被“弄丢”的占位符、格式代码和<数字>标记
+MANGLE_PATTERN = re.compile(r'<\d+>|%(?:\d+\$)?[-#+0,(]*\d*(?:\.\d+)?[sdf]|§[0-9a-fk-or]|\{\d+\}')
+
+# 提示词中待翻译JSON之前的标记（与ModTranslator._build_translation_prompt一致）
+PROMPT_CONTENT_MARKER = "以下是需要翻译的内容"
+
+DEFAULT_OPTIONS = {
+    "latency": "fixed:0",       # 延迟分布，见parse_latency
+    "rate_429": 0.0,            # 返回429的概率
+    "rate_500": 0.0,            # 返回500的概率
+    "retry_after": 1,           # 429响应中的Retry-After（秒），为0时不返回该头
+    "rpm": 0,                   # 每分钟请求数上限，超过时返回429，为0时不限制
+    "malformed": 0.0,           # 返回无法解析的JSON内容的概率
+    "drop_keys": 0.0,           # 每个键被遗漏的概率
+    "truncate": 0.0,            # 返回被截断内容（finish_reason为length）的概率
+    "mangle": 0.0,              # 每个值中的第一个占位符或标记被删除的概率
+    "prefix": "【译】",          # 模拟译文的前缀
+    "seed": None                # 随机种子
+}
+
+def parse_latency(spec):
+    """解析延迟分布
+
+    支持的格式:
+        fixed:秒
+        uniform:最小,最大
+        normal:均值,标准差
+        lognormal:mu,sigma（对数正态分布，适合模拟长尾延迟）
+        exp:均值
+
+    Returns:
+        function: 接收random.Random并返回延迟秒数的函数
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value.strip()] if args else []
+
+    if kind == "fixed":
+        return lambda rng: values[0] if values else 0.0
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    raise ValueError(f"不支持的延迟分布: {spec}")
+
+def extract_source_json(prompt):
+    """从提示词中提取待翻译的JSON对象"""
+    marker_index = prompt.rfind(PROMPT_CONTENT_MARKER)
+    search_from = marker_index if marker_index >= 0 else 0
+    decoder = json.JSONDecoder()
+
+    start = prompt.find("{", search_from)
+    while start >= 0:
+        try:
+            data, _ = decoder.raw_decode(prompt, start)
+            if isinstance(data, dict):
+                return data
+        except json.JSONDecodeError:
+            pass
+        start = prompt.find("{", start + 1)
+    return {}
+
+def estimate_tokens(text):
+    """粗略估算token数（中文约每字1个token，其他约每4个字符1个token）"""
+    cjk = len(re.findall(r'[㐀-鿿]', text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+class MockState:
+    """模拟服务器的状态和统计"""
+    def __init__(self, options):
+        self.options = dict(DEFAULT_OPTIONS)
+        self.options.update({key: value for key, value in options.items() if value is not None})
+        self.latency = parse_latency(self.options["latency"])
+        self.rng = random.Random(self.options["seed"])
+        self.lock = threading.Lock()
+        self.request_times = []
+        self.in_flight = 0
+        self.stats = {
+            "requests": 0,
+            "status": {},
+            "max_in_flight": 0,
+            "malformed": 0,
+            "dropped_keys": 0,
+            "truncated": 0,
+            "mangled": 0,
+            "streamed": 0
+        }
+
+    def roll(self, name):
+        """按配置的概率决定是否触发某种故障"""
+        with self.lock:
+            return self.rng.random() < self.options[name]
+
+    def record_status(self, status):
+        with self.lock:
+            self.stats["status"][str(status)] = self.stats["status"].get(str(status), 0) + 1
+
+    def over_rate_limit(self):
+        """检查是否超过每分钟请求数限制"""
+        if not self.options["rpm"]:
+            return False
+        now = time.time()
+        with self.lock:
+            self.request_times = [t for t in self.request_times if now - t < 60]
+            if len(self.request_times) >= self.options["rpm"]:
+                return True
+            self.request_times.append(now)
+            return False
+
+class MockHandler(BaseHTTPRequestHandler):
+    """处理chat completions请求"""
+    server_version = "MockOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.state.record_status(status)
+
+    def _send_error(self, status, message, error_type, headers=None):
+        self._send_json(status, {"error": {"message": message, "type": error_type, "code": status}}, headers)
+
+    def do_GET(self):
+        state = self.server.state
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "mock"}]})
+        elif self.path.rstrip("/").endswith("/stats"):
+            with state.lock:
+                self._send_json(200, json.loads(json.dumps(state.stats)))
+        else:
+            self._send_error(404, "not found", "invalid_request_error")
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_error(404, "not found", "invalid_request_error")
+            return
+
+        state = self.server.state
+        with state.lock:
+            state.stats["requests"] += 1
+            state.in_flight += 1
+            state.stats["max_in_flight"] = max(state.stats["max_in_flight"], state.in_flight)
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                request = json.loads(self.rfile.read(length).decode("utf-8"))
+            except (ValueError, UnicodeDecodeError):
+                self._send_error(400, "invalid JSON body", "invalid_request_error")
+                return
+
+            # 模拟延迟
+            delay = state.latency(state.rng)
+            if delay > 0:
+                time.sleep(delay)
+
+            # 注入限流和服务器错误
+            retry_after = state.options["retry_after"]
+            rate_headers = {"Retry-After": str(retry_after)} if retry_after else {}
+            if state.over_rate_limit() or state.roll("rate_429"):
+                self._send_error(429, "Rate limit reached", "rate_limit_error", rate_headers)
+                return
+            if state.roll("rate_500"):
+                self._send_error(500, "Internal server error", "server_error")
+                return
+
+            self._send_completion(request)
+        finally:
+            with state.lock:
+                state.in_flight -= 1
+
+    def _build_content(self, request):
+        """生成模拟的翻译结果，返回(内容, finish_reason)"""
+        state = self.server.state
+        messages = request.get("messages", [])
+        prompt = "\n".join(message.get("content", "") for message in messages if message.get("role") == "user")
+        source = extract_source_json(prompt)
+
+        translated = {}
+        for key, value in source.items():
+            if state.roll("drop_keys"):
+                with state.lock:
+                    state.stats["dropped_keys"] += 1
+                continue
+            if isinstance(value, str):
+                value = f"{state.options['prefix']}{value}"
+                if MANGLE_PATTERN.search(value) and state.roll("mangle"):
+                    with state.lock:
+                        state.stats["mangled"] += 1
+                    value = MANGLE_PATTERN.sub("", value, count=1)
+            translated[key] = value
+        content = json.dumps(translated, ensure_ascii=False, indent=2)
+
+        if state.roll("malformed"):
+            with state.lock:
+                state.stats["malformed"] += 1
+            return "好的，以下是翻译结果：\n" + content.replace('",', '"').rstrip("}"), "stop"
+        if state.roll("truncate"):
+            with state.lock:
+                state.stats["truncated"] += 1
+            return content[:max(1, len(content) // 2)], "length"
+        return content, "stop"
+
+    def _send_completion(self, request):
+        content, finish_reason = self._build_content(request)
+        model = request.get("model", "mock-model")
+        completion_id = f"chatcmpl-mock-{int(time.time() * 1000)}"
+        prompt_text = "".join(message.get("content", "") for message in request.get("messages", []))
+        usage = {
+            "prompt_tokens": estimate_tokens(prompt_text),
+            "completion_tokens": estimate_tokens(content)
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if request.get("stream"):
+            self._send_stream(completion_id, model, content, finish_reason, usage)
+            return
+
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason
+            }],
+            "usage": usage
+        })
+
+    def _send_stream(self, completion_id, model, content, finish_reason, usage):
+        """以server-sent events的形式分块返回结果"""
+        state = self.server.state
+        with state.lock:
+            state.stats["streamed"] += 1
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def send_chunk(delta, reason=None, chunk_usage=None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": reason}]
+            }
+            if chunk_usage:
+                chunk["usage"] = chunk_usage
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        send_chunk({"role": "assistant", "content": ""})
+        chunk_size = 32
+        for start in range(0, len(content), chunk_size):
+            send_chunk({"content": content[start:start + chunk_size]})
+        send_chunk({}, finish_reason, usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        state.record_status(200)
+
+def start_mock_server(host="127.0.0.1", port=0, quiet=True, **options):
+    """在后台线程中启动模拟服务器
+
+    Args:
+        host: 监听地址
+        port: 监听端口，为0时自动分配
+        quiet: 是否不输出请求日志
+        **options: 模拟行为选项，见DEFAULT_OPTIONS
+
+    Returns:
+        ThreadingHTTPServer: 服务器对象，base_url属性为可直接用作API URL的地址，使用shutdown()停止
+    """
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.state = MockState(options)
+    server.quiet = quiet
+    server.base_url = f"http://{host}:{server.server_address[1]}/v1"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class MockFileHandler(BaseHTTPRequestHandler):
+    """提供server.payload的下载，用于测试更新下载的断点续传和校验
+
+    支持Range请求（server.supports_range为False时总是返回完整文件）；server.drop_after不为0时，
+    每个响应最多发送该字节数后断开连接，模拟不稳定的网络。
+    """
+    server_version = "MockFile/1.0"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        server = self.server
+        payload = server.payload
+        start = 0
+        match = re.match(r"bytes=(\d+)-$", self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if match and server.supports_range and (if_range is None or if_range == server.etag):
+            start = int(match.group(1))
+            if start >= len(payload):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(payload)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(payload) - 1}/{len(payload)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(payload) - start))
+        self.send_header("ETag", server.etag)
+        if server.supports_range:
+            self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+        body = payload[start:start + server.drop_after] if server.drop_after else payload[start:]
+        with server.lock:
+            server.stats["requests"] += 1
+            server.stats["resumed"] += 1 if start else 0
+            server.stats["bytes_sent"] += len(body)
+        try:
+            self.wfile.write(body)
+            self.wfile.flush()
+        except OSError:
+            pass
+        if start + len(body) < len(payload):
+            self.close_connection = True
+
+def start_mock_file_server(payload, host="127.0.0.1", port=0, quiet=True, drop_after=0, supports_range=True):
+    """在后台线程中启动模拟的文件下载服务器
+
+    Args:
+        payload: 文件内容（bytes）
+        host: 监听地址
+        port: 监听端口，为0时自动分配
+        quiet: 是否不输出请求日志
+        drop_after: 每个响应最多发送的字节数，为0时不断开
+        supports_range: 是否支持Range请求
+
+    Returns:
+        ThreadingHTTPServer: 服务器对象，url属性为文件地址，stats属性为请求统计，使用shutdown()停止
+    """
+    server = ThreadingHTTPServer((host, port), MockFileHandler)
+    server.daemon_threads = True
+    server.payload = payload
+    server.etag = f'"{len(payload)}-{zlib.crc32(payload):08x}"'
+    server.drop_after = drop_after
+    server.supports_range = supports_range
+    server.quiet = quiet
+    server.lock = threading.Lock()
+    server.stats = {"requests": 0, "resumed": 0, "bytes_sent": 0}
+    server.url = f"http://{host}:{server.server_address[1]}/version.exe"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class MockVersionHandler(BaseHTTPRequestHandler):
+    """返回server.version_info（version.json的内容），用于测试后台检查更新
+
+    server.delay不为0时，每个请求等待该秒数后再响应，模拟很慢的网络。
+    """
+    server_version = "MockVersion/1.0"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.stats["requests"] += 1
+        if server.delay:
+            time.sleep(server.delay)
+        body = json.dumps(server.version_info, ensure_ascii=False).encode("utf-8")
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass  # 客户端已超时断开
+
+def start_mock_version_server(version_info, host="127.0.0.1", port=0, quiet=True, delay=0):
+    """在后台线程中启动模拟的版本信息服务器
+
+    Args:
+        version_info: 返回的版本信息，可以随时修改server.version_info
+        host: 监听地址
+        port: 监听端口，为0时自动分配
+        quiet: 是否不输出请求日志
+        delay: 每个请求的响应延迟（秒）
+
+    Returns:
+        ThreadingHTTPServer: 服务器对象，url属性为version.json地址，stats属性为请求统计，使用shutdown()停止
+    """
+    server = ThreadingHTTPServer((host, port), MockVersionHandler)
+    server.daemon_threads = True
+    server.version_info = version_info
+    server.delay = delay
+    server.quiet = quiet
+    server.lock = threading.Lock()
+    server.stats = {"requests": 0}
+    server.url = f"http://{host}:{server.server_address[1]}/version.json"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="本地模拟的OpenAI兼容翻译接口")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    parser.add_argument("--latency", help="延迟分布，例如 fixed:0.5、uniform:0.2,1.5、normal:0.8,0.2、lognormal:-0.5,0.6、exp:0.7")
+    parser.add_argument("--rate-429", type=float, help="返回429的概率")
+    parser.add_argument("--rate-500", type=float, help="返回500的概率")
+    parser.add_argument("--retry-after", type=float, help="429响应中的Retry-After（秒）")
+    parser.add_argument("--rpm", type=int, help="每分钟请求数上限")
+    parser.add_argument("--malformed", type=float, help="返回无法解析的JSON的概率")
+    parser.add_argument("--drop-keys", type=float, help="每个键被遗漏的概率")
+    parser.add_argument("--truncate", type=float, help="返回被截断内容的概率")
+    parser.add_argument("--mangle", type=float, help="每个值中的第一个占位符被删除的概率")
+    parser.add_argument("--seed", type=int, help="随机种子")
+    parser.add_argument("--verbose", action="store_true", help="输出请求日志")
+    args = parser.parse_args()
+
+    options = {
+        "latency": args.latency,
+        "rate_429": args.rate_429,
+        "rate_500": args.rate_500,
+        "retry_after": args.retry_after,
+        "rpm": args.rpm,
+        "malformed": args.malformed,
+        "drop_keys": args.drop_keys,
+        "truncate": args.truncate,
+        "mangle": args.mangle,
+        "seed": args.seed
+    }
+    server = start_mock_server(args.host, args.port, quiet=not args.verbose, **options)
+    print(f"模拟API已启动: {server.base_url}")
+    print(f"统计信息: {server.base_url}/stats")
+    print("按Ctrl+C停止")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("\n已停止")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
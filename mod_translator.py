@@ -1,28 +1,60 @@
 import os
+import io
 import json
 import shutil
 import zipfile
-import tkinter as tk
-from tkinter import filedialog
 import re
-import copy
 import math
 import time
-from pathlib import Path
 import datetime
 import threading
 import sys
 import subprocess
-try:
-    import requests
-    REQUESTS_AVAILABLE = True
-except ImportError:
-    print("警告: requests库未安装，检查更新功能将不可用。请运行 'pip install requests' 安装")
-    REQUESTS_AVAILABLE = False
-try:
-    from openai import OpenAI
-except ImportError:
-    print("警告: OpenAI库未安装，请运行 'pip install openai' 安装")
+import hashlib
+import socket
+import contextlib
+import collections
+import itertools
+import concurrent.futures
+import email.utils
+import tracemalloc
+import importlib
+import importlib.util
+
+# 可选依赖（openai、requests、tkinter）导入较慢，统一在首次使用时再导入，
+# 这样合并、清理等不需要它们的菜单操作可以更快启动
+_OPTIONAL_MODULE_WARNINGS = {
+    "requests": "警告: requests库未安装，检查更新功能将不可用。请运行 'pip install requests' 安装",
+    "openai": "警告: OpenAI库未安装，请运行 'pip install openai' 安装",
+}
+_optional_modules = {}
+
+def _import_optional(module_name):
+    """按需导入可选依赖
+    
+    Args:
+        module_name: 模块名
+        
+    Returns:
+        module: 导入的模块，未安装时返回None（警告只显示一次）
+    """
+    if module_name not in _optional_modules:
+        try:
+            _optional_modules[module_name] = importlib.import_module(module_name)
+        except ImportError:
+            _optional_modules[module_name] = None
+            if module_name in _OPTIONAL_MODULE_WARNINGS:
+                print(_OPTIONAL_MODULE_WARNINGS[module_name])
+    return _optional_modules[module_name]
+
+def _is_module_available(module_name):
+    """检查模块是否已安装（不实际导入）"""
+    if _optional_modules.get(module_name) is not None:
+        return True
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
 
 # 版本信息
 VERSION_INFO = {
@@ -35,62 +67,161 @@ VERSION_INFO = {
 # 云端版本信息URL
 VERSION_CHECK_URL = "https://raw.kkgithub.com/Lcyys666/Li-Minecraft-Mod-Chinese-Tool/main/version.json"
 
-def download_file(url, save_path, progress_callback=None):
-    """下载文件到指定路径
+# 下载时每次读取的块大小范围（字节），根据实际下载速度在范围内调整
+DOWNLOAD_CHUNK_MIN = 64 * 1024
+DOWNLOAD_CHUNK_MAX = 4 * 1024 * 1024
+DOWNLOAD_CHUNK_SECONDS = 0.25  # 每次读取的目标耗时（秒）
+
+SHA256_PATTERN = re.compile(r'^[0-9a-fA-F]{64}$')
+
+def file_sha256(path, block_size=1024 * 1024):
+    """计算文件的SHA-256（十六进制）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def download_file(url, save_path, progress_callback=None, expected_sha256=None, max_attempts=5, timeout=(10, 60)):
+    """下载文件到指定路径，支持断点续传和完整性校验
+    
+    下载中的内容保存在 save_path + ".downloading"，连接中断后（包括下次运行程序时）使用Range请求从已下载的位置继续；
+    服务器不支持Range或文件已经变化（ETag/Last-Modified不同）时重新下载。
+    每次读取的块大小根据下载速度在64KB到4MB之间调整。
     
     Args:
         url: 文件URL
         save_path: 保存路径
         progress_callback: 进度回调函数，接收(current, total)参数
+        expected_sha256: 文件的SHA-256，提供时校验不一致的文件会被删除，下载视为失败
+        max_attempts: 连续没有下载到任何数据时的最大尝试次数（每次从已下载的位置继续）
+        timeout: (连接超时, 读取超时)（秒）
         
     Returns:
         bool: 下载是否成功
     """
-    if not REQUESTS_AVAILABLE:
+    requests = _import_optional("requests")
+    if requests is None:
         print("无法下载更新：requests库未安装")
         return False
     
+    # 临时文件路径，旁边的.json记录URL和服务器返回的文件标识，用于判断续传的是否是同一个文件
+    temp_path = f"{save_path}.downloading"
+    meta_path = f"{temp_path}.json"
+    
+    # 确保下载目录存在
+    os.makedirs(os.path.dirname(os.path.abspath(save_path)), exist_ok=True)
+    
+    def discard_partial():
+        for path in (temp_path, meta_path):
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    
     try:
-        # 发送流式请求
-        response = requests.get(url, stream=True, timeout=30)
-        if response.status_code != 200:
-            print(f"下载失败：HTTP错误 {response.status_code}")
-            return False
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except Exception:
+        meta = {}
+    if meta.get("url") != url:
+        discard_partial()
+        meta = {}
+    
+    chunk_size = DOWNLOAD_CHUNK_MIN
+    failures = 0
+    while True:
+        offset = os.path.getsize(temp_path) if os.path.exists(temp_path) else 0
+        headers = {"Accept-Encoding": "identity"}  # 续传的位置按原始字节计算，不能使用压缩传输
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            validator = meta.get("etag") or meta.get("last_modified")
+            if validator:
+                headers["If-Range"] = validator
         
-        # 获取文件大小
-        total_size = int(response.headers.get('content-length', 0))
-        
-        # 创建临时文件路径
-        temp_path = f"{save_path}.downloading"
-        
-        # 确保下载目录存在
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        
-        # 下载文件
-        downloaded = 0
-        with open(temp_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    if progress_callback:
-                        progress_callback(downloaded, total_size)
-        
-        # 下载完成后重命名
-        if os.path.exists(save_path):
-            os.remove(save_path)
-        os.rename(temp_path, save_path)
-        return True
+        try:
+            with requests.get(url, stream=True, timeout=timeout, headers=headers) as response:
+                if response.status_code == 416 and offset:
+                    # 请求的位置超出文件末尾：已下载的部分就是完整文件，否则重新下载
+                    if meta.get("total") == offset:
+                        break
+                    discard_partial()
+                    raise IOError("已下载的部分与服务器上的文件不一致")
+                
+                if response.status_code == 206 and offset:
+                    content_range = re.match(r'bytes (\d+)-\d+/(\d+|\*)', response.headers.get('content-range', ''))
+                    if not content_range or int(content_range.group(1)) != offset:
+                        discard_partial()
+                        raise IOError("服务器返回的续传位置不正确")
+                    total_size = int(content_range.group(2)) if content_range.group(2) != '*' else 0
+                    mode = 'ab'
+                elif response.status_code == 200:
+                    if offset:
+                        print("\n服务器不支持断点续传或文件已更新，重新下载")
+                    offset = 0
+                    total_size = int(response.headers.get('content-length', 0))
+                    mode = 'wb'
+                elif response.status_code >= 500:
+                    raise IOError(f"HTTP错误 {response.status_code}")
+                else:
+                    print(f"下载失败：HTTP错误 {response.status_code}")
+                    return False
+                
+                meta = {"url": url, "etag": response.headers.get('etag'), "last_modified": response.headers.get('last-modified'),
+                        "total": total_size}
+                with open(meta_path, 'w', encoding='utf-8') as f:
+                    json.dump(meta, f)
+                
+                # 下载文件，块大小根据每次读取的耗时加倍或减半
+                downloaded = offset
+                if progress_callback and offset:
+                    progress_callback(downloaded, total_size)
+                with open(temp_path, mode) as f:
+                    while True:
+                        started = time.monotonic()
+                        chunk = response.raw.read(chunk_size)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        downloaded += len(chunk)
+                        elapsed = time.monotonic() - started
+                        if len(chunk) == chunk_size and elapsed < DOWNLOAD_CHUNK_SECONDS / 2:
+                            chunk_size = min(chunk_size * 2, DOWNLOAD_CHUNK_MAX)
+                        elif elapsed > DOWNLOAD_CHUNK_SECONDS * 2:
+                            chunk_size = max(chunk_size // 2, DOWNLOAD_CHUNK_MIN)
+                        if progress_callback:
+                            progress_callback(downloaded, total_size)
+                
+                if total_size and downloaded < total_size:
+                    raise IOError(f"连接提前关闭（已下载 {downloaded}/{total_size} 字节）")
+                break
         
-    except Exception as e:
-        print(f"下载文件时出错: {str(e)}")
-        # 清理临时文件
-        if os.path.exists(f"{save_path}.downloading"):
-            try:
-                os.remove(f"{save_path}.downloading")
-            except:
-                pass
-        return False
+        except Exception as e:
+            # 这次下载到了数据时立即续传；连续没有进展时按指数退避重试
+            progressed = os.path.exists(temp_path) and os.path.getsize(temp_path) > offset
+            failures = 0 if progressed else failures + 1
+            if failures >= max_attempts:
+                print(f"\n下载文件时出错: {str(e)}")
+                if os.path.exists(temp_path):
+                    print("已下载的部分已保留，下次下载时会从中断处继续")
+                return False
+            delay = min(2 ** (failures - 1), 10) if failures else 0
+            print(f"\n下载中断: {str(e)}，" + (f"{delay} 秒后" if delay else "") + "从中断处继续")
+            time.sleep(delay)
+    
+    # 校验完整性，不一致的文件删除（下次重新下载）
+    if expected_sha256:
+        actual_sha256 = file_sha256(temp_path)
+        if actual_sha256.lower() != expected_sha256.lower():
+            print(f"\n下载的文件校验失败：SHA-256为 {actual_sha256}，应为 {expected_sha256.lower()}")
+            discard_partial()
+            return False
+    
+    # 下载完成后重命名
+    os.replace(temp_path, save_path)
+    discard_partial()
+    return True
 
 def restart_with_new_version(new_version_path):
     """使用新版本重启程序
@@ -164,31 +295,140 @@ def restart_with_new_version(new_version_path):
         print(f"准备更新时出错: {str(e)}")
         print("请手动更新：关闭程序后，将下载的文件复制到程序目录并重命名为当前程序名")
 
-def check_for_updates(silent=False, auto_update=False):
+def _is_newer_version(cloud_version, local_version):
+    """比较版本号，判断云端版本是否比本地版本新"""
+    local_parts = [int(x) for x in local_version.split(".")]
+    cloud_parts = [int(x) for x in cloud_version.split(".")]
+    
+    # 确保两个列表长度相同
+    while len(local_parts) < len(cloud_parts):
+        local_parts.append(0)
+    while len(cloud_parts) < len(local_parts):
+        cloud_parts.append(0)
+    
+    # 比较每一部分
+    for i in range(len(local_parts)):
+        if cloud_parts[i] > local_parts[i]:
+            return True
+        elif cloud_parts[i] < local_parts[i]:
+            return False
+    return False
+
+def fetch_version_info(cache_path=None, ttl=0, url=None, timeout=10):
+    """获取云端版本信息，优先使用未过期的本地缓存
+    
+    Args:
+        cache_path: 缓存文件路径，为None时不使用缓存
+        ttl: 缓存有效期（秒），为0时总是重新请求
+        url: 版本信息URL，默认使用VERSION_CHECK_URL
+        timeout: 请求超时时间（秒）
+        
+    Returns:
+        dict: 云端版本信息
+    """
+    url = url or VERSION_CHECK_URL
+    
+    # 读取缓存
+    if cache_path and ttl > 0 and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            age = time.time() - cache.get("checked_at", 0)
+            if cache.get("url") == url and 0 <= age < ttl and cache.get("version_info"):
+                return cache["version_info"]
+        except Exception:
+            pass  # 缓存损坏时重新请求
+    
+    requests = _import_optional("requests")
+    if requests is None:
+        raise RuntimeError("requests库未安装")
+    
+    response = requests.get(url, timeout=timeout)
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP错误 {response.status_code}")
+    version_info = response.json()
+    
+    # 写入缓存（先写临时文件再替换，避免多个进程同时写入时损坏）
+    if cache_path:
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+            temp_path = f"{cache_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"checked_at": time.time(), "url": url, "version_info": version_info}, f, ensure_ascii=False, indent=4)
+            os.replace(temp_path, cache_path)
+        except Exception as e:
+            print(f"警告: 无法写入更新缓存: {str(e)}")
+    
+    return version_info
+
+def _download_and_install_update(update_url, version=None, sha256=None, interactive=True):
+    """下载更新，校验SHA-256后使用新版本重启
+    
+    Args:
+        update_url: 更新文件URL
+        version: 新版本号，用于命名下载文件（同一版本中断后可以续传）
+        sha256: version.json中发布的SHA-256
+        interactive: 缺少SHA-256时是否询问用户（自动更新时不安装未经校验的文件）
+    """
+    if sha256 and not SHA256_PATTERN.match(sha256):
+        print(f"警告: 版本信息中的SHA-256格式不正确: {sha256}")
+        sha256 = None
+    if not sha256:
+        print("警告: 版本信息中没有发布SHA-256，无法校验下载的文件")
+        if not interactive:
+            print("自动更新不会安装未经校验的文件，请手动更新")
+            print(f"下载地址: {update_url}")
+            return
+        if input("仍要下载并安装吗？(y/N): ").strip().lower() != 'y':
+            print(f"下载地址: {update_url}")
+            return
+    
+    # 确定下载路径 - 同一版本使用固定的文件名，中断的下载可以在下次继续
+    download_dir = os.path.dirname(os.path.abspath(__file__))
+    version_tag = re.sub(r'[^0-9A-Za-z._-]', '_', version) if version else "latest"
+    download_path = os.path.join(download_dir, f"update_{version_tag}.exe")
+    
+    # 显示下载进度的回调函数
+    def show_progress(downloaded, total):
+        if total > 0:
+            percent = min(100, int(downloaded * 100 / total))
+            # 计算进度条长度
+            bar_len = 20
+            filled_len = int(bar_len * percent / 100)
+            bar = '█' * filled_len + '░' * (bar_len - filled_len)
+            # 使用\r回到行首，更新进度条
+            sys.stdout.write(f"\r下载进度: [{bar}] {percent}% ({downloaded/1024/1024:.1f}MB/{total/1024/1024:.1f}MB)")
+            sys.stdout.flush()
+    
+    # 下载更新（校验通过后才会安装）
+    if download_file(update_url, download_path, show_progress, expected_sha256=sha256):
+        print("\n\n下载完成" + ("，SHA-256校验通过" if sha256 else "") + "！正在安装更新...")
+        restart_with_new_version(download_path)
+    else:
+        print("\n\n下载失败，请手动更新")
+        print(f"下载地址: {update_url}")
+
+def check_for_updates(silent=False, auto_update=False, cache_path=None, ttl=0, version_info=None):
     """检查是否有更新可用
     
     Args:
         silent: 是否静默检查（不显示"已是最新版本"的消息）
         auto_update: 是否自动下载更新
+        cache_path: 版本信息缓存文件路径
+        ttl: 缓存有效期（秒），为0时强制重新请求
+        version_info: 已获取的云端版本信息（例如后台检查的结果），提供时不再请求
         
     Returns:
         bool: 是否有更新可用
     """
-    if not REQUESTS_AVAILABLE:
+    if version_info is None and not _is_module_available("requests"):
         if not silent:
             print("无法检查更新：requests库未安装")
         return False
     
     try:
         # 获取云端版本信息
-        response = requests.get(VERSION_CHECK_URL, timeout=10)
-        if response.status_code != 200:
-            if not silent:
-                print(f"检查更新失败：HTTP错误 {response.status_code}")
-            return False
-        
-        # 解析云端版本信息
-        cloud_version_info = response.json()
+        cloud_version_info = version_info or fetch_version_info(cache_path, ttl)
         local_version = VERSION_INFO["version"]
         cloud_version = cloud_version_info.get("version")
         
@@ -197,27 +437,9 @@ def check_for_updates(silent=False, auto_update=False):
                 print("检查更新失败：无法获取云端版本号")
             return False
         
-        # 比较版本号
-        local_parts = [int(x) for x in local_version.split(".")]
-        cloud_parts = [int(x) for x in cloud_version.split(".")]
-        
-        # 确保两个列表长度相同
-        while len(local_parts) < len(cloud_parts):
-            local_parts.append(0)
-        while len(cloud_parts) < len(local_parts):
-            cloud_parts.append(0)
-        
-        # 比较每一部分
-        has_update = False
-        for i in range(len(local_parts)):
-            if cloud_parts[i] > local_parts[i]:
-                has_update = True
-                break
-            elif cloud_parts[i] < local_parts[i]:
-                break
-        
-        if has_update:
+        if _is_newer_version(cloud_version, local_version):
             update_url = cloud_version_info.get("update_url", VERSION_INFO["update_url"])
+            update_sha256 = cloud_version_info.get("sha256")
             
             print("\n=== 发现新版本 ===")
             print(f"当前版本: {local_version}")
@@ -229,61 +451,13 @@ def check_for_updates(silent=False, auto_update=False):
             if auto_update:
                 # 自动更新
                 print(f"\n正在自动下载更新...")
-                
-                # 确定下载路径 - 使用时间戳避免文件冲突
-                timestamp = int(time.time())
-                download_dir = os.path.dirname(os.path.abspath(__file__))
-                download_path = os.path.join(download_dir, f"update_{timestamp}.exe")
-                
-                # 显示下载进度的回调函数
-                def show_progress(downloaded, total):
-                    if total > 0:
-                        percent = min(100, int(downloaded * 100 / total))
-                        # 计算进度条长度
-                        bar_len = 20
-                        filled_len = int(bar_len * percent / 100)
-                        bar = '█' * filled_len + '░' * (bar_len - filled_len)
-                        # 使用\r回到行首，更新进度条
-                        sys.stdout.write(f"\r下载进度: [{bar}] {percent}% ({downloaded/1024/1024:.1f}MB/{total/1024/1024:.1f}MB)")
-                        sys.stdout.flush()
-                
-                # 下载更新
-                if download_file(update_url, download_path, show_progress):
-                    print("\n\n下载完成！正在安装更新...")
-                    restart_with_new_version(download_path)
-                else:
-                    print("\n\n下载失败，请手动更新")
-                    print(f"下载地址: {update_url}")
+                _download_and_install_update(update_url, cloud_version, update_sha256, interactive=False)
             else:
                 # 询问用户是否更新
                 choice = input(f"\n是否现在下载并更新？(Y/n): ").strip().lower()
                 if choice != 'n':
                     print(f"\n正在下载更新...")
-                    
-                    # 确定下载路径 - 使用时间戳避免文件冲突
-                    timestamp = int(time.time())
-                    download_dir = os.path.dirname(os.path.abspath(__file__))
-                    download_path = os.path.join(download_dir, f"update_{timestamp}.exe")
-                    
-                    # 显示下载进度的回调函数
-                    def show_progress(downloaded, total):
-                        if total > 0:
-                            percent = min(100, int(downloaded * 100 / total))
-                            # 计算进度条长度
-                            bar_len = 20
-                            filled_len = int(bar_len * percent / 100)
-                            bar = '█' * filled_len + '░' * (bar_len - filled_len)
-                            # 使用\r回到行首，更新进度条
-                            sys.stdout.write(f"\r下载进度: [{bar}] {percent}% ({downloaded/1024/1024:.1f}MB/{total/1024/1024:.1f}MB)")
-                            sys.stdout.flush()
-                    
-                    # 下载更新
-                    if download_file(update_url, download_path, show_progress):
-                        print("\n\n下载完成！正在安装更新...")
-                        restart_with_new_version(download_path)
-                    else:
-                        print("\n\n下载失败，请手动更新")
-                        print(f"下载地址: {update_url}")
+                    _download_and_install_update(update_url, cloud_version, update_sha256)
                 else:
                     print(f"\n下载地址: {update_url}")
             
@@ -298,6 +472,60 @@ def check_for_updates(silent=False, auto_update=False):
             print(f"检查更新时出错: {str(e)}")
         return False
 
+class UpdateChecker:
+    """后台检查更新
+    
+    只在后台线程中请求版本信息（结果按TTL缓存在配置目录中），
+    不会阻塞主菜单；发现新版本后由主线程在下次显示菜单时提示。
+    
+    Args:
+        cache_path: 缓存文件路径
+        ttl: 缓存有效期（秒）
+        url: 版本信息URL，默认使用VERSION_CHECK_URL
+        timeout: 请求超时时间（秒）
+    """
+    def __init__(self, cache_path, ttl, url=None, timeout=10):
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.url = url
+        self.timeout = timeout
+        self._pending_update = None
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def start(self):
+        """启动后台检查线程"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        try:
+            version_info = fetch_version_info(self.cache_path, self.ttl, self.url, self.timeout)
+            cloud_version = version_info.get("version")
+            if cloud_version and _is_newer_version(cloud_version, VERSION_INFO["version"]):
+                with self._lock:
+                    self._pending_update = version_info
+        except Exception:
+            pass  # 后台检查失败时保持静默，可通过菜单手动检查
+    
+    def wait(self, timeout=None):
+        """等待后台检查结束
+        
+        Returns:
+            bool: 检查是否已经结束（没有启动时为True）
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+            return not self._thread.is_alive()
+        return True
+    
+    def take_pending_update(self):
+        """取出后台发现的新版本信息（每个结果只返回一次），没有时返回None"""
+        with self._lock:
+            version_info = self._pending_update
+            self._pending_update = None
+        return version_info
+
 class Config:
     """配置管理类"""
     def __init__(self):
@@ -309,7 +537,37 @@ class Config:
             "wait_time": 3,
             "batch_size": 40,  # 每个翻译文件的最大条目数
             "auto_check_update": True,  # 自动检查更新
-            "auto_update": False  # 自动下载安装更新
+            "auto_update": False,  # 自动下载安装更新
+            "update_check_ttl": 21600,  # 更新检查结果的缓存时间（秒）
+            "watch_interval": 5,  # 监视mods文件夹的轮询间隔（秒）
+            "incremental_retranslation": True,  # mod更新后沿用原文未变化条目的已有翻译
+            "metrics_prometheus": False,  # 运行报告是否同时输出Prometheus文本格式
+            "adaptive_batch_size": True,  # 根据实际输出token数自动调整每次请求的条目数
+            "target_output_tokens": 2000,  # 自动调整时每次请求的目标输出token数
+            "max_batch_size": 120,  # 自动调整时每次请求的最大条目数
+            "token_price_input": 0.0,  # 输入token价格（每百万token），用于估算费用
+            "token_price_output": 0.0,  # 输出token价格（每百万token），用于估算费用
+            "adaptive_concurrency": True,  # 根据延迟和限流自动调整并发请求数（开启时不使用wait_time）
+            "max_concurrency": 8,  # 最大并发请求数
+            "max_retries": 3,  # 每个条目因同一原因（限流、请求失败等）的最大重试次数
+            "mask_placeholders": True,  # 发送前把占位符和格式代码替换为简短标记，返回后还原并检查
+            "prefilter_untranslatable": True,  # 数字、纯占位符、网址、标识符等无需翻译的值不发送给AI，直接使用原文
+            "glossary_file": "glossary.json",  # 术语表文件（相对于配置文件所在目录），只把每批原文中出现的术语加入提示词
+            "glossary_max_terms": 60,  # 每次请求最多加入的术语数
+            "validate_translations": True,  # 翻译完成后校验结果（占位符、格式代码、换行、长度、未翻译、JSON片段）
+            "validation_retry_rounds": 1,  # 未通过校验的条目重新翻译的轮数
+            "measure_peak_memory": False,  # 整理翻译文件时用tracemalloc记录峰值内存（会明显减慢整理速度）
+            "shared_work_db": False,  # 工作数据库放在网络共享驱动器上、由多台机器的工作进程共用时开启（不使用WAL日志）
+            "translation_memory": True,  # 合并时把译文保存到翻译记忆，整理时用相似原文的译文预填待翻译条目，翻译时检索相似原文作为示例
+            "tm_prefill_threshold": 0.5,  # 相似度不低于该值、且只有大小写、末尾标点或数字不同的条目直接使用改写后的已有译文
+            "tm_suggest_threshold": 0.4,  # 相似度不低于该值的已有译文作为翻译时的示例（字符三元组的Jaccard相似度）
+            "prompt_examples": 8,  # 每次请求最多加入的翻译示例数（从本批原文的相似原文中选取）
+            "prompt_examples_max_tokens": 400,  # 每次请求中翻译示例的估算token数上限
+            "claim_size": 200,  # 工作进程每次从数据库领取的条目数
+            "lease_seconds": 120,  # 领取条目的租约时长（秒），工作进程退出后其他进程需等待租约过期才能收回这些条目
+            "endpoints": [],  # 多个API端点（name/api_url/api_key/model_id/weight/rpm/max_concurrency），为空时使用上面的单个API配置
+            "endpoint_failure_threshold": 3,  # 端点连续失败该次数后暂停使用（熔断）
+            "endpoint_cooldown": 60  # 端点熔断后的冷却时间（秒）
         }
         self.config = self.load_config()
     
@@ -382,139 +640,2049 @@ class Config:
         auto_check = input(f"是否自动检查更新？(Y/n): ").strip().lower()
         config['auto_check_update'] = auto_check != 'n'
         
-        # 自动更新
-        if config['auto_check_update']:
-            auto_update = input(f"是否自动下载安装更新？(y/N): ").strip().lower()
-            config['auto_update'] = auto_update == 'y'
+        # 自动更新
+        if config['auto_check_update']:
+            auto_update = input(f"是否自动下载安装更新？(y/N): ").strip().lower()
+            config['auto_update'] = auto_update == 'y'
+        
+        # 保存配置
+        try:
+            with open(self.config_file, 'w', encoding='utf-8') as f:
+                json.dump(config, f, ensure_ascii=False, indent=4)
+            print("\n配置已保存到", self.config_file)
+        except Exception as e:
+            print(f"保存配置文件时出错: {str(e)}")
+        
+        return config
+    
+    def get_endpoints(self):
+        """获取API端点列表
+        
+        配置了endpoints时使用其中的每一项（缺少的model_id、max_concurrency等使用顶层配置），
+        否则使用顶层的api_url、api_key、model_id作为唯一端点。缺少api_url或api_key的端点会被忽略。
+        
+        Returns:
+            list: 端点配置字典列表
+        """
+        profiles = self.config.get("endpoints") or [{
+            "name": "default",
+            "api_url": self.config.get("api_url"),
+            "api_key": self.config.get("api_key"),
+            "model_id": self.config.get("model_id")
+        }]
+        
+        endpoints = []
+        for i, profile in enumerate(profiles):
+            if not isinstance(profile, dict) or not profile.get("api_url") or not profile.get("api_key"):
+                print(f"警告: 第 {i + 1} 个API端点缺少api_url或api_key，已忽略")
+                continue
+            endpoints.append({
+                "name": profile.get("name") or f"endpoint{i + 1}",
+                "api_url": profile["api_url"],
+                "api_key": profile["api_key"],
+                "model_id": profile.get("model_id") or self.config.get("model_id"),
+                "weight": max(0.01, float(profile.get("weight", 1))),
+                "rpm": int(profile.get("rpm", 0) or 0),
+                "max_concurrency": int(profile.get("max_concurrency") or self.config.get("max_concurrency", 8))
+            })
+        return endpoints
+    
+    def get_data_path(self, filename):
+        """获取与配置文件位于同一目录的数据文件路径"""
+        return os.path.join(os.path.dirname(os.path.abspath(self.config_file)), filename)
+    
+    def get(self, key, default=None):
+        """获取配置项的值"""
+        return self.config.get(key, default)
+    
+    def set(self, key, value):
+        """设置配置项的值"""
+        self.config[key] = value
+        try:
+            with open(self.config_file, 'w', encoding='utf-8') as f:
+                json.dump(self.config, f, ensure_ascii=False, indent=4)
+        except Exception as e:
+            print(f"保存配置文件时出错: {str(e)}")
+
+# JSON字符串或注释，用于在不改动字符串内容的前提下移除注释
+JSON_COMMENT_PATTERN = re.compile(r'("(?:\\.|[^"\\])*")|//[^\n]*|/\*.*?\*/', re.DOTALL)
+
+def parse_json_with_comments(content, source_name="<内存>"):
+    """解析可能包含注释的JSON文本
+    
+    Args:
+        content: JSON文本（str或bytes）
+        source_name: 用于错误提示的来源名称
+        
+    Returns:
+        dict: 解析结果，无法解析时返回空字典
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+    
+    try:
+        # 大多数语言文件没有注释，先直接解析
+        return json.loads(content)
+    except ValueError:
+        pass
+    
+    try:
+        # 移除单行注释 (// 注释) 和多行注释 (/* 注释 */)，字符串中的内容（如网址中的//）保持不变
+        stripped = JSON_COMMENT_PATTERN.sub(lambda match: match.group(1) or "", content)
+        
+        # 尝试解析JSON
+        return json.loads(stripped)
+    except Exception as e:
+        print(f"警告: 解析JSON文件 {source_name} 时出错: {str(e)}")
+        print("尝试使用更宽松的方式解析...")
+        
+        try:
+            # 如果上面的方法失败，尝试使用更宽松的方式解析
+            import json5
+            return json5.loads(content)
+        except ImportError:
+            print("警告: json5模块未安装，无法使用更宽松的解析方式")
+            # 如果json5模块未安装，返回空字典
+            return {}
+        except Exception as e2:
+            print(f"错误: 无法解析JSON文件 {source_name}: {str(e2)}")
+            return {}
+
+def load_json_with_comments(file_path):
+    """加载可能包含注释的JSON文件"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except Exception as e:
+        print(f"错误: 无法读取JSON文件 {file_path}: {str(e)}")
+        return {}
+    return parse_json_with_comments(content, file_path)
+
+def hash_source_text(value):
+    """计算英文原文的哈希，用于判断原文在mod版本之间是否发生变化"""
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()[:16]
+
+# 占位符和格式代码：printf风格（%s、%1$s、%.2f、%%）、§格式代码、{0}和{name}风格、Patchouli的$(...)宏
+PLACEHOLDER_PATTERN = re.compile(
+    r'%(?:\d+\$)?[-#+0,(]*\d*(?:\.\d+)?[sdfxXoeEgGcbhn%]'
+    r'|§[0-9a-fk-orA-FK-OR]'
+    r'|\{\d+(?:,[^{}]*)?\}|\{[A-Za-z_][\w.:-]*\}'
+    r'|\$\([^()]*\)'
+)
+# 发送给AI时代替占位符的标记
+SENTINEL_PATTERN = re.compile(r'<(\d+)>')
+
+def mask_placeholders(value):
+    """把占位符和格式代码替换为<0>、<1>……形式的简短标记
+    
+    Args:
+        value: 英文原文
+        
+    Returns:
+        tuple: (替换后的文本, 被替换的原文列表)。不含占位符、不是字符串或原文中已有<数字>时原样返回
+    """
+    if not isinstance(value, str) or SENTINEL_PATTERN.search(value):
+        return value, []
+    tokens = []
+    
+    def replace(match):
+        tokens.append(match.group(0))
+        return f"<{len(tokens) - 1}>"
+    
+    return PLACEHOLDER_PATTERN.sub(replace, value), tokens
+
+def unmask_placeholders(text, tokens):
+    """把标记还原为占位符
+    
+    Args:
+        text: AI返回的译文
+        tokens: mask_placeholders返回的原文列表
+        
+    Returns:
+        str: 还原后的译文；标记缺失、重复或多出时返回None
+    """
+    if not tokens:
+        return text
+    if not isinstance(text, str):
+        return None
+    found = sorted(int(index) for index in SENTINEL_PATTERN.findall(text))
+    if found != list(range(len(tokens))):
+        return None
+    return SENTINEL_PATTERN.sub(lambda match: tokens[int(match.group(1))], text)
+
+# 无需翻译的值：已包含中日韩文字、网址、形如minecraft:stone或some_id的标识符（必须包含:或_）、
+# 大写的罗马数字（II到XXXIX，用于等级；单个的I、V、X可能是代词或字母，MIX、CV、DIM之类的单词也不算）
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+URL_PATTERN = re.compile(r'^(?:[a-z][a-z0-9+.-]*://|www\.)\S+$', re.IGNORECASE)
+IDENTIFIER_PATTERN = re.compile(r'^(?=[^:_]*[:_])[a-z0-9_]+(?:[:.][a-z0-9_/-]*[a-z0-9_])+$|^[a-z0-9]+(?:_[a-z0-9]+)+$')
+ROMAN_NUMERAL_PATTERN = re.compile(r'^(?=[IVX]{2})X{0,3}(?:IX|IV|V?I{0,3})$')
+
+def estimate_tokens(text):
+    """不使用分词器粗略估算文本的token数：中日韩文字约每字1个token，其他字符约每4个1个token"""
+    if not isinstance(text, str):
+        text = json.dumps(text, ensure_ascii=False)
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+def format_duration(seconds):
+    """把秒数格式化为“1小时5分钟”形式"""
+    minutes = round(seconds / 60)
+    if minutes < 1:
+        return f"{seconds:.0f}秒"
+    hours, minutes = divmod(minutes, 60)
+    return (f"{hours}小时" if hours else "") + (f"{minutes}分钟" if minutes or not hours else "")
+
+# 估算翻译用量时的默认值（没有以往的请求记录时使用）
+OUTPUT_TOKEN_RATIO = 1.6  # 中文译文的token数约为英文原文估算token数的倍数
+DEFAULT_OUTPUT_TOKENS_PER_SECOND = 40  # API生成输出的速度
+DEFAULT_REQUEST_OVERHEAD = 1.5  # 每次请求除生成输出外的耗时（秒）
+
+def classify_untranslatable(value):
+    """判断一个英文值是否无需调用AI翻译
+    
+    Args:
+        value: 英文原文
+        
+    Returns:
+        str: 命中的规则名称（译文与原文相同），需要翻译时返回None
+    """
+    if not isinstance(value, str):
+        return "non_string"
+    text = value.strip()
+    if not text:
+        return "empty"
+    if CJK_PATTERN.search(text):
+        return "cjk"
+    if URL_PATTERN.match(text):
+        return "url"
+    if IDENTIFIER_PATTERN.match(text):
+        return "identifier"
+    if ROMAN_NUMERAL_PATTERN.match(text):
+        return "roman_numeral"
+    
+    # 去掉占位符和格式代码后不含任何字母
+    stripped = PLACEHOLDER_PATTERN.sub("", text)
+    if not re.search(r'[^\W\d_]', stripped):
+        if re.search(r'\d', stripped):
+            return "number"
+        return "placeholder" if stripped != text else "symbol"
+    return None
+
+class TranslationValidator:
+    """批量校验翻译结果
+    
+    对每个条目检查占位符（多重集合）、§格式代码、换行数是否与原文一致，译文是否仍为英文、是否是JSON片段，
+    并在全部条目上用中位数和MAD计算译文/原文长度比的稳健z分数，找出长度异常的条目。
+    """
+    # 错误：直接影响游戏显示的问题，最终仍未通过时丢弃该译文（使用英文原文）
+    ERRORS = ("placeholder", "format_code", "json_fragment")
+    # 警告：可能的问题，重新翻译，但最终仍保留译文
+    WARNINGS = ("newline", "untranslated", "length_ratio")
+    ISSUE_NAMES = {
+        "placeholder": "占位符不一致",
+        "format_code": "格式代码不一致",
+        "json_fragment": "译文是JSON片段",
+        "newline": "换行数不一致",
+        "untranslated": "未翻译（仍为英文）",
+        "length_ratio": "长度比异常"
+    }
+    JSON_FRAGMENT_PATTERN = re.compile(r'^\s*(?:\{.*\}|\[.*\])\s*$|"\s*:\s*"|^\s*"|"\s*,\s*$', re.DOTALL)
+    ENGLISH_WORD_PATTERN = re.compile(r'[A-Za-z]{3,}')
+    
+    def __init__(self, length_z=3.5, min_length=8, min_samples=20):
+        self.length_z = length_z
+        self.min_length = min_length
+        self.min_samples = min_samples
+    
+    @staticmethod
+    def _line_breaks(text):
+        return text.count("\n") + text.count("\\n")
+    
+    def validate(self, entries):
+        """校验一组条目
+        
+        Args:
+            entries: (条目标识, 英文原文, 译文) 的可迭代对象
+            
+        Returns:
+            dict: 条目标识 -> 问题代码列表，只包含有问题的条目
+        """
+        issues = {}
+        log_ratios = []
+        
+        for entry_id, source, translation in entries:
+            if not isinstance(source, str):
+                continue
+            if not isinstance(translation, str):
+                issues[entry_id] = ["json_fragment"]
+                continue
+            
+            problems = []
+            # 只有可能包含占位符或格式代码时才进行正则匹配，排序后比较即多重集合比较
+            if any(char in source or char in translation for char in "%{$§"):
+                source_tokens = sorted(PLACEHOLDER_PATTERN.findall(source))
+                translation_tokens = sorted(PLACEHOLDER_PATTERN.findall(translation))
+                if source_tokens != translation_tokens:
+                    if [token for token in source_tokens if token[0] != "§"] != [token for token in translation_tokens if token[0] != "§"]:
+                        problems.append("placeholder")
+                    if [token for token in source_tokens if token[0] == "§"] != [token for token in translation_tokens if token[0] == "§"]:
+                        problems.append("format_code")
+            if self.JSON_FRAGMENT_PATTERN.search(translation) and not self.JSON_FRAGMENT_PATTERN.search(source):
+                problems.append("json_fragment")
+            if ("\n" in source or "\n" in translation) and self._line_breaks(source) != self._line_breaks(translation):
+                problems.append("newline")
+            if (not CJK_PATTERN.search(translation) and len(self.ENGLISH_WORD_PATTERN.findall(source)) >= 3
+                    and not CJK_PATTERN.search(source) and classify_untranslatable(source) is None):
+                problems.append("untranslated")
+            
+            if len(source) >= self.min_length and translation:
+                log_ratios.append((entry_id, math.log(len(translation) / len(source))))
+            if problems:
+                issues[entry_id] = problems
+        
+        # 长度比异常：稳健z分数 = 0.6745 * (x - 中位数) / MAD
+        if len(log_ratios) >= self.min_samples:
+            values = sorted(ratio for _, ratio in log_ratios)
+            median = values[len(values) // 2]
+            deviations = sorted(abs(ratio - median) for ratio in values)
+            mad = deviations[len(deviations) // 2]
+            if mad > 0:
+                threshold = self.length_z * mad / 0.6745
+                for entry_id, ratio in log_ratios:
+                    if abs(ratio - median) > threshold:
+                        issues.setdefault(entry_id, []).append("length_ratio")
+        
+        return issues
+
+class AhoCorasick:
+    """Aho-Corasick多模式匹配：扫描一遍文本即可找出所有出现的模式"""
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        
+        # 构建字典树
+        for index, pattern in enumerate(self.patterns):
+            node = 0
+            for char in pattern:
+                next_node = self.goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][char] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                node = next_node
+            self.output[node].append(index)
+        
+        # 按层次计算失败指针，并合并失败指针所指节点的输出
+        queue = collections.deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+    
+    def iter_matches(self, text):
+        """遍历文本中的所有匹配
+        
+        Yields:
+            tuple: (匹配结束位置（不含）, 模式序号)
+        """
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for index in self.output[node]:
+                yield position + 1, index
+
+class Glossary:
+    """用户术语表：英文术语 -> 固定译法
+    
+    用Aho-Corasick一次找出一批原文中出现的术语（不区分大小写、按单词边界匹配，允许复数后缀），
+    只把这些术语放进提示词，提示词长度与实际用到的术语数成正比。
+    """
+    PLURAL_SUFFIXES = ("es", "s", "")
+    
+    def __init__(self, terms):
+        self.terms = {}
+        for source, target in terms.items():
+            if isinstance(source, str) and isinstance(target, str) and source.strip() and target.strip():
+                self.terms[source.strip()] = target.strip()
+        self._sources = list(self.terms)
+        self._matcher = AhoCorasick([source.lower() for source in self._sources])
+    
+    @classmethod
+    def load(cls, path):
+        """读取术语表文件
+        
+        支持 {"英文": "中文"} 形式的对象，或 [{"en": "英文", "zh": "中文"}] 形式的列表（均可包含注释）。
+        
+        Returns:
+            Glossary: 术语表，文件不存在或为空时返回None
+        """
+        if not path or not os.path.exists(path):
+            return None
+        data = load_json_with_comments(path)
+        if isinstance(data, list):
+            data = {item.get("en"): item.get("zh") for item in data if isinstance(item, dict)}
+        glossary = cls(data if isinstance(data, dict) else {})
+        return glossary if glossary.terms else None
+    
+    def _is_word_match(self, text, start, end):
+        """匹配前后不能紧接字母或数字（允许s/es复数后缀）"""
+        if start > 0 and text[start - 1].isalnum():
+            return False
+        for suffix in self.PLURAL_SUFFIXES:
+            if text.startswith(suffix, end):
+                after = end + len(suffix)
+                if after >= len(text) or not text[after].isalnum():
+                    return True
+        return False
+    
+    def match(self, texts, limit=0):
+        """找出文本中出现的术语
+        
+        Args:
+            texts: 原文列表
+            limit: 最多返回的术语数（优先较长和出现较多的术语），0为不限制
+            
+        Returns:
+            dict: 英文术语 -> 译法
+        """
+        counts = collections.Counter()
+        for text in texts:
+            if not isinstance(text, str):
+                continue
+            lower = text.lower()
+            for end, index in self._matcher.iter_matches(lower):
+                if self._is_word_match(lower, end - len(self._matcher.patterns[index]), end):
+                    counts[index] += 1
+        
+        ranked = sorted(counts, key=lambda index: (-len(self._sources[index]), -counts[index], index))
+        if limit:
+            ranked = ranked[:limit]
+        return {self._sources[index]: self.terms[self._sources[index]] for index in ranked}
+
+# 嵌套jar（jar-in-jar）所在的目录：Fabric使用META-INF/jars/，Forge使用META-INF/jarjar/
+NESTED_JAR_DIRS = ("META-INF/jars/", "META-INF/jarjar/")
+# 嵌套jar在内存中读取，超过该大小（解压后字节数）的嵌套jar会被跳过
+NESTED_JAR_MAX_SIZE = 64 * 1024 * 1024
+# 嵌套jar的最大递归深度
+NESTED_JAR_MAX_DEPTH = 3
+
+def iter_lang_files(zip_ref, max_nested_size=NESTED_JAR_MAX_SIZE, max_depth=NESTED_JAR_MAX_DEPTH, _container=""):
+    """遍历zip中的语言文件，包括嵌套jar中的语言文件
+    
+    嵌套jar直接在内存中打开（zipfile.ZipFile(io.BytesIO(...))），不会解压到磁盘。
+    每次产出时对应的zip仍处于打开状态，调用方应在处理下一项之前读取文件内容。
+    
+    Args:
+        zip_ref: 已打开的ZipFile
+        max_nested_size: 嵌套jar的大小上限（字节）
+        max_depth: 嵌套jar的最大递归深度
+        
+    Yields:
+        tuple: (所在的ZipFile, ZipInfo, 所在的嵌套jar路径)，顶层文件的嵌套jar路径为空字符串，
+        多层嵌套时用"!/"连接，例如"META-INF/jars/a.jar!/META-INF/jars/b.jar"
+    """
+    for file_info in zip_ref.infolist():
+        name = file_info.filename
+        # 跳过目录
+        if name.endswith('/'):
+            continue
+        
+        if '/lang/' in name and name.endswith('.json'):
+            yield zip_ref, file_info, _container
+        elif max_depth > 0 and name.startswith(NESTED_JAR_DIRS) and name.lower().endswith('.jar'):
+            container = f"{_container}!/{name}" if _container else name
+            if file_info.file_size > max_nested_size:
+                print(f"警告: 跳过过大的嵌套jar {container} ({file_info.file_size / 1024 / 1024:.1f}MB)")
+                continue
+            try:
+                with zipfile.ZipFile(io.BytesIO(zip_ref.read(file_info)), 'r') as nested_ref:
+                    yield from iter_lang_files(nested_ref, max_nested_size, max_depth - 1, container)
+            except zipfile.BadZipFile:
+                print(f"警告: 无法读取嵌套jar {container}")
+
+# 语言键末尾表示同一对象附属文本的片段（提示、描述、书页等），去掉后得到对象本身
+KEY_FAMILY_SUFFIXES = {"tooltip", "tooltips", "tip", "desc", "description", "lore", "info", "hint", "shift", "extended",
+                       "name", "title", "subtitle", "text", "line", "lines", "flavor", "usage", "summary"}
+KEY_FAMILY_SEGMENT_PATTERN = re.compile(r'^(?:\d+|page\d*|line\d+)$')
+KEY_SEPARATOR_PATTERN = re.compile(r'[.:]')
+# 表示同一对象的不同类别前缀，例如item.mod.gear和tooltip.mod.gear属于同一对象
+KEY_FAMILY_CATEGORIES = {"item", "block", "tooltip", "tooltips", "desc", "description", "entity", "fluid", "effect", "enchantment"}
+
+def key_family(key):
+    """获取语言键所属的语义族
+    
+    例如 item.mod.gear、item.mod.gear.tooltip、item.mod.gear.tooltip.1 和 tooltip.mod.gear 属于同一族，
+    book.mod.intro.page0.text 和 book.mod.intro.page1.title 属于同一族。
+    
+    Returns:
+        tuple: (类别, 族标识)，类别为键的第一段
+    """
+    parts = KEY_SEPARATOR_PATTERN.split(key)
+    category = parts[0].lower()
+    while len(parts) > 2 and (parts[-1].lower() in KEY_FAMILY_SUFFIXES or KEY_FAMILY_SEGMENT_PATTERN.match(parts[-1].lower())):
+        parts.pop()
+    if len(parts) > 1 and parts[0].lower() in KEY_FAMILY_CATEGORIES:
+        parts = parts[1:]
+    return category, ".".join(parts).lower()
+
+# 翻译顺序按文本在游戏中的可见程度排列：名称、提示文本、界面文本、其他、进度、配置
+KEY_PRIORITY_NAMES = ["物品/方块/实体名称（连同其提示文本）", "提示文本", "界面文本", "其他文本", "进度", "配置"]
+KEY_PRIORITY_NAME_CATEGORIES = {"item", "block", "entity", "fluid"}
+KEY_PRIORITY_TOOLTIP_SEGMENTS = {"tooltip", "tooltips", "tip", "desc", "description", "lore", "info", "hint", "shift", "extended",
+                                 "flavor", "usage"}
+KEY_PRIORITY_GUI_CATEGORIES = {"gui", "container", "screen", "menu", "key", "itemgroup", "creativetab", "tab", "button", "hud",
+                               "message", "chat", "jei", "emi"}
+KEY_PRIORITY_ADVANCEMENT_SEGMENTS = {"advancement", "advancements", "achievement", "achievements"}
+KEY_PRIORITY_CONFIG_SEGMENTS = {"config", "configuration", "configgui", "option", "options"}
+
+def key_priority(key):
+    """语言键的翻译优先级（越小越先翻译，对应KEY_PRIORITY_NAMES）
+    
+    例如 item.mod.gear 为0，item.mod.gear.tooltip 和 tooltip.mod.gear 为1，gui.mod.title 为2，
+    advancements.mod.root.title 为4，config.mod.enabled 和 mod.configgui.enabled.tooltip 为5。
+    """
+    parts = KEY_SEPARATOR_PATTERN.split(key.lower())
+    segments = set(parts)
+    if segments & KEY_PRIORITY_CONFIG_SEGMENTS:
+        return 5
+    if segments & KEY_PRIORITY_ADVANCEMENT_SEGMENTS:
+        return 4
+    if segments & KEY_PRIORITY_TOOLTIP_SEGMENTS:
+        return 1
+    if parts[0] in KEY_PRIORITY_NAME_CATEGORIES:
+        return 0
+    if parts[0] in KEY_PRIORITY_GUI_CATEGORIES:
+        return 2
+    return 3
+
+def family_priorities(families):
+    """每个键的翻译优先级：取所属语义族中最高的优先级，同一族的键（例如物品名和它的提示文本）一起翻译
+    
+    Args:
+        families: group_related_keys返回的族列表
+        
+    Returns:
+        dict: 键 -> 优先级
+    """
+    priorities = {}
+    for family in families:
+        priority = min(map(key_priority, family))
+        priorities.update((key, priority) for key in family)
+    return priorities
+
+def group_related_keys(keys):
+    """把语言键按语义族分组，同类别的族排在一起
+    
+    Args:
+        keys: 语言键列表（原文件顺序）
+        
+    Returns:
+        list: 族列表，每个族为键列表；类别按首次出现的顺序排列，类别内部和族内部保持原顺序
+    """
+    families = {}
+    category_order = {}
+    family_order = []
+    for key in keys:
+        category, family = key_family(key)
+        if family not in families:
+            families[family] = []
+            family_order.append((category_order.setdefault(category, len(category_order)), len(family_order), family))
+        families[family].append(key)
+    return [families[family] for _, _, family in sorted(family_order)]
+
+class RunMetrics:
+    """运行性能统计
+    
+    记录扫描、提取、整理、翻译、校验、合并、打包各阶段的耗时、读写字节数和处理条目数，
+    API请求的延迟、失败、重试和token用量，以及每个翻译批次和每个mod的token用量，
+    可输出为JSON或Prometheus文本格式的运行报告。
+    """
+    STAGES = ("scan", "extract", "organize", "translate", "validate", "merge", "zip")
+    TOKEN_KEYS = ("prompt_tokens", "completion_tokens", "total_tokens")
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.token_prices = {"prompt_tokens": 0.0, "completion_tokens": 0.0}  # 每百万token价格
+        self.reset()
+    
+    def reset(self):
+        """开始新的一次运行"""
+        with self._lock:
+            self.started_at = time.time()
+            self.stages = {}
+            self.api = {
+                "requests": 0,
+                "failures": 0,
+                "retries": 0,
+                "latencies": [],
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "total_tokens": 0
+            }
+            self.batches = []
+            self.mods = {}
+    
+    @contextlib.contextmanager
+    def stage(self, name):
+        """统计一个阶段的耗时，产出的计数器用于累加该阶段的bytes、entries等计数
+        
+        同一阶段可以多次进入（例如每个mod扫描一次），耗时和计数会累加。
+        """
+        counters = collections.Counter()
+        start = time.perf_counter()
+        try:
+            yield counters
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stage = self.stages.setdefault(name, {"wall_time": 0.0, "calls": 0, "bytes": 0, "entries": 0})
+                stage["wall_time"] += elapsed
+                stage["calls"] += 1
+                for counter, value in counters.items():
+                    stage[counter] = stage.get(counter, 0) + value
+    
+    def record_peak_memory(self, name, peak_bytes):
+        """记录一个阶段的峰值内存（取多次进入该阶段时的最大值）
+        
+        Args:
+            name: 阶段名称
+            peak_bytes: 峰值内存（字节）
+        """
+        with self._lock:
+            stage = self.stages.setdefault(name, {"wall_time": 0.0, "calls": 0, "bytes": 0, "entries": 0})
+            stage["peak_memory"] = max(stage.get("peak_memory", 0), peak_bytes)
+    
+    def record_api_call(self, latency, success=True, retries=0, usage=None):
+        """记录一次API请求
+        
+        Args:
+            latency: 请求耗时（秒）
+            success: 是否成功
+            retries: 重试次数
+            usage: token用量，格式为{"prompt_tokens", "completion_tokens", "total_tokens"}
+        """
+        with self._lock:
+            self.api["requests"] += 1
+            self.api["latencies"].append(latency)
+            self.api["retries"] += retries
+            if not success:
+                self.api["failures"] += 1
+            for key in self.TOKEN_KEYS:
+                self.api[key] += (usage or {}).get(key) or 0
+    
+    def record_retry(self):
+        """记录一次重试（批次被重新放回队列）"""
+        with self._lock:
+            self.api["retries"] += 1
+    
+    def record_batch(self, mod_shares, usage, finish_reason=None, latency=0.0, label="", endpoint=None, success=True, paths=None):
+        """记录一个翻译批次的token用量，并按条目数比例分摊到各个mod
+        
+        Args:
+            mod_shares: mod名称 -> 该批次中属于该mod的条目数（一个条目来自多个mod时可为小数）
+            usage: token用量，格式为{"prompt_tokens", "completion_tokens", "total_tokens"}
+            finish_reason: 响应的结束原因
+            latency: 请求耗时（秒）
+            label: 批次说明（翻译路径和文件名）
+            endpoint: 处理该批次的API端点名称
+            success: 请求是否成功
+            paths: 语言文件路径 -> 批次中该路径的条目数
+        """
+        usage = usage or {}
+        total_entries = sum(mod_shares.values())
+        with self._lock:
+            batch = {"label": label, "entries": round(total_entries), "finish_reason": finish_reason, "latency": round(latency, 4),
+                     "endpoint": endpoint, "success": success, "paths": dict(paths or {})}
+            batch.update({key: usage.get(key) or 0 for key in self.TOKEN_KEYS})
+            self.batches.append(batch)
+            
+            if total_entries <= 0:
+                return
+            for mod_name, share in mod_shares.items():
+                mod_usage = self.mods.setdefault(mod_name, {"entries": 0, "batches": 0, **{key: 0 for key in self.TOKEN_KEYS}})
+                ratio = share / total_entries
+                mod_usage["entries"] += share
+                mod_usage["batches"] += 1
+                for key in self.TOKEN_KEYS:
+                    mod_usage[key] += (usage.get(key) or 0) * ratio
+    
+    def _cost(self, usage):
+        """按配置的价格估算费用"""
+        return sum(usage.get(key, 0) * price / 1_000_000 for key, price in self.token_prices.items())
+    
+    @staticmethod
+    def _percentile(sorted_values, percent):
+        """最近秩法计算百分位数"""
+        if not sorted_values:
+            return 0.0
+        rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+        return sorted_values[rank - 1]
+    
+    def to_report(self):
+        """生成运行报告（可直接序列化为JSON）"""
+        with self._lock:
+            latencies = sorted(self.api["latencies"])
+            stages = {name: dict(values) for name, values in self.stages.items()}
+            api = {key: value for key, value in self.api.items() if key != "latencies"}
+            batches = [dict(batch) for batch in self.batches]
+            mods = {name: dict(values) for name, values in self.mods.items()}
+        
+        for values in stages.values():
+            values["wall_time"] = round(values["wall_time"], 4)
+        
+        for values in mods.values():
+            values["entries"] = round(values["entries"], 2)
+            for key in self.TOKEN_KEYS:
+                values[key] = round(values[key], 1)
+        
+        # 按端点汇总批次
+        endpoints = {}
+        for batch in batches:
+            if not batch.get("endpoint"):
+                continue
+            values = endpoints.setdefault(batch["endpoint"], {"requests": 0, "failures": 0, "latency_total": 0.0, "prompt_tokens": 0, "completion_tokens": 0})
+            values["requests"] += 1
+            values["failures"] += 0 if batch.get("success", True) else 1
+            values["latency_total"] += batch["latency"]
+            values["prompt_tokens"] += batch["prompt_tokens"]
+            values["completion_tokens"] += batch["completion_tokens"]
+        for values in endpoints.values():
+            values["latency_mean"] = round(values.pop("latency_total") / values["requests"], 4)
+        
+        translate_time = stages.get("translate", {}).get("wall_time", 0)
+        api["tokens_per_second"] = round(api["completion_tokens"] / translate_time, 2) if translate_time else 0.0
+        api["truncated_batches"] = sum(1 for batch in batches if batch["finish_reason"] == "length")
+        if any(self.token_prices.values()):
+            api["cost"] = round(self._cost(api), 4)
+            for values in mods.values():
+                values["cost"] = round(self._cost(values), 4)
+        
+        api["latency"] = {
+            "p50": round(self._percentile(latencies, 50), 4),
+            "p90": round(self._percentile(latencies, 90), 4),
+            "p99": round(self._percentile(latencies, 99), 4),
+            "max": round(latencies[-1], 4) if latencies else 0.0,
+            "mean": round(sum(latencies) / len(latencies), 4) if latencies else 0.0
+        }
+        
+        finished_at = time.time()
+        return {
+            "version": VERSION_INFO["version"],
+            "started_at": datetime.datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "finished_at": datetime.datetime.fromtimestamp(finished_at).isoformat(timespec="seconds"),
+            "elapsed": round(finished_at - self.started_at, 3),
+            "stages": stages,
+            "api": api,
+            "mods": mods,
+            "endpoints": endpoints,
+            "batches": batches
+        }
+    
+    def to_prometheus(self):
+        """生成Prometheus文本格式的指标"""
+        report = self.to_report()
+        lines = []
+        
+        def metric(name, metric_type, help_text, samples):
+            lines.append(f"# HELP mod_translator_{name} {help_text}")
+            lines.append(f"# TYPE mod_translator_{name} {metric_type}")
+            for labels, value in samples:
+                label_text = ",".join('{}="{}"'.format(key, str(val).replace("\\", "\\\\").replace('"', '\\"')) for key, val in labels.items())
+                lines.append(f"mod_translator_{name}{{{label_text}}} {value}" if label_text else f"mod_translator_{name} {value}")
+        
+        stages = report["stages"]
+        metric("stage_wall_seconds", "gauge", "Wall time spent in each stage.",
+               [({"stage": name}, values["wall_time"]) for name, values in stages.items()])
+        metric("stage_bytes_total", "counter", "Bytes read or written in each stage.",
+               [({"stage": name}, values.get("bytes", 0)) for name, values in stages.items()])
+        metric("stage_entries_total", "counter", "Entries processed in each stage.",
+               [({"stage": name}, values.get("entries", 0)) for name, values in stages.items()])
+        metric("stage_peak_memory_bytes", "gauge", "Peak traced Python memory in each stage.",
+               [({"stage": name}, values["peak_memory"]) for name, values in stages.items() if "peak_memory" in values])
+        
+        api = report["api"]
+        metric("api_requests_total", "counter", "Translation API requests.", [({}, api["requests"])])
+        metric("api_failures_total", "counter", "Failed translation API requests.", [({}, api["failures"])])
+        metric("api_retries_total", "counter", "Translation API retries.", [({}, api["retries"])])
+        metric("api_latency_seconds", "summary", "Translation API latency.",
+               [({"quantile": quantile}, api["latency"][key]) for quantile, key in (("0.5", "p50"), ("0.9", "p90"), ("0.99", "p99"))])
+        metric("api_tokens_total", "counter", "Tokens used by the translation API.",
+               [({"type": kind}, api[f"{kind}_tokens"]) for kind in ("prompt", "completion")])
+        metric("api_completion_tokens_per_second", "gauge", "Completion tokens per second of translate wall time.",
+               [({}, api["tokens_per_second"])])
+        metric("mod_tokens_total", "counter", "Tokens used by the translation API, attributed to each mod.",
+               [({"mod": name, "type": kind}, values[f"{kind}_tokens"])
+                for name, values in sorted(report["mods"].items()) for kind in ("prompt", "completion")])
+        
+        return "\n".join(lines) + "\n"
+    
+    def write_report(self, directory, base_filename, prometheus=False):
+        """写入运行报告
+        
+        Args:
+            directory: 报告目录（与输出的资源包相同）
+            base_filename: 文件名（不含扩展名）
+            prometheus: 是否同时写入Prometheus文本格式
+            
+        Returns:
+            list: 写入的文件路径
+        """
+        paths = []
+        report_path = os.path.join(directory, f"{base_filename}.json")
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_report(), f, ensure_ascii=False, indent=4)
+        paths.append(report_path)
+        
+        if prometheus:
+            prom_path = os.path.join(directory, f"{base_filename}.prom")
+            with open(prom_path, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+            paths.append(prom_path)
+        
+        return paths
+    
+    def print_summary(self):
+        """显示各阶段的耗时统计"""
+        report = self.to_report()
+        if not report["stages"]:
+            return
+        
+        print("\n=== 性能统计 ===")
+        for name in self.STAGES + tuple(sorted(set(report["stages"]) - set(self.STAGES))):
+            values = report["stages"].get(name)
+            if values:
+                peak_memory = f"，峰值内存 {values['peak_memory'] / 1024 / 1024:.1f} MB" if "peak_memory" in values else ""
+                print(f"  - {name}: {values['wall_time']:.2f} 秒，{values.get('entries', 0)} 个条目，{values.get('bytes', 0) / 1024:.1f} KB{peak_memory}")
+        api = report["api"]
+        if api["requests"]:
+            latency = api["latency"]
+            print(f"  - API: {api['requests']} 次请求，失败 {api['failures']} 次，重试 {api['retries']} 次，"
+                  f"延迟 p50 {latency['p50']:.2f}s / p90 {latency['p90']:.2f}s / p99 {latency['p99']:.2f}s，"
+                  f"token {api['total_tokens']}（输出 {api['tokens_per_second']:.1f} token/秒）")
+            if api["truncated_batches"]:
+                print(f"  - 被截断的批次: {api['truncated_batches']} 个")
+            if "cost" in api:
+                print(f"  - 估算费用: {api['cost']:.4f}")
+        
+        if len(report["endpoints"]) > 1:
+            print("  - 各端点:")
+            for name, values in sorted(report["endpoints"].items()):
+                print(f"      {name}: {values['requests']} 次请求，失败 {values['failures']} 次，平均延迟 {values['latency_mean']:.2f}s")
+        
+        # 显示token用量最多的mod
+        top_mods = sorted(report["mods"].items(), key=lambda item: item[1]["total_tokens"], reverse=True)[:5]
+        if top_mods:
+            print("  - token用量最多的mod:")
+            for name, values in top_mods:
+                cost_text = f"，费用 {values['cost']:.4f}" if "cost" in values else ""
+                print(f"      {name}: {values['total_tokens']:.0f} token，{values['entries']:.0f} 个条目{cost_text}")
+    
+    def save(self, path):
+        """保存统计数据，便于跨多次启动累积同一次运行的数据"""
+        with self._lock:
+            data = {"started_at": self.started_at, "stages": self.stages, "api": self.api, "batches": self.batches, "mods": self.mods}
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+    
+    def load(self, path):
+        """读取保存的统计数据，不存在或损坏时保持当前数据"""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            with self._lock:
+                self.started_at = data.get("started_at", self.started_at)
+                self.stages = data.get("stages", {})
+                self.api.update(data.get("api", {}))
+                self.batches = data.get("batches", [])
+                self.mods = data.get("mods", {})
+        except Exception as e:
+            print(f"警告: 读取运行统计时出错: {str(e)}")
+
+class BatchSizeController:
+    """根据实际输出token数调整每次请求的条目数
+    
+    用每个条目输出token数的滑动平均估算下一批的大小，使每次请求的输出接近目标token数；
+    响应被截断（finish_reason为length）时把批次大小减半。
+    """
+    def __init__(self, initial, minimum=1, maximum=None, target_tokens=2000, smoothing=0.3):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum or initial)
+        self.size = min(max(initial, self.minimum), self.maximum)
+        self.target_tokens = target_tokens
+        self.smoothing = smoothing
+        self.tokens_per_entry = None
+        self._lock = threading.Lock()
+    
+    def next_size(self):
+        """下一批的条目数"""
+        with self._lock:
+            return self.size
+    
+    def observe(self, entries, completion_tokens, finish_reason=None):
+        """根据一次请求的结果调整批次大小
+        
+        Args:
+            entries: 该请求包含的条目数
+            completion_tokens: 该请求的输出token数
+            finish_reason: 响应的结束原因
+            
+        Returns:
+            int: 调整后的批次大小
+        """
+        with self._lock:
+            if finish_reason == "length":
+                # 输出被截断，批次过大
+                self.size = max(self.minimum, min(self.size, entries) // 2)
+                return self.size
+            
+            if entries <= 0 or not completion_tokens:
+                return self.size
+            
+            sample = completion_tokens / entries
+            if self.tokens_per_entry is None:
+                self.tokens_per_entry = sample
+            else:
+                self.tokens_per_entry += self.smoothing * (sample - self.tokens_per_entry)
+            
+            # 每次最多增长一半，避免估算偏差导致批次突然过大
+            desired = int(self.target_tokens / self.tokens_per_entry)
+            self.size = min(self.maximum, max(self.minimum, min(desired, int(self.size * 1.5) + 1)))
+            return self.size
+
+class ConcurrencyController:
+    """AIMD（加性增、乘性减）并发控制
+    
+    请求成功且延迟和错误率正常时逐步增大并发窗口（每完成约一个窗口的请求加1），
+    遇到429/503或延迟突增时把窗口乘以decrease，并按Retry-After暂停发送新请求。
+    """
+    def __init__(self, initial=1, minimum=1, maximum=8, increase=1.0, decrease=0.5, latency_factor=2.5, adaptive=True):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.window = float(min(max(initial, self.minimum), self.maximum))
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.adaptive = adaptive
+        self.latency_ewma = None
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.overloads = 0  # 连续的限流次数，没有Retry-After时用于指数退避
+        self.recent = collections.deque(maxlen=20)  # 最近请求是否成功
+        self._lock = threading.Lock()
+    
+    @property
+    def limit(self):
+        """当前允许的并发请求数"""
+        with self._lock:
+            return max(self.minimum, int(self.window))
+    
+    def pause_remaining(self):
+        """距离可以发送新请求还需等待的秒数"""
+        with self._lock:
+            return max(0.0, self.paused_until - time.monotonic())
+    
+    def on_success(self, latency):
+        """请求成功"""
+        with self._lock:
+            self.recent.append(True)
+            self.overloads = 0
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            spike = len(self.recent) >= 5 and latency > self.latency_factor * self.latency_ewma
+            self.latency_ewma += 0.2 * (latency - self.latency_ewma)
+            if not self.adaptive:
+                return
+            if spike:
+                self._decrease()
+            elif self._error_rate() < 0.25:
+                self.window = min(self.maximum, self.window + self.increase / self.window)
+    
+    def on_overload(self, retry_after=None):
+        """遇到限流（429）或服务不可用（503）
+        
+        Args:
+            retry_after: 服务器要求的等待时间（秒），没有时按连续限流次数指数退避
+        """
+        with self._lock:
+            self.recent.append(False)
+            self.overloads += 1
+            if self.adaptive:
+                self._decrease()
+            pause = retry_after if retry_after is not None else min(60.0, 2.0 ** self.overloads)
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+    
+    def on_failure(self):
+        """其他请求失败（服务器错误、网络错误、返回内容无法解析等）"""
+        with self._lock:
+            self.recent.append(False)
+            if self.adaptive and self._error_rate() > 0.5:
+                self._decrease()
+    
+    def _error_rate(self):
+        if not self.recent:
+            return 0.0
+        return self.recent.count(False) / len(self.recent)
+    
+    def _decrease(self):
+        # 同一轮请求产生的多个拥塞信号只减小一次窗口
+        now = time.monotonic()
+        if now - self.last_decrease < (self.latency_ewma or 1.0):
+            return
+        self.last_decrease = now
+        self.window = max(float(self.minimum), self.window * self.decrease)
+
+class ApiEndpoint:
+    """一个API端点及其并发、限流和熔断状态"""
+    def __init__(self, name, api_url, api_key, model_id, weight=1.0, rpm=0, concurrency=None):
+        self.name = name
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model_id = model_id
+        self.weight = weight
+        self.rpm = rpm
+        self.concurrency = concurrency or ConcurrencyController()
+        self.in_flight = 0
+        self.request_times = collections.deque()  # 最近60秒内发送请求的时间
+        self.failures = 0  # 连续失败次数
+        self.open_until = 0.0  # 熔断结束时间
+        self.half_open = False  # 冷却结束后只放行一个试探请求
+
+class EndpointPool:
+    """多个API端点的负载均衡和故障转移
+    
+    每批发送给可用端点中负载最低（进行中的请求数/权重）的一个。每个端点按AIMD独立调整并发，
+    并遵守各自的每分钟请求数限制；连续失败达到阈值时熔断该端点，冷却后放行一个试探请求，成功则恢复。
+    """
+    def __init__(self, endpoints, failure_threshold=3, cooldown=60):
+        self.endpoints = endpoints
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+    
+    @property
+    def window(self):
+        """所有端点并发窗口之和"""
+        return sum(endpoint.concurrency.window for endpoint in self.endpoints if endpoint.open_until == 0)
+    
+    @property
+    def max_concurrency(self):
+        return sum(endpoint.concurrency.maximum for endpoint in self.endpoints)
+    
+    def _wait_time(self, endpoint, now):
+        """端点还需等待多久才能接受新请求（秒），并发已满时返回None"""
+        if endpoint.half_open or endpoint.in_flight >= endpoint.concurrency.limit:
+            return None if endpoint.in_flight else 0.0
+        wait = max(endpoint.open_until - now, endpoint.concurrency.pause_remaining())
+        if endpoint.rpm:
+            while endpoint.request_times and now - endpoint.request_times[0] >= 60:
+                endpoint.request_times.popleft()
+            if len(endpoint.request_times) >= endpoint.rpm:
+                wait = max(wait, endpoint.request_times[0] + 60 - now)
+        return max(0.0, wait)
+    
+    def acquire(self):
+        """选择一个可用的端点并占用一个并发名额，没有可用端点时返回None"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [endpoint for endpoint in self.endpoints if self._wait_time(endpoint, now) == 0]
+            if not candidates:
+                return None
+            endpoint = min(candidates, key=lambda item: (item.in_flight + 1) / item.weight)
+            if endpoint.open_until:
+                # 冷却结束，放行一个试探请求
+                endpoint.open_until = 0.0
+                endpoint.half_open = True
+            endpoint.in_flight += 1
+            if endpoint.rpm:
+                endpoint.request_times.append(now)
+            return endpoint
+    
+    def release(self, endpoint, call_info, success):
+        """释放并发名额，并根据请求结果更新端点的并发窗口和熔断状态
+        
+        Args:
+            endpoint: acquire返回的端点
+            call_info: _call_ai_api填写的请求信息
+            success: 是否得到了可用的结果（包括因长度被截断的结果）
+        """
+        status_code = call_info.get("status_code")
+        if status_code in (429, 503):
+            endpoint.concurrency.on_overload(call_info.get("retry_after"))
+        elif success:
+            endpoint.concurrency.on_success(call_info.get("latency", 0.0))
+        else:
+            endpoint.concurrency.on_failure()
+        
+        with self._lock:
+            endpoint.in_flight -= 1
+            # 限流不代表端点故障；服务器错误和网络错误计入熔断
+            if call_info.get("error") and status_code != 429:
+                endpoint.failures += 1
+                if endpoint.half_open or endpoint.failures >= self.failure_threshold:
+                    endpoint.open_until = time.monotonic() + self.cooldown
+                    endpoint.half_open = False
+                    print(f"警告: API端点 {endpoint.name} 连续失败 {endpoint.failures} 次，{self.cooldown} 秒内暂停使用")
+            else:
+                if endpoint.half_open:
+                    print(f"API端点 {endpoint.name} 已恢复")
+                endpoint.failures = 0
+                endpoint.half_open = False
+    
+    def next_available_in(self):
+        """距离有端点可以接受新请求的秒数"""
+        now = time.monotonic()
+        with self._lock:
+            waits = [self._wait_time(endpoint, now) for endpoint in self.endpoints]
+        waits = [wait for wait in waits if wait is not None]
+        return min(waits) if waits else 0.05
+
+def parse_retry_after(headers):
+    """解析响应头中的Retry-After（秒数或HTTP日期），没有或无法解析时返回None"""
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+# 翻译记忆改写译文时比较的数字，以及原文末尾标点对应的中文标点
+MEMORY_NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+MEMORY_TRAILING_PUNCTUATION = {"...": "……", ".": "。", "!": "！", "?": "？", ":": "："}
+
+def memory_shape(text):
+    """原文的形式：数字替换为#、占位符替换为同一个字符、小写、合并空白后去掉末尾标点
+    
+    Returns:
+        tuple: (形式, 末尾标点)
+    """
+    text = " ".join(MEMORY_NUMBER_PATTERN.sub("#", PLACEHOLDER_PATTERN.sub("\x00", text)).lower().split())
+    core = text.rstrip(".!?:")
+    return core, text[len(core):]
+
+def adapt_memory_translation(source, match_source, match_target):
+    """把翻译记忆中相似原文的译文改写为本条原文的译文
+    
+    只处理能确定改写方式的差异：大小写和空白、末尾标点，以及数字（例如 Tier 2 Battery 和 Tier 3 Battery，
+    要改写的数字在译文中必须恰好出现一次）。其他差异（例如不同的材料名）无法改写，只能作为参考译文。
+    
+    Args:
+        source: 本条原文
+        match_source: 翻译记忆中的相似原文
+        match_target: 相似原文的译文
+        
+    Returns:
+        str: 改写后的译文，无法确定时返回None
+    """
+    if not all(isinstance(value, str) for value in (source, match_source, match_target)):
+        return None
+    if PLACEHOLDER_PATTERN.findall(source) != PLACEHOLDER_PATTERN.findall(match_source):
+        return None
+    
+    (core, ending), (match_core, match_ending) = memory_shape(source), memory_shape(match_source)
+    if core != match_core:
+        return None
+    
+    # 数字：译文中占位符之外的数字按位置替换，要改写的数字必须在原文和译文中都只出现一次
+    numbers = MEMORY_NUMBER_PATTERN.findall(PLACEHOLDER_PATTERN.sub(" ", source))
+    match_numbers = MEMORY_NUMBER_PATTERN.findall(PLACEHOLDER_PATTERN.sub(" ", match_source))
+    placeholder_spans = [match.span() for match in PLACEHOLDER_PATTERN.finditer(match_target)]
+    target_numbers = [match for match in MEMORY_NUMBER_PATTERN.finditer(match_target)
+                      if not any(start < match.end() and match.start() < end for start, end in placeholder_spans)]
+    replacements = {}
+    for old, new in zip(match_numbers, numbers):
+        if old == new:
+            continue
+        positions = [match.span() for match in target_numbers if match.group(0) == old]
+        if match_numbers.count(old) != 1 or len(positions) != 1:
+            return None
+        replacements[positions[0]] = new
+    target = match_target
+    for (start, end), new in sorted(replacements.items(), reverse=True):
+        target = target[:start] + new + target[end:]
+    
+    # 末尾标点不同时换成对应的中文标点
+    if ending != match_ending:
+        if any(part not in MEMORY_TRAILING_PUNCTUATION for part in (ending, match_ending) if part):
+            return None
+        target = target.rstrip("。！？：….!?:") + MEMORY_TRAILING_PUNCTUATION.get(ending, "")
+    return target
+
+class TranslationMemory:
+    """翻译记忆：保存已确定的原文和译文，检索相似的原文
+    
+    记录保存在配置目录下的SQLite数据库中，合并翻译结果时加入AI译文、沿用的译文以及资源包和mod自带的中文。
+    载入时只建立按原文形式（memory_shape，去掉数字、大小写和末尾标点差异）分组的索引，用于整理时预填译文，
+    查询是一次字典查找。
+    
+    相似原文检索（翻译时为每批条目选取示例）使用规范化原文的字符三元组集合的Jaccard相似度，索引在第一次检索时才建立。
+    三元组按出现次数从少到多编号，每条记录只把最稀有的几个三元组加入倒排表（前缀过滤：相似度不低于阈值的两条原文，
+    前缀中必然有共同的三元组），查询时只比较与查询前缀共同三元组最多的MAX_CANDIDATES条、且长度在阈值允许范围内的记录
+    （常见三元组的倒排表很长，超出MAX_POSTINGS的部分不再检查，结果是近似的）。检索结果按规范化原文缓存，
+    记录少于MIN_SEARCH_RECORDS条时不检索。
+    """
+    NGRAM = 3
+    SUGGESTIONS = 3  # 每个条目最多选取的相似原文数
+    MIN_SEARCH_RECORDS = 50
+    MAX_CANDIDATES = 50
+    MAX_POSTINGS = 2000
+    MAX_SHAPE_MATCHES = 8
+    MAX_CACHED = 50000
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS memory (
+            source TEXT PRIMARY KEY,
+            target TEXT NOT NULL,
+            origin TEXT,
+            updated_at REAL
+        );
+    """
+    # 人工译文（资源包、mod自带的中文）不会被其他来源的译文覆盖
+    HUMAN_ORIGINS = ("resource_pack", "mod")
+    
+    def __init__(self, path):
+        self.path = path
+        self.threshold = 1.0
+        self.loaded = False
+        self._records = []
+        self._sources = set()
+        self._shapes = {}
+        self._vocabulary = {}
+        self._record_grams = []
+        self._postings = {}
+        self._indexed = False
+        self._cache = {}
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._records)
+    
+    def _connect(self):
+        import sqlite3
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.executescript(self.SCHEMA)
+        return conn
+    
+    def add(self, pairs):
+        """加入原文和译文（相同原文的记录被更新）
+        
+        Args:
+            pairs: (原文, 译文, 来源) 列表，译文与原文相同或不是文本的条目被忽略
+            
+        Returns:
+            int: 加入或更新的记录数
+        """
+        now = time.time()
+        rows = [(source, target, origin, now) for source, target, origin in pairs
+                if isinstance(source, str) and isinstance(target, str) and source.strip() and target.strip() and target != source]
+        if not rows:
+            return 0
+        human = ", ".join(f"'{origin}'" for origin in self.HUMAN_ORIGINS)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO memory (source, target, origin, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (source) DO UPDATE SET target = excluded.target, origin = excluded.origin, updated_at = excluded.updated_at "
+                    f"WHERE memory.origin NOT IN ({human}) OR excluded.origin IN ({human})", rows)
+        finally:
+            conn.close()
+        return len(rows)
+    
+    @staticmethod
+    def normalize(text):
+        """规范化原文：小写、占位符替换为同一个字符、合并空白"""
+        return " ".join(PLACEHOLDER_PATTERN.sub("\x00", text).lower().split())
+    
+    @classmethod
+    def grams(cls, text):
+        """规范化原文的字符三元组集合"""
+        text = " " + cls.normalize(text) + " "
+        return {text[i:i + cls.NGRAM] for i in range(max(1, len(text) - cls.NGRAM + 1))}
+    
+    @staticmethod
+    def similarity(grams, other_grams):
+        """两个三元组集合的Jaccard相似度"""
+        overlap = len(grams & other_grams)
+        return overlap / (len(grams) + len(other_grams) - overlap) if overlap else 0.0
+    
+    def _prefix_length(self, size):
+        return size - math.ceil(self.threshold * size - 1e-9) + 1
+    
+    def load(self, threshold):
+        """载入全部记录并按原文形式分组（三元组索引在第一次检索时建立）
+        
+        Args:
+            threshold: 检索相似原文的最低相似度（决定每条记录加入倒排表的前缀长度）
+            
+        Returns:
+            int: 记录数
+        """
+        self.unload()
+        self.threshold = threshold
+        self.loaded = True
+        if not os.path.exists(self.path):
+            return 0
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT source, target FROM memory").fetchall()
+        finally:
+            conn.close()
+        self._append(rows)
+        return len(self._records)
+    
+    def unload(self):
+        """释放已载入的记录和索引（数据库更新后，下次使用前需要重新载入）"""
+        self.loaded = False
+        self._records, self._sources, self._shapes = [], set(), {}
+        self._vocabulary, self._record_grams, self._postings, self._indexed = {}, [], {}, False
+        self._cache = {}
+    
+    def _append(self, pairs):
+        # 加入记录和原文形式索引，三元组索引已建立时同时加入
+        first = len(self._records)
+        for source, target in pairs:
+            record_id = len(self._records)
+            self._records.append((source, target))
+            self._sources.add(source)
+            self._shapes.setdefault(memory_shape(source)[0], []).append(record_id)
+        if self._indexed:
+            self._index_records(first)
+    
+    def _index_records(self, first):
+        # 把first之后的记录加入倒排表；新出现的三元组编号排在最后，三元组的顺序保持不变，前缀过滤仍然成立
+        vocabulary = self._vocabulary
+        for source, _ in itertools.islice(self._records, first, None):
+            gram_ids = sorted(vocabulary.setdefault(gram, len(vocabulary)) for gram in self.grams(source))
+            record_id = len(self._record_grams)
+            self._record_grams.append(tuple(gram_ids))
+            for gram_id in gram_ids[:self._prefix_length(len(gram_ids))]:
+                self._postings.setdefault(gram_id, []).append(record_id)
+    
+    def _build_index(self):
+        """建立三元组倒排表（三元组按出现次数从少到多编号）"""
+        gram_sets = [self.grams(source) for source, _ in self._records]
+        frequency = collections.Counter(itertools.chain.from_iterable(gram_sets))
+        self._vocabulary = {gram: index for index, (gram, _) in enumerate(sorted(frequency.items(), key=lambda item: (item[1], item[0])))}
+        del frequency
+        
+        postings = collections.defaultdict(list)
+        lookup = self._vocabulary.__getitem__
+        self._record_grams = []
+        for record_id, grams in enumerate(gram_sets):
+            gram_ids = sorted(map(lookup, grams))
+            self._record_grams.append(tuple(gram_ids))
+            for gram_id in itertools.islice(gram_ids, self._prefix_length(len(gram_ids))):
+                postings[gram_id].append(record_id)
+        self._postings = dict(postings)
+        self._indexed = True
+    
+    def extend(self, pairs):
+        """把原文和译文加入已载入的索引（不写入数据库，合并时才保存）
+        
+        Args:
+            pairs: (原文, 译文) 列表，已在索引中的原文被忽略
+            
+        Returns:
+            int: 加入的记录数
+        """
+        rows = {}
+        for source, target in pairs:
+            if (isinstance(source, str) and isinstance(target, str) and source.strip() and target.strip()
+                    and target != source and source not in self._sources):
+                rows.setdefault(source, target)
+        if rows:
+            with self._lock:
+                self._append(rows.items())
+                self._cache = {}
+        return len(rows)
+    
+    def find_adaptable(self, text):
+        """查找与text只有数字、大小写、空白或末尾标点不同的记录（可以用adapt_memory_translation改写译文）
+        
+        Returns:
+            list: (相似度, 原文, 译文)，按相似度从高到低排列，最多MAX_SHAPE_MATCHES个
+        """
+        if not isinstance(text, str):
+            return []
+        record_ids = self._shapes.get(memory_shape(text)[0])
+        if not record_ids:
+            return []
+        grams = self.grams(text)
+        results = []
+        for record_id in record_ids[-self.MAX_SHAPE_MATCHES:]:
+            source, target = self._records[record_id]
+            results.append((self.similarity(grams, self.grams(source)), source, target))
+        results.sort(key=lambda result: (-result[0], result[1]))
+        return results
+    
+    def search(self, text, limit=1):
+        """检索与text相似度不低于阈值的记录（可以在多个线程中同时调用）
+        
+        Returns:
+            list: (相似度, 原文, 译文)，按相似度从高到低排列，最多limit个
+        """
+        if len(self) < self.MIN_SEARCH_RECORDS or not isinstance(text, str):
+            return []
+        cache_key = (self.normalize(text), limit)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            if not self._indexed:
+                self._build_index()
+        
+        # 没有出现在翻译记忆中的三元组编号为-1（排在最前面，但不会命中任何记录）
+        gram_ids = sorted(self._vocabulary.get(gram, -1) for gram in self.grams(text))
+        size = len(gram_ids)
+        known = {gram_id for gram_id in gram_ids if gram_id >= 0}
+        
+        # 倒排表按前缀从稀有到常见累加，总长度超过MAX_POSTINGS后不再累加更常见的三元组
+        candidates = collections.Counter()
+        scanned = 0
+        for gram_id in gram_ids[:self._prefix_length(size)]:
+            posting = self._postings.get(gram_id, ())
+            if scanned and scanned + len(posting) > self.MAX_POSTINGS:
+                break
+            candidates.update(posting)
+            scanned += len(posting)
+        
+        results = []
+        min_size, max_size = self.threshold * size, size / self.threshold if self.threshold else float("inf")
+        for record_id, _ in candidates.most_common(self.MAX_CANDIDATES):
+            record_grams = self._record_grams[record_id]
+            if not min_size <= len(record_grams) <= max_size:
+                continue
+            overlap = len(known.intersection(record_grams))
+            score = overlap / (size + len(record_grams) - overlap)
+            if score >= self.threshold:
+                source, target = self._records[record_id]
+                results.append((score, source, target))
+        results.sort(key=lambda result: (-result[0], result[1]))
+        results = results[:limit]
+        if len(self._cache) >= self.MAX_CACHED:
+            self._cache = {}
+        self._cache[cache_key] = results
+        return results
+
+class WorkStore:
+    """翻译工作数据库（SQLite）
+    
+    保存mod信息、每个语言目录的全部条目（英文原文、已有中文、待翻译/已确定的状态、译文和译文来源）、
+    条目来自哪些mod，以及每个翻译批次的记录。AI翻译和合并都是对这些表的索引查询，
+    每批翻译结果单独提交，程序中断时不会丢失已完成的批次。
+    
+    多个工作进程（可以在不同的机器上）共用一个数据库时，每个进程先领取条目并取得租约，
+    翻译期间定期续租；进程退出后租约过期，条目由其他进程收回。写入译文时只接受仍持有租约的结果，
+    所以同一个条目不会被两个进程同时翻译。
+    """
+    SCHEMA_VERSION = 6
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS mods (
+            position INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            info TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS paths (
+            id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL UNIQUE,
+            mods TEXT NOT NULL DEFAULT '[]'
+        );
+        CREATE TABLE IF NOT EXISTS entries (
+            id INTEGER PRIMARY KEY,
+            path_id INTEGER NOT NULL REFERENCES paths (id),
+            key TEXT NOT NULL,
+            seq INTEGER NOT NULL DEFAULT 0,
+            source TEXT,
+            existing TEXT,
+            status TEXT NOT NULL,
+            result TEXT,
+            provenance TEXT,
+            batch_id INTEGER,
+            issues TEXT,
+            updated_at REAL,
+            lease_owner TEXT,
+            lease_expires REAL,
+            suggestion TEXT,  -- 旧版本保存的翻译示例，已不再使用
+            priority INTEGER NOT NULL DEFAULT 3,
+            UNIQUE (path_id, key)
+        );
+        CREATE INDEX IF NOT EXISTS entries_queue ON entries (status, priority, path_id, seq);
+        CREATE INDEX IF NOT EXISTS entries_lease ON entries (lease_owner);
+        CREATE TABLE IF NOT EXISTS entry_mods (
+            entry_id INTEGER NOT NULL,
+            mod TEXT NOT NULL,
+            PRIMARY KEY (entry_id, mod)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS entry_mods_mod ON entry_mods (mod, entry_id);
+        CREATE TABLE IF NOT EXISTS batches (
+            id INTEGER PRIMARY KEY,
+            path_id INTEGER,  -- 批次中的第一个语言目录，批次的全部语言目录见batch_paths
+            endpoint TEXT,
+            status TEXT NOT NULL,
+            entries INTEGER NOT NULL DEFAULT 0,
+            prompt_tokens INTEGER NOT NULL DEFAULT 0,
+            completion_tokens INTEGER NOT NULL DEFAULT 0,
+            finish_reason TEXT,
+            created_at REAL,
+            finished_at REAL,
+            worker TEXT
+        );
+        CREATE TABLE IF NOT EXISTS batch_paths (
+            batch_id INTEGER NOT NULL,
+            path_id INTEGER NOT NULL,
+            entries INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (batch_id, path_id)
+        ) WITHOUT ROWID;
+    """
+    # 旧版本数据库的升级语句
+    MIGRATIONS = {
+        2: ["ALTER TABLE entries ADD COLUMN lease_owner TEXT", "ALTER TABLE entries ADD COLUMN lease_expires REAL",
+            "ALTER TABLE batches ADD COLUMN worker TEXT"],
+        3: ["ALTER TABLE entries ADD COLUMN suggestion TEXT"],
+        4: ["ALTER TABLE entries ADD COLUMN priority INTEGER NOT NULL DEFAULT 3",
+            "UPDATE entries SET priority = key_priority(key)", "DROP INDEX IF EXISTS entries_status"],
+        # 优先级改为按语义族计算：同一目录中同一族的条目取族中最高的优先级
+        5: ["CREATE TEMP TABLE family_priority AS SELECT path_id, key_family_id(key) AS family, MIN(key_priority(key)) AS priority "
+            "FROM entries GROUP BY path_id, family",
+            "CREATE INDEX temp.family_priority_lookup ON family_priority (path_id, family)",
+            "UPDATE entries SET priority = (SELECT f.priority FROM family_priority f "
+            "WHERE f.path_id = entries.path_id AND f.family = key_family_id(entries.key))",
+            "DROP TABLE family_priority"],
+        # 一个批次可以包含多个语言目录的条目：按已保存的译文补全批次的语言目录，没有译文的批次只有第一个目录
+        6: ["CREATE TABLE IF NOT EXISTS batch_paths (batch_id INTEGER NOT NULL, path_id INTEGER NOT NULL, "
+            "entries INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (batch_id, path_id)) WITHOUT ROWID",
+            "INSERT OR IGNORE INTO batch_paths SELECT batch_id, path_id, COUNT(*) FROM entries "
+            "WHERE batch_id IS NOT NULL GROUP BY batch_id, path_id",
+            "INSERT OR IGNORE INTO batch_paths SELECT id, path_id, entries FROM batches "
+            "WHERE path_id IS NOT NULL AND id NOT IN (SELECT batch_id FROM batch_paths)"]
+    }
+    ENTRY_COLUMNS = ("e.id, p.path, e.key, e.source, e.result, "
+                     "(SELECT json_group_array(m.mod) FROM entry_mods m WHERE m.entry_id = e.id)")
+    
+    # 条目状态
+    EXISTING = "existing"      # 资源包或mod自身已有中文翻译，不需要输出
+    PENDING = "pending"        # 等待AI翻译
+    RESOLVED = "resolved"      # 无需调用API即可确定译文（沿用上次的翻译或无需翻译）
+    TRANSLATED = "translated"  # 已由AI翻译
+    REJECTED = "rejected"      # AI译文未通过校验且已放弃，使用英文原文
+    OUTPUT_STATUSES = (RESOLVED, TRANSLATED)
+    
+    def __init__(self, path, journal_mode="WAL"):
+        self.path = path
+        self.journal_mode = journal_mode  # 放在网络共享驱动器上时应使用DELETE（WAL依赖共享内存，只能在同一台机器上使用）
+        self._conn = None
+        self._lock = threading.RLock()
+    
+    def exists(self):
+        """数据库文件是否存在"""
+        return os.path.exists(self.path)
+    
+    def connect(self):
+        """打开数据库（首次使用时才导入sqlite3并创建表）"""
+        with self._lock:
+            if self._conn is None:
+                import sqlite3
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+                conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.create_function("key_priority", 1, key_priority, deterministic=True)
+                conn.create_function("key_family_id", 1, lambda key: key_family(key)[1], deterministic=True)
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                for target in sorted(self.MIGRATIONS):
+                    if 0 < version < target:
+                        for statement in self.MIGRATIONS[target]:
+                            conn.execute(statement)
+                conn.executescript(self.SCHEMA)
+                conn.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+                self._conn = conn
+            return self._conn
+    
+    def close(self):
+        """关闭数据库连接（删除TEMP目录前调用）"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+    
+    def reset(self):
+        """删除数据库，开始新的一次处理"""
+        self.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+    
+    @contextlib.contextmanager
+    def transaction(self):
+        """写事务，正常结束时提交，出错时回滚"""
+        with self._lock:
+            conn = self.connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+    
+    def query(self, sql, params=()):
+        """执行只读查询，返回全部行"""
+        with self._lock:
+            return self.connect().execute(sql, params).fetchall()
+    
+    @staticmethod
+    def encode(value):
+        """值以JSON文本保存（语言文件中偶尔有非字符串的值）"""
+        return None if value is None else json.dumps(value, ensure_ascii=False)
+    
+    @staticmethod
+    def decode(text):
+        return None if text is None else json.loads(text)
+    
+    def save_mods(self, mod_info):
+        """保存mod信息（替换已有的全部记录）"""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM mods")
+            conn.executemany("INSERT INTO mods (position, name, info) VALUES (?, ?, ?)",
+                             [(position, mod["name"], json.dumps(mod, ensure_ascii=False)) for position, mod in enumerate(mod_info)])
+    
+    def load_mods(self):
+        """读取mod信息列表"""
+        if not self.exists():
+            return []
+        return [json.loads(info) for (info,) in self.query("SELECT info FROM mods ORDER BY position")]
+    
+    def _path_id(self, conn, rel_path):
+        conn.execute("INSERT OR IGNORE INTO paths (path) VALUES (?)", (rel_path,))
+        return conn.execute("SELECT id FROM paths WHERE path = ?", (rel_path,)).fetchone()[0]
+    
+    def store_path_content(self, rel_path, content, mod_names):
+        """保存一个语言目录整理后的内容
+        
+        已翻译、已确定或已放弃的条目保持不变（只更新英文原文），等待翻译的条目按新的内容重新确定状态，
+        所以同一个目录可以多次保存（例如mod更新后）。
         
-        # 保存配置
-        try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=4)
-            print("\n配置已保存到", self.config_file)
-        except Exception as e:
-            print(f"保存配置文件时出错: {str(e)}")
+        Args:
+            rel_path: 语言文件路径
+            content: _merge_mod_lang_files整理出的该路径的内容
+            mod_names: 这些条目来自的mod
         
-        return config
+        Returns:
+            tuple: (新加入翻译队列的条目数, 新确定译文的条目数)
+        """
+        now = time.time()
+        queued = 0
+        resolved = 0
+        with self.transaction() as conn:
+            path_id = self._path_id(conn, rel_path)
+            path_mods = json.loads(conn.execute("SELECT mods FROM paths WHERE id = ?", (path_id,)).fetchone()[0])
+            path_mods.extend(name for name in mod_names if name not in path_mods)
+            conn.execute("UPDATE paths SET mods = ? WHERE id = ?", (json.dumps(path_mods, ensure_ascii=False), path_id))
+            
+            known = {key: (status, source) for key, status, source in conn.execute("SELECT key, status, source FROM entries WHERE path_id = ?", (path_id,))}
+            next_seq = conn.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM entries WHERE path_id = ?", (path_id,)).fetchone()[0]
+            
+            # 待翻译的键按语义族排列，使每批翻译的上下文连贯；同一族的键优先级相同，按优先级领取时不会被拆开
+            families = group_related_keys(list(content["en_us"]))
+            priorities = family_priorities(families)
+            order = [key for family in families for key in family]
+            order.extend(key for key in content["zh_cn"] if key not in content["en_us"])
+            
+            rows = []
+            for seq, key in enumerate(order, next_seq):
+                if key in content["to_translate"]:
+                    status, result = self.PENDING, None
+                elif key in content["resolved"]:
+                    status, result = self.RESOLVED, content["resolved"][key]
+                else:
+                    status, result = self.EXISTING, None
+                previous, previous_source = known.get(key, (None, None))
+                source = self.encode(content["en_us"].get(key))
+                # 已确定译文的条目在原文不变时保留译文；原文变化，或沿用的译文已不再适用时重新整理
+                if previous in (self.RESOLVED, self.TRANSLATED, self.REJECTED) and source == previous_source \
+                        and not (previous == self.RESOLVED and key in content["to_translate"]):
+                    continue
+                if status == self.PENDING and previous != self.PENDING:
+                    queued += 1
+                elif status == self.RESOLVED:
+                    resolved += 1
+                rows.append((path_id, key, seq, source, self.encode(content["zh_cn"].get(key)),
+                             status, self.encode(result), content["provenance"].get(key),
+                             priorities[key] if key in priorities else key_priority(key), now))
+            
+            conn.executemany(
+                "INSERT INTO entries (path_id, key, seq, source, existing, status, result, provenance, priority, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (path_id, key) DO UPDATE SET source = excluded.source, existing = excluded.existing, "
+                "status = excluded.status, result = excluded.result, provenance = excluded.provenance, "
+                "priority = excluded.priority, batch_id = NULL, issues = NULL, "
+                # 原文或状态变化时收回租约，正在翻译旧原文的工作进程的结果不会被保存
+                "lease_owner = CASE WHEN source IS excluded.source AND status = excluded.status THEN lease_owner END, "
+                "lease_expires = CASE WHEN source IS excluded.source AND status = excluded.status THEN lease_expires END, "
+                "updated_at = excluded.updated_at",
+                rows)
+            
+            # 记录条目来自哪些mod（用于mod被删除时移除其待翻译条目，以及按mod统计）
+            entry_ids = {key: entry_id for entry_id, key in conn.execute("SELECT id, key FROM entries WHERE path_id = ?", (path_id,))}
+            conn.executemany("INSERT OR IGNORE INTO entry_mods (entry_id, mod) VALUES (?, ?)",
+                             [(entry_ids[key], name) for key in content["en_us"] for name in mod_names])
+        return queued, resolved
     
-    def get(self, key, default=None):
-        """获取配置项的值"""
-        return self.config.get(key, default)
+    def paths(self):
+        """全部语言目录
+        
+        Returns:
+            list: (路径ID, 路径, mod列表)，按首次整理的顺序排列
+        """
+        if not self.exists():
+            return []
+        return [(path_id, path, json.loads(mods)) for path_id, path, mods in self.query("SELECT id, path, mods FROM paths ORDER BY id")]
     
-    def set(self, key, value):
-        """设置配置项的值"""
-        self.config[key] = value
-        try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            print(f"保存配置文件时出错: {str(e)}")
-
-def load_json_with_comments(file_path):
-    """加载可能包含注释的JSON文件"""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+    def _decode_entry(self, row):
+        entry_id, path, key, source, result, mods = row[:6]
+        return entry_id, path, key, self.decode(source), self.decode(result), json.loads(mods)
+    
+    def _entries(self, status):
+        rows = self.query(f"SELECT {self.ENTRY_COLUMNS} FROM entries e JOIN paths p ON p.id = e.path_id "
+                          "WHERE e.status = ? ORDER BY e.priority, e.path_id, e.seq", (status,))
+        return [self._decode_entry(row) for row in rows]
+    
+    def pending_entries(self):
+        """等待翻译的条目
         
-        # 移除单行注释 (// 注释)
-        content = re.sub(r'//.*?$', '', content, flags=re.MULTILINE)
+        Returns:
+            list: (条目ID, 路径, 键, 英文原文, None, mod列表)，按翻译顺序（优先级、路径、语义族顺序）排列
+        """
+        return self._entries(self.PENDING)
+    
+    def translated_entries(self):
+        """已由AI翻译的条目
         
-        # 移除多行注释 (/* 注释 */)
-        content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)
+        Returns:
+            list: (条目ID, 路径, 键, 英文原文, 译文, mod列表)
+        """
+        return self._entries(self.TRANSLATED)
+    
+    def pending_counts(self):
+        """每个语言目录等待翻译的条目数
         
-        # 尝试解析JSON
-        return json.loads(content)
-    except Exception as e:
-        print(f"警告: 解析JSON文件 {file_path} 时出错: {str(e)}")
-        print("尝试使用更宽松的方式解析...")
+        Returns:
+            dict: 路径 -> 条目数，按路径顺序排列
+        """
+        if not self.exists():
+            return {}
+        return dict(self.query("SELECT p.path, COUNT(*) FROM entries e JOIN paths p ON p.id = e.path_id "
+                               "WHERE e.status = ? GROUP BY e.path_id ORDER BY e.path_id", (self.PENDING,)))
+    
+    def pending_by_priority(self):
+        """每个优先级等待翻译的条目数
         
-        try:
-            # 如果上面的方法失败，尝试使用更宽松的方式解析
-            import json5
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json5.load(f)
-        except ImportError:
-            print("警告: json5模块未安装，无法使用更宽松的解析方式")
-            # 如果json5模块未安装，返回空字典
+        Returns:
+            dict: 优先级（key_priority）-> 条目数
+        """
+        if not self.exists():
             return {}
-        except Exception as e2:
-            print(f"错误: 无法解析JSON文件 {file_path}: {str(e2)}")
+        return dict(self.query("SELECT priority, COUNT(*) FROM entries WHERE status = ? GROUP BY priority ORDER BY priority",
+                               (self.PENDING,)))
+    
+    def claim_entries(self, owner, limit, lease_seconds, exclude_ids=()):
+        """领取一批等待翻译、且没有被其他工作进程持有（或租约已过期）的条目
+        
+        条目按优先级领取（物品、方块和实体名称及其提示文本最先，配置文本最后），翻译中途停止时最常见的文本已经翻译完成。
+        同一语义族的条目优先级相同，在同一目录中按顺序连续领取。
+        
+        Args:
+            owner: 工作进程标识
+            limit: 最多领取的条目数
+            lease_seconds: 租约时长（秒）
+            exclude_ids: 不领取的条目ID（本进程已经放弃的条目）
+        
+        Returns:
+            tuple: (条目列表，格式同pending_entries, 从其他进程的过期租约中收回的条目数)
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            rows = conn.execute(
+                f"SELECT {self.ENTRY_COLUMNS}, e.lease_owner FROM entries e JOIN paths p ON p.id = e.path_id "
+                "WHERE e.status = ? AND (e.lease_owner IS NULL OR e.lease_expires < ?) "
+                "AND e.id NOT IN (SELECT value FROM json_each(?)) ORDER BY e.priority, e.path_id, e.seq LIMIT ?",
+                (self.PENDING, now, json.dumps(sorted(exclude_ids)), limit)).fetchall()
+            conn.executemany("UPDATE entries SET lease_owner = ?, lease_expires = ? WHERE id = ?",
+                             [(owner, now + lease_seconds, row[0]) for row in rows])
+        reclaimed = sum(1 for row in rows if row[6] not in (None, owner))
+        return [self._decode_entry(row) for row in rows], reclaimed
+    
+    def lease_entries(self, entry_ids, owner, lease_seconds):
+        """为指定的条目取得租约（用于重新翻译未通过校验的条目）
+        
+        Returns:
+            set: 成功取得租约的条目ID（正由其他进程持有的条目不包括在内）
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany("UPDATE entries SET lease_owner = ?, lease_expires = ? "
+                             "WHERE id = ? AND (lease_owner IS NULL OR lease_owner = ? OR lease_expires < ?)",
+                             [(owner, now + lease_seconds, entry_id, owner, now) for entry_id in entry_ids])
+            return {entry_id for (entry_id,) in conn.execute(
+                "SELECT id FROM entries WHERE lease_owner = ? AND id IN (SELECT value FROM json_each(?))",
+                (owner, json.dumps(list(entry_ids))))}
+    
+    def renew_leases(self, owner, lease_seconds):
+        """续租本进程持有的全部条目（心跳），返回续租的条目数"""
+        with self.transaction() as conn:
+            return conn.execute("UPDATE entries SET lease_expires = ? WHERE lease_owner = ?",
+                                (time.time() + lease_seconds, owner)).rowcount
+    
+    def release_leases(self, owner, entry_ids=None):
+        """释放本进程持有的租约（entry_ids为None时释放全部），条目可以立即被其他进程领取"""
+        with self.transaction() as conn:
+            if entry_ids is None:
+                conn.execute("UPDATE entries SET lease_owner = NULL, lease_expires = NULL WHERE lease_owner = ?", (owner,))
+            else:
+                conn.executemany("UPDATE entries SET lease_owner = NULL, lease_expires = NULL WHERE id = ? AND lease_owner = ?",
+                                 [(entry_id, owner) for entry_id in entry_ids])
+    
+    def active_leases(self):
+        """各工作进程持有的有效租约数
+        
+        Returns:
+            dict: 工作进程标识 -> 条目数
+        """
+        if not self.exists():
             return {}
-
-def split_json_file(json_data, output_dir, base_filename, items_per_file=40):
-    """将JSON数据分割成多个文件，每个文件包含指定数量的项目"""
-    if not json_data:
-        return []
+        return dict(self.query("SELECT lease_owner, COUNT(*) FROM entries WHERE lease_owner IS NOT NULL AND lease_expires >= ? "
+                               "GROUP BY lease_owner ORDER BY lease_owner", (time.time(),)))
+    
+    def record_batch(self, paths, endpoint, status, entries, usage=None, finish_reason=None, created_at=None, results=None, owner=None):
+        """记录一个翻译批次，并在同一事务中保存该批次的译文
+        
+        owner不为None时只保存该进程仍持有租约的条目的译文（租约已被其他进程收回的结果会被丢弃），
+        保存后释放这些条目的租约。
+        
+        Args:
+            paths: 语言文件路径 -> 批次中该路径的条目数（批次可以包含多个路径的条目）
+            endpoint: 处理该批次的API端点名称
+            status: 批次结果（done/failed/truncated/retry）
+            entries: 批次中的条目数
+            usage: token用量
+            finish_reason: 响应的结束原因
+            created_at: 发送时间
+            results: 条目ID -> 译文
+            owner: 工作进程标识
+        
+        Returns:
+            int: 实际保存的译文数
+        """
+        usage = usage or {}
+        now = time.time()
+        with self.transaction() as conn:
+            path_ids = dict(conn.execute("SELECT path, id FROM paths WHERE path IN (SELECT value FROM json_each(?))",
+                                         (json.dumps(list(paths), ensure_ascii=False),)))
+            batch_id = conn.execute(
+                "INSERT INTO batches (path_id, endpoint, status, entries, prompt_tokens, completion_tokens, finish_reason, "
+                "created_at, finished_at, worker) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path_ids.get(next(iter(paths), None)), endpoint, status, entries, usage.get("prompt_tokens") or 0,
+                 usage.get("completion_tokens") or 0, finish_reason, created_at or now, now, owner)).lastrowid
+            conn.executemany("INSERT INTO batch_paths (batch_id, path_id, entries) VALUES (?, ?, ?)",
+                             [(batch_id, path_ids[path], count) for path, count in paths.items() if path in path_ids])
+            if not results:
+                return 0
+            return conn.executemany(
+                "UPDATE entries SET status = ?, result = ?, provenance = 'api', batch_id = ?, issues = NULL, updated_at = ?, "
+                "lease_owner = NULL, lease_expires = NULL WHERE id = ? AND (? IS NULL OR lease_owner = ?)",
+                [(self.TRANSLATED, self.encode(value), batch_id, now, entry_id, owner, owner)
+                 for entry_id, value in results.items()]).rowcount
     
-    # 确保输出目录存在
-    os.makedirs(output_dir, exist_ok=True)
+    def mark_issues(self, issues, status=None):
+        """记录条目的校验问题，status不为None时同时修改状态
+        
+        Args:
+            issues: 条目ID -> 问题代码列表
+            status: 新的状态
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany("UPDATE entries SET issues = ?, status = COALESCE(?, status), updated_at = ? WHERE id = ?",
+                             [(json.dumps(problems), status, now, entry_id) for entry_id, problems in issues.items()])
     
-    # 获取所有键
-    all_keys = list(json_data.keys())
+    def path_results(self, path_id):
+        """一个语言目录中需要输出的译文（沿用/无需翻译的条目和AI译文）"""
+        rows = self.query("SELECT key, result FROM entries WHERE path_id = ? AND status IN (?, ?) ORDER BY seq",
+                          (path_id,) + self.OUTPUT_STATUSES)
+        return {key: self.decode(result) for key, result in rows}
     
-    # 计算需要分割的文件数
-    total_files = math.ceil(len(all_keys) / items_per_file)
+    def memory_pairs(self):
+        """可以加入翻译记忆的原文和译文（原文和译文都是文本且不相同，在SQLite中解码和过滤）
+        
+        Returns:
+            list: (原文, 译文, 来源)，包括输出的译文（来源为api、snapshot等）和已有的中文（来源为mod或resource_pack），按路径顺序排列
+        """
+        return self.query("SELECT json_extract(source, '$'), json_extract(target, '$'), origin FROM ("
+                          "SELECT path_id, seq, source, CASE WHEN status IN (?, ?) THEN result ELSE existing END AS target, "
+                          "COALESCE(provenance, 'api') AS origin FROM entries "
+                          "WHERE source IS NOT NULL AND status != ? AND COALESCE(provenance, '') != 'prefilter') "
+                          "WHERE json_type(source) = 'text' AND json_type(target) = 'text' AND source != target ORDER BY path_id, seq",
+                          self.OUTPUT_STATUSES + (self.REJECTED,))
     
-    split_files = []
+    def path_sources(self, path_id):
+        """一个语言目录的英文原文"""
+        rows = self.query("SELECT key, source FROM entries WHERE path_id = ? AND source IS NOT NULL ORDER BY seq", (path_id,))
+        return {key: self.decode(source) for key, source in rows}
     
-    # 分割JSON数据并写入文件
-    for i in range(total_files):
-        start_idx = i * items_per_file
-        end_idx = min((i + 1) * items_per_file, len(all_keys))
+    def status_counts(self, path_id=None):
+        """各状态的条目数
         
-        # 创建当前分片的数据
-        current_data = {}
-        for key in all_keys[start_idx:end_idx]:
-            current_data[key] = json_data[key]
+        Args:
+            path_id: 只统计该语言目录，为None时统计全部
         
-        # 生成输出文件名
-        if total_files > 1:
-            output_filename = f"{base_filename}_{i+1}.json"
+        Returns:
+            dict: 状态 -> 条目数
+        """
+        if not self.exists():
+            return {}
+        if path_id is None:
+            rows = self.query("SELECT status, COUNT(*) FROM entries GROUP BY status")
         else:
-            output_filename = f"{base_filename}.json"
+            rows = self.query("SELECT status, COUNT(*) FROM entries WHERE path_id = ? GROUP BY status", (path_id,))
+        return dict(rows)
+    
+    def status_by_mod(self):
+        """每个mod各状态的条目数
         
-        output_path = os.path.join(output_dir, output_filename)
+        Returns:
+            dict: mod名称 -> {状态: 条目数}
+        """
+        if not self.exists():
+            return {}
+        result = {}
+        for mod_name, status, count in self.query(
+                "SELECT m.mod, e.status, COUNT(*) FROM entry_mods m JOIN entries e ON e.id = m.entry_id GROUP BY m.mod, e.status"):
+            result.setdefault(mod_name, {})[status] = count
+        return result
+    
+    def drop_pending(self, mod_names, keep_keys=None):
+        """移除只属于指定mod、且尚未翻译的待翻译条目
         
-        # 写入JSON文件
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(current_data, f, ensure_ascii=False, indent=4)
+        Args:
+            mod_names: mod文件名集合
+            keep_keys: 需要保留的键，格式为 {语言文件路径: 键集合}；为None时全部移除，并把这些mod从路径的来源列表中移除
         
-        split_files.append(output_path)
-    
-    return split_files
+        Returns:
+            int: 移除的条目数
+        """
+        if not self.exists():
+            return 0
+        names = json.dumps(sorted(mod_names), ensure_ascii=False)
+        with self.transaction() as conn:
+            candidates = conn.execute(
+                "SELECT e.id, p.path, e.key FROM entries e JOIN paths p ON p.id = e.path_id WHERE e.status = ? "
+                "AND EXISTS (SELECT 1 FROM entry_mods m WHERE m.entry_id = e.id AND m.mod IN (SELECT value FROM json_each(?))) "
+                "AND NOT EXISTS (SELECT 1 FROM entry_mods m WHERE m.entry_id = e.id AND m.mod NOT IN (SELECT value FROM json_each(?)))",
+                (self.PENDING, names, names)).fetchall()
+            dropped = [(entry_id,) for entry_id, path, key in candidates if key not in (keep_keys or {}).get(path, ())]
+            conn.executemany("DELETE FROM entry_mods WHERE entry_id = ?", dropped)
+            conn.executemany("DELETE FROM entries WHERE id = ?", dropped)
+            
+            if keep_keys is None:
+                for path_id, mods in conn.execute("SELECT id, mods FROM paths").fetchall():
+                    conn.execute("UPDATE paths SET mods = ? WHERE id = ?",
+                                 (json.dumps([name for name in json.loads(mods) if name not in mod_names], ensure_ascii=False), path_id))
+        return len(dropped)
 
 class ModTranslator:
-    def __init__(self):
+    """汉化流程：处理mod文件、AI翻译、合并并生成资源包
+    
+    Args:
+        config: 配置，为None时加载config.json
+        store: 翻译工作数据库，为None时使用TEMP目录下的work.db。命令行的worker/estimate传入要使用的数据库，
+            此时不创建TEMP目录、不在后台检查更新，统计和校验报告写在数据库所在的目录
+    """
+    def __init__(self, config=None, store=None):
         # 加载配置
-        self.config = Config()
+        self.config = config or Config()
+        headless = store is not None
         
         # 启用Windows长路径支持
-        self._enable_long_paths()
+        if not headless:
+            self._enable_long_paths()
         
-        self.temp_dir = os.path.join(os.getcwd(), "TEMP")
+        self.temp_dir = os.path.dirname(store.path) if headless else os.path.join(os.getcwd(), "TEMP")
         self.mod_dir = os.path.join(self.temp_dir, "mod")
-        self.fanyi_dir = os.path.join(self.temp_dir, "fanyi")
-        self.fanyi_ok_dir = os.path.join(self.temp_dir, "fanyi_ok")
         self.output_dir = os.path.join(self.temp_dir, "OUTPUT")
         self.resourcepacks_dir = os.path.join(self.temp_dir, "resourcepacks")
-        self.mod_json_path = os.path.join(self.mod_dir, "mod.json")
+        
+        # 翻译工作数据库：mod信息、全部条目及其翻译状态和结果
+        self.work_db_path = store.path if headless else os.path.join(self.temp_dir, "work.db")
+        self.store = store or WorkStore(self.work_db_path, "DELETE" if self.config.get("shared_work_db", False) else "WAL")
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"  # 在工作数据库中持有租约的标识
+        
+        # 各阶段的性能统计，跨多次启动累积，直到生成资源包时写入运行报告
+        self.metrics = RunMetrics()
+        self.metrics_path = os.path.join(self.temp_dir, "run_metrics.json")
+        self.metrics.load(self.metrics_path)
         self.selected_mods = []
         self.selected_resource_packs = []
         self.extracted_translations = {}  # 用于存储从资源包中提取的翻译
+        self.glossary = None  # 用户术语表，翻译时加载
         
-        # 创建隐藏的tkinter根窗口，用于文件选择对话框
-        self.root = tk.Tk()
-        self.root.withdraw()  # 隐藏窗口
+        # 每个语言目录的原文快照（英文原文哈希 + 已有翻译），用于mod更新后的增量翻译
+        self.snapshot_dir = self.config.get_data_path("snapshots")
+        self._snapshot_cache = {}
+        self.memory = TranslationMemory(self.config.get_data_path("translation_memory.db"))
         
-        # 确保翻译结果目录存在
-        os.makedirs(self.fanyi_ok_dir, exist_ok=True)
+        # 隐藏的tkinter根窗口，只在第一次打开文件选择对话框时创建
+        self._tk_root = None
+        
+        self.update_cache_path = self.config.get_data_path("update_cache.json")
+        self.update_checker = UpdateChecker(self.update_cache_path, self.config.get('update_check_ttl', 21600))
+        if headless:
+            return
+        
+        # 确保输出目录存在
         os.makedirs(self.output_dir, exist_ok=True)
         os.makedirs(self.resourcepacks_dir, exist_ok=True)
         
-        # 如果配置允许，在后台检查更新
-        if self.config.get('auto_check_update', True) and REQUESTS_AVAILABLE:
-            auto_update = self.config.get('auto_update', False)
-            threading.Thread(target=lambda: check_for_updates(silent=True, auto_update=auto_update), daemon=True).start()
+        # 如果配置允许，在后台检查更新（不阻塞主菜单）
+        if self.config.get('auto_check_update', True) and _is_module_available("requests"):
+            self.update_checker.start()
+    
+    def _get_tk_root(self):
+        """获取隐藏的tkinter根窗口，首次调用时才导入tkinter并创建窗口"""
+        if self._tk_root is None:
+            import tkinter as tk
+            self._tk_root = tk.Tk()
+            self._tk_root.withdraw()  # 隐藏窗口
+        return self._tk_root
     
     def _enable_long_paths(self):
         """尝试启用Windows长路径支持"""
@@ -542,6 +2710,7 @@ class ModTranslator:
     
     def clean_temp_folder(self):
         """清理TEMP文件夹"""
+        self.store.close()
         if os.path.exists(self.temp_dir):
             # 询问用户是否也清理资源包翻译
             keep_resource_packs = False
@@ -551,9 +2720,6 @@ class ModTranslator:
                 keep_resource_packs = choice != 'n'
             
             if keep_resource_packs and self.extracted_translations:
-                # 保存资源包目录内容
-                resource_packs_backup = self.extracted_translations.copy()
-                
                 # 删除TEMP目录（除了resourcepacks）
                 for item in os.listdir(self.temp_dir):
                     item_path = os.path.join(self.temp_dir, item)
@@ -563,8 +2729,6 @@ class ModTranslator:
                         else:
                             os.remove(item_path)
                 
-                # 恢复提取的翻译
-                self.extracted_translations = resource_packs_backup
                 print("已清理临时文件夹（保留资源包翻译数据）")
             else:
                 # 完全清理，包括资源包
@@ -575,8 +2739,6 @@ class ModTranslator:
         
         # 创建必要的目录
         os.makedirs(self.mod_dir, exist_ok=True)
-        os.makedirs(self.fanyi_dir, exist_ok=True)
-        os.makedirs(self.fanyi_ok_dir, exist_ok=True)
         os.makedirs(self.output_dir, exist_ok=True)
         os.makedirs(self.resourcepacks_dir, exist_ok=True)
     
@@ -584,7 +2746,9 @@ class ModTranslator:
         """使用文件选择对话框选择mod文件"""
         print("\n=== 选择mod文件 ===")
         
+        from tkinter import filedialog
         files = filedialog.askopenfilenames(
+            parent=self._get_tk_root(),
             title="选择Mod文件",
             filetypes=[("Mod文件", "*.jar"), ("Zip文件", "*.zip"), ("所有文件", "*.*")]
         )
@@ -608,7 +2772,9 @@ class ModTranslator:
         print("请选择已有的翻译资源包，这些资源包中的翻译内容将被用于过滤")
         print("如果不需要使用资源包进行过滤，可以直接关闭文件选择对话框")
         
+        from tkinter import filedialog
         files = filedialog.askopenfilenames(
+            parent=self._get_tk_root(),
             title="选择翻译资源包（可选）",
             filetypes=[("资源包文件", "*.zip"), ("所有文件", "*.*")]
         )
@@ -681,8 +2847,8 @@ class ModTranslator:
                                     if normalized_path not in self.extracted_translations:
                                         self.extracted_translations[normalized_path] = {}
                                     
-                                    # 合并翻译
-                                    self.extracted_translations[normalized_path].update(zh_data)
+                                    # 合并翻译（键名驻留，与mod语言文件中的相同键共享同一个字符串）
+                                    self.extracted_translations[normalized_path].update((sys.intern(key), value) for key, value in zh_data.items())
                                     print(f"  - 已提取 {relative_path} 的翻译，包含 {len(zh_data)} 个条目")
                             except Exception as e:
                                 print(f"  - 警告: 读取翻译文件 {file_info.filename} 时出错: {str(e)}")
@@ -708,13 +2874,9 @@ class ModTranslator:
             return False
         
         # 清理并创建TEMP文件夹，但保留resourcepacks目录中的内容
+        self.store.close()
         if os.path.exists(self.temp_dir):
-            # 保存资源包目录内容
-            resource_packs_backup = None
-            if os.path.exists(self.resourcepacks_dir) and self.extracted_translations:
-                resource_packs_backup = self.extracted_translations.copy()
-            
-            # 删除TEMP目录（除了resourcepacks）
+            # 删除TEMP目录（除了resourcepacks，内存中提取的翻译不受影响，无需备份）
             for item in os.listdir(self.temp_dir):
                 item_path = os.path.join(self.temp_dir, item)
                 if item != "resourcepacks" or not self.extracted_translations:
@@ -722,17 +2884,15 @@ class ModTranslator:
                         shutil.rmtree(item_path)
                     else:
                         os.remove(item_path)
-            
-            # 恢复提取的翻译
-            if resource_packs_backup:
-                self.extracted_translations = resource_packs_backup
         
         # 创建必要的目录
         os.makedirs(self.mod_dir, exist_ok=True)
-        os.makedirs(self.fanyi_dir, exist_ok=True)
-        os.makedirs(self.fanyi_ok_dir, exist_ok=True)
         os.makedirs(self.output_dir, exist_ok=True)
         os.makedirs(self.resourcepacks_dir, exist_ok=True)
+        self.store.reset()
+        
+        # 重新处理mod即开始新的一次运行
+        self.metrics.reset()
         
         mod_info = []
         stats = {
@@ -754,83 +2914,17 @@ class ModTranslator:
         
         # 提取每个mod的语言文件
         for mod_path in self.selected_mods:
-            mod_name = os.path.basename(mod_path)
-            
-            try:
-                # 先检查mod中的语言文件情况
-                lang_check_result = self._check_lang_files(mod_path)
-                
-                if not lang_check_result["has_lang_files"]:
-                    print(f"跳过 {mod_name} - 未包含语言文件")
-                    stats["no_lang_files"] += 1
-                    continue
-                
-                # 检查是否有英文语言文件
-                if not lang_check_result["has_en_us"]:
-                    print(f"跳过 {mod_name} - 未包含英文语言文件")
-                    stats["no_en_us"] += 1
-                    continue
-                
-                # 检查中文翻译情况
-                if lang_check_result["has_zh_cn"]:
-                    # 如果启用了深度检查，检查中文翻译是否完整
-                    if self._should_check_translation_completeness():
-                        completeness = self._check_translation_completeness(mod_path)
-                        if completeness["is_complete"]:
-                            print(f"跳过 {mod_name} - 已包含完整的中文语言文件 (完整率: {completeness['percentage']:.1f}%)")
-                            stats["complete_zh_cn"] += 1
-                            continue
-                        else:
-                            print(f"处理 {mod_name} - 中文翻译不完整 (完整率: {completeness['percentage']:.1f}%)")
-                            stats["partial_zh_cn"] += 1
-                    else:
-                        # 不启用深度检查，只要有中文文件就跳过
-                        print(f"跳过 {mod_name} - 已包含中文语言文件")
-                        stats["complete_zh_cn"] += 1
-                        continue
-                else:
-                    # 完全没有中文翻译
-                    print(f"处理 {mod_name} - 无中文翻译")
-                    stats["no_zh_cn"] += 1
-                
-                # 清理文件夹名称，避免过长路径
-                clean_name = self._sanitize_folder_name(mod_name.split('.')[0])
-                mod_extract_dir = os.path.join(self.mod_dir, clean_name)
-                os.makedirs(mod_extract_dir, exist_ok=True)
-                
-                print(f"正在提取 {mod_name} 的语言文件...")
-                
-                # 提取语言文件
-                lang_files = self._extract_lang_files(mod_path, mod_extract_dir, lang_check_result["has_zh_cn"])
-                
-                if lang_files:
-                    # 记录mod信息
-                    mod_info.append({
-                        "name": mod_name,
-                        "path": mod_extract_dir,
-                        "original_path": mod_path,
-                        "lang_files": lang_files,
-                        "has_partial_zh_cn": lang_check_result["has_zh_cn"],
-                        "translation_status": "partial" if lang_check_result["has_zh_cn"] else "none"
-                    })
-                    print(f"成功提取 {mod_name} 的语言文件，共 {len(lang_files)} 个")
-                    stats["processed"] += 1
-                else:
-                    # 这种情况应该不会发生，因为我们已经预先检查了
-                    print(f"警告: 在 {mod_name} 中未找到可用的语言文件，跳过")
-                    # 删除创建的空文件夹
-                    if os.path.exists(mod_extract_dir):
-                        shutil.rmtree(mod_extract_dir)
-            except Exception as e:
-                print(f"错误: 处理 {mod_name} 时出错: {str(e)}")
+            mod_entry = self._process_single_mod(mod_path, stats)
+            if mod_entry:
+                mod_info.append(mod_entry)
         
-        # 创建mod.json
+        # 保存mod信息
         if mod_info:
-            with open(self.mod_json_path, 'w', encoding='utf-8') as f:
-                json.dump(mod_info, f, ensure_ascii=False, indent=4)
+            self.store.save_mods(mod_info)
             
             # 整理翻译文件
             has_to_translate = self._organize_translation_files(mod_info)
+            self.metrics.save(self.metrics_path)
             
             # 显示统计信息
             print("\n=== 处理统计 ===")
@@ -841,13 +2935,14 @@ class ModTranslator:
             print(f"  - 无语言文件: {stats['no_lang_files']} 个")
             print(f"  - 无英文语言文件: {stats['no_en_us']} 个")
             print(f"  - 已有完整中文翻译: {stats['complete_zh_cn']} 个")
-            print(f"\nmod信息已保存到 {self.mod_json_path}")
+            print(f"\nmod信息和整理后的待翻译条目已保存到 {self.work_db_path}")
             
             if has_to_translate:
-                print(f"整理后的翻译文件已保存到 {self.fanyi_dir}")
                 return True
             else:
-                print("\n所有内容已通过资源包翻译或mod自身翻译，无需进一步翻译")
+                print("\n所有内容已通过资源包翻译、mod自身翻译、沿用的已有翻译或本地预过滤完成，无需进一步翻译")
+                if self.store.status_counts().get(WorkStore.RESOLVED):
+                    print("沿用的翻译可直接选择 5 合并生成资源包")
                 return False
         else:
             print("\n没有找到需要处理的mod文件")
@@ -859,56 +2954,621 @@ class ModTranslator:
                 print(f"{stats['no_en_us']} 个mod不包含英文语言文件")
             return False
     
+    def watch_mods_interactively(self):
+        """选择mods文件夹并开始监视"""
+        print("\n=== 监视mods文件夹 ===")
+        
+        from tkinter import filedialog
+        mods_dir = filedialog.askdirectory(
+            parent=self._get_tk_root(),
+            title="选择要监视的mods文件夹"
+        )
+        
+        if not mods_dir:
+            print("未选择任何文件夹")
+            return False
+        
+        return self.watch_mods_folder(mods_dir)
+    
+    def watch_mods_folder(self, mods_dir, interval=None):
+        """监视mods文件夹，增量处理新增、更新和删除的mod文件
+        
+        通过轮询文件大小和修改时间检测变化（不依赖inotify，Windows下同样可用），
+        文件在两次轮询之间保持不变才会被处理，避免读取尚未复制完成的jar。
+        只扫描发生变化的mod，并只把它们新增的待翻译条目加入翻译队列；
+        被删除mod尚未翻译的内容会从队列中移除。按Ctrl+C停止监视。
+        
+        Args:
+            mods_dir: mods文件夹路径
+            interval: 轮询间隔（秒），默认使用配置中的watch_interval
+            
+        Returns:
+            bool: 是否成功开始监视
+        """
+        mods_dir = os.path.abspath(mods_dir)
+        if not os.path.isdir(mods_dir):
+            print(f"错误: 文件夹不存在: {mods_dir}")
+            return False
+        
+        interval = interval or self.config.get("watch_interval", 5)
+        print(f"正在监视: {mods_dir}（每 {interval} 秒检查一次，按Ctrl+C停止）")
+        
+        # 读取上次监视的状态，首次监视时完整处理一次
+        processed = self._load_watch_state(mods_dir)
+        if processed is None:
+            processed = self._scan_mods_folder(mods_dir)
+            print("首次监视该文件夹，先完整处理所有mod文件")
+            self.selected_mods = sorted(processed)
+            if self.selected_mods:
+                self.process_mods()
+            self._save_watch_state(mods_dir, processed)
+        else:
+            self.selected_mods = sorted(processed)
+            print(f"已恢复上次的监视状态（{len(processed)} 个mod文件）")
+        
+        previous_poll = dict(processed)
+        try:
+            while True:
+                current = self._scan_mods_folder(mods_dir)
+                
+                # 只处理两次轮询之间没有变化的文件
+                stable = {path: sig for path, sig in current.items() if previous_poll.get(path) == sig}
+                added = sorted(path for path in stable if path not in processed)
+                changed = sorted(path for path in stable if path in processed and processed[path] != stable[path])
+                removed = sorted(path for path in processed if path not in current)
+                
+                if added or changed or removed:
+                    self._apply_mod_changes(added, changed, removed)
+                    for path in removed:
+                        processed.pop(path, None)
+                    for path in added + changed:
+                        processed[path] = current[path]
+                    self.selected_mods = sorted(processed)
+                    self._save_watch_state(mods_dir, processed)
+                
+                previous_poll = current
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("\n已停止监视")
+        
+        return True
+    
+    def _scan_mods_folder(self, mods_dir):
+        """获取mods文件夹中所有mod文件的签名（大小和修改时间）"""
+        snapshot = {}
+        for entry in os.scandir(mods_dir):
+            if entry.is_file() and entry.name.lower().endswith(('.jar', '.zip')):
+                stat = entry.stat()
+                snapshot[os.path.abspath(entry.path)] = [stat.st_size, stat.st_mtime_ns]
+        return snapshot
+    
+    def _load_watch_state(self, mods_dir):
+        """读取监视状态，文件夹不匹配或不存在时返回None"""
+        state_path = os.path.join(self.temp_dir, "watch_state.json")
+        if not os.path.exists(state_path):
+            return None
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get("mods_dir") == mods_dir:
+                return state.get("files", {})
+        except Exception as e:
+            print(f"警告: 读取监视状态时出错: {str(e)}")
+        return None
+    
+    def _save_watch_state(self, mods_dir, files):
+        """保存监视状态"""
+        os.makedirs(self.temp_dir, exist_ok=True)
+        state_path = os.path.join(self.temp_dir, "watch_state.json")
+        with open(state_path, 'w', encoding='utf-8') as f:
+            json.dump({"mods_dir": mods_dir, "files": files}, f, ensure_ascii=False, indent=4)
+    
+    def _apply_mod_changes(self, added, changed, removed):
+        """增量处理发生变化的mod文件
+        
+        Args:
+            added: 新增的mod文件路径列表
+            changed: 内容发生变化的mod文件路径列表
+            removed: 被删除的mod文件路径列表
+        """
+        print(f"\n[{datetime.datetime.now().strftime('%H:%M:%S')}] 检测到变化: 新增 {len(added)} 个，更新 {len(changed)} 个，删除 {len(removed)} 个")
+        for path in added:
+            print(f"  + {os.path.basename(path)}")
+        for path in changed:
+            print(f"  * {os.path.basename(path)}")
+        for path in removed:
+            print(f"  - {os.path.basename(path)}")
+        
+        os.makedirs(self.mod_dir, exist_ok=True)
+        
+        # 读取已有的mod信息
+        mod_info = self.store.load_mods()
+        
+        # 移除已删除或已更新的mod的旧信息，已删除mod尚未翻译的内容直接丢弃
+        stale_paths = set(changed) | set(removed)
+        stale_mods = [mod for mod in mod_info if os.path.abspath(mod["original_path"]) in stale_paths]
+        mod_info = [mod for mod in mod_info if os.path.abspath(mod["original_path"]) not in stale_paths]
+        removed_names = {mod["name"] for mod in stale_mods if os.path.abspath(mod["original_path"]) in set(removed)}
+        changed_names = {mod["name"] for mod in stale_mods} - removed_names
+        if removed_names:
+            self._drop_pending_work(removed_names)
+        for mod in stale_mods:
+            if os.path.exists(mod["path"]):
+                shutil.rmtree(mod["path"])
+        
+        # 只扫描新增和更新的mod
+        stats = {
+            "processed": 0,
+            "no_lang_files": 0,
+            "no_en_us": 0,
+            "complete_zh_cn": 0,
+            "partial_zh_cn": 0,
+            "no_zh_cn": 0
+        }
+        new_mods = []
+        for mod_path in added + changed:
+            mod_entry = self._process_single_mod(mod_path, stats)
+            if mod_entry:
+                new_mods.append(mod_entry)
+        
+        mod_info.extend(new_mods)
+        self.store.save_mods(mod_info)
+        
+        # 把新增的待翻译条目加入翻译队列
+        queued, pending_keys = self._queue_pending_keys(new_mods)
+        
+        # 已更新的mod：队列中新版本不再需要翻译的条目（已删除或已有翻译）需要移除
+        if changed_names:
+            keep_keys = {}
+            for mod_name in changed_names:
+                for rel_path, keys in pending_keys.get(mod_name, {}).items():
+                    keep_keys.setdefault(rel_path, set()).update(keys)
+            self._drop_pending_work(changed_names, keep_keys)
+        if queued:
+            print(f"已将 {queued} 个新的待翻译条目加入翻译队列，可选择 4 进行翻译")
+        else:
+            print("没有新的待翻译条目")
+    
+    def _drop_pending_work(self, mod_names, keep_keys=None):
+        """从翻译队列中移除只属于指定mod、且尚未翻译的待翻译条目
+        
+        Args:
+            mod_names: mod文件名集合
+            keep_keys: 需要保留的键，格式为 {语言文件路径: 键集合}，默认全部移除
+            
+        Returns:
+            int: 移除的待翻译条目数
+        """
+        dropped_keys = self.store.drop_pending(mod_names, keep_keys)
+        if dropped_keys:
+            print(f"已从翻译队列中移除 {dropped_keys} 个不再需要的待翻译条目")
+        return dropped_keys
+    
+    def _queue_pending_keys(self, mod_entries):
+        """把mod中尚未排队或翻译过的待翻译条目加入翻译队列
+        
+        每个条目记录来自哪些mod，以便mod被删除时能准确移除其待翻译内容。
+        与整理翻译文件时相同，写入前先用翻译记忆预填。
+        
+        Args:
+            mod_entries: mod信息列表
+            
+        Returns:
+            tuple: (新加入队列的条目数, {mod文件名: {语言文件路径: 仍需翻译的键集合}})
+        """
+        queued = 0
+        pending_keys = {}
+        memory_stats = collections.Counter()
+        for mod in mod_entries:
+            merged_translations = {}
+            self._merge_mod_lang_files(mod, merged_translations)
+            
+            for rel_path, content in merged_translations.items():
+                pending, resolved = self._store_path_content(rel_path, content, [mod["name"]], memory_stats)
+                pending_keys.setdefault(mod["name"], {})[rel_path] = set(content["to_translate"])
+                queued += pending
+                if pending:
+                    print(f"已加入翻译队列: {rel_path} ({pending} 个条目)")
+                if resolved:
+                    print(f"已在本地确定译文（沿用翻译、翻译记忆或无需翻译）: {rel_path} ({resolved} 个条目)")
+        if memory_stats["prefilled"]:
+            print(f"使用翻译记忆中相似原文的已有译文预填了 {memory_stats['prefilled']} 个条目")
+        return queued, pending_keys
+    
+    def show_work_status(self):
+        """显示翻译进度：全部条目和每个mod各状态的条目数"""
+        counts = self.store.status_counts()
+        if not counts:
+            print("翻译工作数据库为空，请先处理mod文件")
+            return False
+        
+        columns = [(WorkStore.PENDING, "待翻译"), (WorkStore.TRANSLATED, "AI已翻译"), (WorkStore.RESOLVED, "沿用/无需翻译"),
+                   (WorkStore.REJECTED, "已放弃"), (WorkStore.EXISTING, "已有中文")]
+        print("\n=== 翻译进度 ===")
+        print("全部: " + "，".join(f"{name} {counts.get(status, 0)}" for status, name in columns))
+        by_mod = self.store.status_by_mod()
+        for mod_name, mod_counts in sorted(by_mod.items(), key=lambda item: (-item[1].get(WorkStore.PENDING, 0), item[0])):
+            print(f"  - {mod_name}: " + "，".join(f"{name} {mod_counts.get(status, 0)}" for status, name in columns if mod_counts.get(status)))
+        leases = self.store.active_leases()
+        if leases:
+            print("正在翻译的工作进程: " + "，".join(f"{owner} ({count} 个条目)" for owner, count in leases.items()))
+        return True
+    
+    def _process_single_mod(self, mod_path, stats):
+        """检查并提取单个mod的语言文件
+        
+        Args:
+            mod_path: mod文件路径
+            stats: 处理统计字典，会被原地更新
+            
+        Returns:
+            dict: mod信息（写入mod.json的条目），跳过或失败时返回None
+        """
+        mod_name = os.path.basename(mod_path)
+        
+        try:
+            # 扫描mod中的语言文件，同时计算每个命名空间的翻译完整度
+            check_completeness = self._should_check_translation_completeness()
+            with self.metrics.stage("scan") as counters:
+                lang_check_result = self._check_lang_files(mod_path, check_completeness)
+                counters["bytes"] += sum(len(entry["data"]) for entry in lang_check_result["lang_entries"])
+                counters["entries"] += len(lang_check_result["lang_files"])
+            
+            if not lang_check_result["has_lang_files"]:
+                print(f"跳过 {mod_name} - 未包含语言文件")
+                stats["no_lang_files"] += 1
+                return None
+            
+            # 检查是否有英文语言文件
+            if not lang_check_result["has_en_us"]:
+                print(f"跳过 {mod_name} - 未包含英文语言文件")
+                stats["no_en_us"] += 1
+                return None
+            
+            namespaces = lang_check_result["namespaces"]
+            
+            # 检查中文翻译情况
+            if lang_check_result["has_zh_cn"]:
+                # 如果启用了深度检查，按命名空间检查中文翻译是否完整
+                if check_completeness:
+                    en_total = sum(ns["en_keys"] for ns in namespaces)
+                    common_total = sum(ns["common_keys"] for ns in namespaces)
+                    percentage = common_total / en_total * 100 if en_total else 100.0
+                    incomplete = [ns for ns in namespaces if not ns["is_complete"]]
+                    
+                    if not incomplete:
+                        print(f"跳过 {mod_name} - 已包含完整的中文语言文件 (完整率: {percentage:.1f}%)")
+                        stats["complete_zh_cn"] += 1
+                        return None
+                    
+                    print(f"处理 {mod_name} - 中文翻译不完整 (完整率: {percentage:.1f}%)")
+                    stats["partial_zh_cn"] += 1
+                    
+                    # 多命名空间的mod只处理不完整的命名空间
+                    if len(incomplete) < len(namespaces):
+                        for ns in namespaces:
+                            ns_name = f"{ns['container']}!/{ns['path']}" if ns["container"] else ns["path"]
+                            status = "跳过（已完整）" if ns["is_complete"] else "处理"
+                            print(f"  - {status} {ns_name} (完整率: {ns['percentage']:.1f}%)")
+                    namespaces = incomplete
+                else:
+                    # 不启用深度检查，只要有中文文件就跳过
+                    print(f"跳过 {mod_name} - 已包含中文语言文件")
+                    stats["complete_zh_cn"] += 1
+                    return None
+            else:
+                # 完全没有中文翻译
+                print(f"处理 {mod_name} - 无中文翻译")
+                stats["no_zh_cn"] += 1
+            
+            # 清理文件夹名称，避免过长路径
+            clean_name = self._sanitize_folder_name(mod_name.split('.')[0])
+            mod_extract_dir = os.path.join(self.mod_dir, clean_name)
+            os.makedirs(mod_extract_dir, exist_ok=True)
+            
+            print(f"正在提取 {mod_name} 的语言文件...")
+            
+            # 写出需要处理的命名空间的语言文件（内容在扫描时已读取，不再重新解压）
+            selected_dirs = {(ns["container"], ns["path"]) for ns in namespaces}
+            lang_entries = [entry for entry in lang_check_result["lang_entries"]
+                            if (entry["container"], os.path.dirname(entry["path"])) in selected_dirs]
+            with self.metrics.stage("extract") as counters:
+                lang_files = self._write_lang_files(lang_entries, mod_extract_dir)
+                counters["bytes"] += sum(len(entry["data"]) for entry in lang_entries)
+                counters["entries"] += len(lang_files)
+            
+            if lang_files:
+                print(f"成功提取 {mod_name} 的语言文件，共 {len(lang_files)} 个")
+                stats["processed"] += 1
+                # 记录mod信息
+                return {
+                    "name": mod_name,
+                    "path": mod_extract_dir,
+                    "original_path": mod_path,
+                    "lang_files": lang_files,
+                    "has_partial_zh_cn": lang_check_result["has_zh_cn"],
+                    "translation_status": "partial" if lang_check_result["has_zh_cn"] else "none"
+                }
+            else:
+                # 这种情况应该不会发生，因为我们已经预先检查了
+                print(f"警告: 在 {mod_name} 中未找到可用的语言文件，跳过")
+                # 删除创建的空文件夹
+                if os.path.exists(mod_extract_dir):
+                    shutil.rmtree(mod_extract_dir)
+        except Exception as e:
+            print(f"错误: 处理 {mod_name} 时出错: {str(e)}")
+        
+        return None
+    
     def _organize_translation_files(self, mod_info):
-        """整理翻译文件，保持原始的assets路径结构"""
+        """整理翻译文件，保持原始的assets路径结构
+        
+        按语言目录逐个整理：合并所有mod中该目录的语言文件后立即写入工作数据库，
+        再释放该目录的内容，内存占用只与最大的单个语言目录有关，而与整合包的大小无关。
+        """
         print("\n开始整理翻译文件...")
         
-        # 用于存储合并后的翻译内容
-        merged_translations = {}
+        # 记录整理过程的峰值内存（已在跟踪时不重复启动）
+        trace_memory = self.config.get("measure_peak_memory", False) and not tracemalloc.is_tracing()
+        if trace_memory:
+            tracemalloc.start()
+        
+        try:
+            # 按语言目录分组，只记录包含该目录的mod，不读取内容
+            mods_by_path = {}
+            for mod in mod_info:
+                for lang_file in mod["lang_files"]:
+                    if lang_file["language"] == "en_us":
+                        path_mods = mods_by_path.setdefault(os.path.dirname(lang_file["path"]), [])
+                        if not path_mods or path_mods[-1] is not mod:
+                            path_mods.append(mod)
+            
+            # 用于统计资源包过滤的条目、沿用旧版本翻译的条目和无需翻译的条目
+            stats_by_mod = {mod["name"]: {"filtered": 0, "carried": 0, "changed": 0, "new": 0, "has_snapshot": False,
+                                          "prefiltered": 0, "prefilter_rules": collections.Counter()} for mod in mod_info}
+            has_to_translate = False
+            
+            memory_stats = collections.Counter()
+            
+            for rel_path, path_mods in mods_by_path.items():
+                # 合并所有mod中该目录的语言文件
+                merged_translations = {}
+                for mod in path_mods:
+                    path_stats = self._merge_mod_lang_files(mod, merged_translations, rel_paths={rel_path})
+                    mod_stats = stats_by_mod[mod["name"]]
+                    for key in ("filtered", "carried", "changed", "new", "prefiltered"):
+                        mod_stats[key] += path_stats[key]
+                    mod_stats["has_snapshot"] = mod_stats["has_snapshot"] or path_stats["has_snapshot"]
+                    mod_stats["prefilter_rules"].update(path_stats["prefilter_rules"])
+                
+                # 写入工作数据库后释放该目录的内容
+                content = merged_translations.get(rel_path)
+                if content:
+                    pending, _ = self._store_path_content(rel_path, content, content["mods"], memory_stats)
+                    if pending:
+                        print(f"已加入翻译队列: {rel_path} ({pending} 个条目)")
+                    has_to_translate = has_to_translate or bool(pending)
+                del merged_translations, content
+        finally:
+            if trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                self.metrics.record_peak_memory("organize", peak)
+        
+        total_filtered = sum(mod_stats["filtered"] for mod_stats in stats_by_mod.values())
+        total_carried = sum(mod_stats["carried"] for mod_stats in stats_by_mod.values())
+        total_prefiltered = sum(mod_stats["prefiltered"] for mod_stats in stats_by_mod.values())
+        
+        # 显示过滤统计
+        if total_filtered > 0:
+            print("\n=== 资源包翻译过滤统计 ===")
+            print(f"共使用资源包中的翻译跳过了 {total_filtered} 个条目")
+            for mod_name, mod_stats in stats_by_mod.items():
+                if mod_stats["filtered"] > 0:
+                    print(f"  - {mod_name}: {mod_stats['filtered']} 个条目")
+        
+        # 显示增量翻译统计
+        if any(mod_stats["has_snapshot"] for mod_stats in stats_by_mod.values()):
+            print("\n=== 增量翻译统计（与上次翻译的原文比较）===")
+            print(f"共沿用了 {total_carried} 个原文未变化条目的已有翻译")
+            for mod_name, mod_stats in stats_by_mod.items():
+                if mod_stats["has_snapshot"]:
+                    print(f"  - {mod_name}: 未变化 {mod_stats['carried']} 个，已变化 {mod_stats['changed']} 个，新增 {mod_stats['new']} 个")
+        
+        # 显示预过滤统计
+        if total_prefiltered > 0:
+            rule_names = {"non_string": "非文本", "empty": "空值", "cjk": "已含中日韩文字", "url": "网址", "identifier": "标识符",
+                          "roman_numeral": "罗马数字", "number": "数字", "placeholder": "纯占位符", "symbol": "纯符号"}
+            print("\n=== 本地预过滤统计（无需翻译，直接使用原文）===")
+            print(f"共节省了 {total_prefiltered} 个API翻译条目")
+            for mod_name, mod_stats in stats_by_mod.items():
+                if mod_stats["prefiltered"] > 0:
+                    rules = "，".join(f"{rule_names.get(rule, rule)} {count}" for rule, count in mod_stats["prefilter_rules"].most_common())
+                    print(f"  - {mod_name}: {mod_stats['prefiltered']} 个条目（{rules}）")
+        
+        # 显示翻译记忆统计
+        if memory_stats["prefilled"] or memory_stats["indexed"]:
+            print("\n=== 翻译记忆统计 ===")
+            if memory_stats["indexed"]:
+                print(f"本次处理的mod和资源包自带的中文加入了 {memory_stats['indexed']} 条记录")
+            print(f"使用相似原文的已有译文预填了 {memory_stats['prefilled']} 个条目")
+        
+        # 返回是否有需要翻译的内容
+        return has_to_translate
+    
+    def _store_path_content(self, rel_path, content, mod_names, memory_stats):
+        """用翻译记忆预填一个语言目录整理出的内容，然后写入工作数据库
+        
+        翻译记忆在第一次遇到待翻译条目或已有中文时才载入。
+        
+        Args:
+            rel_path: 语言文件路径
+            content: _merge_mod_lang_files整理出的该路径的内容，会被原地更新
+            mod_names: 这些条目来自的mod
+            memory_stats: 翻译记忆统计（indexed、prefilled），会被原地更新
+            
+        Returns:
+            tuple: (新加入翻译队列的条目数, 新确定译文的条目数)
+        """
+        if self.config.get("translation_memory", True) and (content["to_translate"] or content["zh_cn"]):
+            if not self.memory.loaded:
+                self._load_translation_memory()
+            # mod和资源包自带的中文先加入索引，本目录和之后的目录都可以检索到
+            memory_stats["indexed"] += self.memory.extend(self._human_translation_pairs(content))
+            if content["to_translate"]:
+                self._apply_translation_memory(content, memory_stats)
+        return self.store.store_path_content(rel_path, content, mod_names)
+    
+    def _load_translation_memory(self, stage="organize"):
+        """载入翻译记忆（没有记录时查询不会命中）
+        
+        Args:
+            stage: 载入耗时计入的阶段
+        """
+        with self.metrics.stage(stage) as counters:
+            started = time.perf_counter()
+            try:
+                count = self.memory.load(min(self.config.get("tm_suggest_threshold", 0.4), self.config.get("tm_prefill_threshold", 0.5)))
+            except Exception as e:
+                print(f"警告: 读取翻译记忆时出错: {str(e)}")
+                count = 0
+            counters["memory_records"] += count
+        if count:
+            print(f"已载入翻译记忆: {count} 条记录（{time.perf_counter() - started:.2f}s）")
+    
+    def _human_translation_pairs(self, content):
+        """一个语言目录中mod自带的中文和资源包中的译文（原文, 译文）"""
+        pairs = [(content["en_us"].get(key), value) for key, value in content["zh_cn"].items()]
+        pairs.extend((content["en_us"].get(key), value) for key, value in content["resolved"].items()
+                     if content["provenance"].get(key) in TranslationMemory.HUMAN_ORIGINS)
+        return pairs
+    
+    def _apply_translation_memory(self, content, stats):
+        """用翻译记忆预填一个语言目录的待翻译条目
+        
+        与已有原文只有大小写、末尾标点或数字不同、且相似度不低于tm_prefill_threshold的条目直接确定译文。
+        整理时只做按原文形式的字典查找；相似原文的检索在翻译时按批进行（_select_prompt_examples）。
+        
+        Args:
+            content: _merge_mod_lang_files整理出的该路径的内容，会被原地更新
+            stats: 统计（prefilled），会被原地更新
+        """
+        prefill_threshold = self.config.get("tm_prefill_threshold", 0.5)
+        with self.metrics.stage("organize") as counters:
+            for key, value in list(content["to_translate"].items()):
+                for score, match_source, match_target in self.memory.find_adaptable(value):
+                    adapted = adapt_memory_translation(value, match_source, match_target) if score >= prefill_threshold else None
+                    if adapted is not None:
+                        del content["to_translate"][key]
+                        content["resolved"][key] = adapted
+                        content["provenance"][key] = "memory"
+                        stats["prefilled"] += 1
+                        counters["memory_prefilled"] += 1
+                        break
+    
+    def _snapshot_path(self, rel_path):
+        """获取语言目录原文快照的文件路径"""
+        normalized_path = rel_path.replace('\\', '/').strip('/')
+        return os.path.join(self.snapshot_dir, re.sub(r'[^\w\-.]', '_', normalized_path) + ".json")
+    
+    def _load_snapshot(self, rel_path):
+        """读取语言目录的原文快照
+        
+        Returns:
+            dict: 键 -> {"hash": 英文原文哈希, "zh": 译文}，没有快照时返回空字典
+        """
+        if rel_path not in self._snapshot_cache:
+            snapshot = {}
+            snapshot_path = self._snapshot_path(rel_path)
+            if os.path.exists(snapshot_path):
+                try:
+                    with open(snapshot_path, 'r', encoding='utf-8') as f:
+                        snapshot = json.load(f).get("keys", {})
+                except Exception as e:
+                    print(f"警告: 读取原文快照 {snapshot_path} 时出错: {str(e)}")
+            self._snapshot_cache[rel_path] = snapshot
+        return self._snapshot_cache[rel_path]
+    
+    def _update_snapshot(self, rel_path, en_data, translations):
+        """用本次的翻译结果更新语言目录的原文快照
+        
+        Args:
+            rel_path: 语言文件路径
+            en_data: 该路径的英文原文
+            translations: 该路径的译文
+        """
+        snapshot = dict(self._load_snapshot(rel_path))
+        for key, value in translations.items():
+            if value and key in en_data:
+                snapshot[key] = {"hash": hash_source_text(en_data[key]), "zh": value}
         
-        # 用于统计资源包过滤的条目
-        total_filtered = 0
-        filtered_by_mod = {}
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        with open(self._snapshot_path(rel_path), 'w', encoding='utf-8') as f:
+            json.dump({"path": rel_path, "updated": datetime.datetime.now().isoformat(timespec="seconds"), "keys": snapshot},
+                      f, ensure_ascii=False, indent=4)
+        self._snapshot_cache[rel_path] = snapshot
+    
+    def _merge_mod_lang_files(self, mod, merged_translations, rel_paths=None):
+        """将单个mod的语言文件合并到merged_translations中
         
-        # 遍历所有mod
-        for mod in mod_info:
-            mod_name = mod["name"]
-            filtered_by_mod[mod_name] = 0
+        Args:
+            mod: mod信息（mod.json中的条目）
+            merged_translations: 按语言文件路径合并的翻译内容，会被原地更新
+            rel_paths: 只合并这些语言目录中的文件，为None时合并全部
             
+        Returns:
+            dict: 统计信息，filtered为使用资源包翻译跳过的条目数，
+            carried/changed/new为与原文快照比较后未变化（沿用翻译）、已变化和新增的待翻译条目数，
+            prefiltered为无需翻译而直接使用原文的条目数（prefilter_rules为各规则的命中数）
+        """
+        mod_name = mod["name"]
+        mod_stats = {"filtered": 0, "carried": 0, "changed": 0, "new": 0, "has_snapshot": False,
+                     "prefiltered": 0, "prefilter_rules": collections.Counter()}
+        incremental = self.config.get("incremental_retranslation", True)
+        prefilter = self.config.get("prefilter_untranslatable", True)
+        
+        with self.metrics.stage("organize") as counters:
             # 遍历mod中的语言文件
             for lang_file in mod["lang_files"]:
-                if lang_file["language"] == "en_us":
+                if lang_file["language"] == "en_us" and (rel_paths is None or os.path.dirname(lang_file["path"]) in rel_paths):
                     # 读取英文语言文件
                     en_path = lang_file["extracted_path"]
                     try:
                         # 使用支持注释的JSON加载器
                         en_data = load_json_with_comments(en_path)
+                        counters["bytes"] += os.path.getsize(en_path)
+                        counters["entries"] += len(en_data)
                         
                         # 查找对应的中文文件（如果有）
                         zh_data = {}
                         for zh_file in mod["lang_files"]:
-                            if zh_file["language"] == "zh_cn" and os.path.dirname(zh_file["path"]) == os.path.dirname(lang_file["path"]):
+                            if (zh_file["language"] == "zh_cn"
+                                    and os.path.dirname(zh_file["path"]) == os.path.dirname(lang_file["path"])
+                                    and zh_file.get("container") == lang_file.get("container")):
                                 # 使用支持注释的JSON加载器
                                 zh_data = load_json_with_comments(zh_file["extracted_path"])
+                                counters["bytes"] += os.path.getsize(zh_file["extracted_path"])
+                                counters["entries"] += len(zh_data)
                                 break
                         
                         # 获取语言文件的相对路径（不包括语言代码和扩展名）
                         rel_path = os.path.dirname(lang_file["path"])
                         normalized_path = rel_path.replace('\\', '/').rstrip('/')
                         
-                        # 检查该路径是否在资源包翻译中存在
-                        resource_pack_translations = {}
+                        # 检查该路径是否在资源包翻译中存在（只记录匹配的资源包翻译，不复制内容，后匹配的优先）
+                        resource_pack_matches = []
                         # 只有当资源包翻译不为空时才进行查找
                         if self.extracted_translations:
                             for rp_path, rp_data in self.extracted_translations.items():
                                 # 检查路径是否匹配或者是否包含mod ID
                                 if normalized_path.endswith(rp_path) or rp_path.endswith(normalized_path):
-                                    resource_pack_translations.update(rp_data)
+                                    resource_pack_matches.append(rp_data)
                                 # 检查是否是特定mod的翻译
                                 elif '/assets/' in normalized_path:
                                     mod_id = normalized_path.split('/assets/')[1].split('/')[0]
                                     if f'/assets/{mod_id}/' in rp_path:
-                                        resource_pack_translations.update(rp_data)
+                                        resource_pack_matches.append(rp_data)
+                            resource_pack_matches.reverse()
                         
                         # 如果这个路径还没有在合并字典中，初始化它
                         if rel_path not in merged_translations:
@@ -916,6 +3576,8 @@ class ModTranslator:
                                 "en_us": {},
                                 "zh_cn": {},
                                 "to_translate": {},
+                                "resolved": {},  # 无需调用API即可确定译文的条目
+                                "provenance": {},  # 已有中文和已确定译文的来源
                                 "mods": []
                             }
                         
@@ -923,406 +3585,920 @@ class ModTranslator:
                         if mod_name not in merged_translations[rel_path]["mods"]:
                             merged_translations[rel_path]["mods"].append(mod_name)
                         
-                        # 合并英文内容
+                        # 上次翻译时的原文快照
+                        snapshot = self._load_snapshot(rel_path) if incremental else {}
+                        if snapshot:
+                            mod_stats["has_snapshot"] = True
+                        
+                        # 合并英文内容（键名驻留，各字典中的相同键共享同一个字符串）
                         for key, value in en_data.items():
+                            key = sys.intern(key)
                             merged_translations[rel_path]["en_us"][key] = value
+                            resource_pack_value = next((rp_data[key] for rp_data in resource_pack_matches if key in rp_data), None)
                             
                             # 首先检查资源包中是否有这个键的翻译
-                            if key in resource_pack_translations and resource_pack_translations[key]:
+                            if resource_pack_value:
                                 # 如果资源包中有翻译，使用资源包的翻译
-                                merged_translations[rel_path]["zh_cn"][key] = resource_pack_translations[key]
-                                filtered_by_mod[mod_name] += 1
-                                total_filtered += 1
+                                merged_translations[rel_path]["zh_cn"][key] = resource_pack_value
+                                merged_translations[rel_path]["provenance"][key] = "resource_pack"
+                                mod_stats["filtered"] += 1
                             # 如果资源包中没有，检查mod自身的中文翻译
-                            elif key not in zh_data or not zh_data[key]:
-                                # 如果mod中也没有翻译，添加到待翻译列表
-                                merged_translations[rel_path]["to_translate"][key] = value
-                        
-                        # 合并mod自身的中文内容
-                        for key, value in zh_data.items():
-                            if value and key not in merged_translations[rel_path]["zh_cn"]:  # 只合并非空的翻译，且不覆盖资源包的翻译
-                                merged_translations[rel_path]["zh_cn"][key] = value
-                    
-                    except Exception as e:
-                        print(f"警告: 处理 {en_path} 时出错: {str(e)}")
-        
-        # 显示过滤统计
-        if total_filtered > 0:
-            print("\n=== 资源包翻译过滤统计 ===")
-            print(f"共使用资源包中的翻译跳过了 {total_filtered} 个条目")
-            for mod_name, count in filtered_by_mod.items():
-                if count > 0:
-                    print(f"  - {mod_name}: {count} 个条目")
-        
-        # 将整理后的翻译文件写入翻译目录
-        for rel_path, content in merged_translations.items():
-            # 只有当有待翻译的内容时才创建翻译文件
-            if content["to_translate"]:
-                # 创建翻译目录
-                output_dir = os.path.join(self.fanyi_dir, rel_path)
-                os.makedirs(output_dir, exist_ok=True)
-                
-                # 将待翻译的内容分割成多个文件
-                base_filename = "to_translate"
-                split_files = split_json_file(
-                    content["to_translate"], 
-                    output_dir, 
-                    base_filename,
-                    self.config.get("batch_size", 40)
-                )
-                
-                if split_files:
-                    print(f"已创建翻译文件: {rel_path} ({len(content['to_translate'])} 个条目，分成 {len(split_files)} 个文件)")
-        
-        # 创建索引文件
-        index = {"paths": []}
-        for rel_path, content in merged_translations.items():
-            if content["to_translate"]:  # 只包含有待翻译内容的路径
-                # 获取该路径下的所有分割文件
-                path_dir = os.path.join(self.fanyi_dir, rel_path)
-                split_files = []
-                if os.path.exists(path_dir):
-                    for f in os.listdir(path_dir):
-                        if f.startswith("to_translate") and f.endswith(".json"):
-                            split_files.append(f)
-                
-                if split_files:
-                    index["paths"].append({
-                        "path": rel_path,
-                        "mods": content["mods"],
-                        "split_files": sorted(split_files)
-                    })
-        
-        # 写入索引文件
-        index_path = os.path.join(self.fanyi_dir, "index.json")
-        with open(index_path, 'w', encoding='utf-8') as f:
-            json.dump(index, f, ensure_ascii=False, indent=4)
-        
-        # 保存合并的英文和已有中文翻译，用于后续合并
-        for rel_path, content in merged_translations.items():
-            # 创建输出目录
-            output_dir = os.path.join(self.fanyi_dir, rel_path)
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # 保存英文原文
-            en_path = os.path.join(output_dir, "en_us.json")
-            with open(en_path, 'w', encoding='utf-8') as f:
-                json.dump(content["en_us"], f, ensure_ascii=False, indent=4)
-            
-            # 保存已有的中文翻译
-            if content["zh_cn"]:
-                zh_path = os.path.join(output_dir, "zh_cn.json")
-                with open(zh_path, 'w', encoding='utf-8') as f:
-                    json.dump(content["zh_cn"], f, ensure_ascii=False, indent=4)
+                            elif key not in zh_data or not zh_data[key]:
+                                previous = snapshot.get(key)
+                                rule = classify_untranslatable(value) if prefilter else None
+                                if previous and previous.get("zh") and previous.get("hash") == hash_source_text(value):
+                                    # 原文与上次翻译时相同，沿用已有翻译
+                                    merged_translations[rel_path]["resolved"][key] = previous["zh"]
+                                    merged_translations[rel_path]["provenance"][key] = "snapshot"
+                                    mod_stats["carried"] += 1
+                                elif rule:
+                                    # 数字、纯占位符、网址等无需翻译，直接使用原文
+                                    merged_translations[rel_path]["resolved"][key] = value
+                                    merged_translations[rel_path]["provenance"][key] = "prefilter"
+                                    mod_stats["prefiltered"] += 1
+                                    mod_stats["prefilter_rules"][rule] += 1
+                                else:
+                                    # 原文已变化或是新增的键，添加到待翻译列表
+                                    merged_translations[rel_path]["to_translate"][key] = value
+                                    mod_stats["changed" if previous else "new"] += 1
+                        
+                        # 合并mod自身的中文内容
+                        for key, value in zh_data.items():
+                            if value and key not in merged_translations[rel_path]["zh_cn"]:  # 只合并非空的翻译，且不覆盖资源包的翻译
+                                key = sys.intern(key)
+                                merged_translations[rel_path]["zh_cn"][key] = value
+                                merged_translations[rel_path]["provenance"].setdefault(key, "mod")
+                    
+                    except Exception as e:
+                        print(f"警告: 处理 {en_path} 时出错: {str(e)}")
         
-        # 返回是否有需要翻译的内容
-        has_to_translate = any(len(content["to_translate"]) > 0 for content in merged_translations.values())
-        return has_to_translate
+        return mod_stats
     
     def _should_check_translation_completeness(self):
         """是否检查翻译完整性（可以根据需要修改）"""
         # 默认启用完整性检查
         return True
     
-    def _check_translation_completeness(self, zip_path):
-        """检查中文翻译是否完整"""
-        result = {
-            "is_complete": False,
-            "en_keys": 0,
-            "zh_keys": 0,
-            "percentage": 0.0
-        }
+    def _check_lang_files(self, zip_path, check_completeness=True):
+        """扫描mod中的语言文件（包括嵌套jar中的语言文件）
         
-        try:
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                # 查找英文和中文语言文件
-                en_file = None
-                zh_file = None
-                
-                for file_info in zip_ref.infolist():
-                    if '/lang/' in file_info.filename and file_info.filename.endswith('.json'):
-                        if file_info.filename.endswith('/en_us.json'):
-                            en_file = file_info
-                        elif file_info.filename.endswith('/zh_cn.json'):
-                            zh_file = file_info
-                
-                if not en_file or not zh_file:
-                    return result
-                
-                # 读取英文和中文语言文件
-                try:
-                    with zip_ref.open(en_file) as f_en:
-                        content_en = f_en.read().decode('utf-8')
-                        # 移除注释
-                        content_en = re.sub(r'//.*?$', '', content_en, flags=re.MULTILINE)
-                        content_en = re.sub(r'/\*.*?\*/', '', content_en, flags=re.DOTALL)
-                        en_data = json.loads(content_en)
-                    
-                    with zip_ref.open(zh_file) as f_zh:
-                        content_zh = f_zh.read().decode('utf-8')
-                        # 移除注释
-                        content_zh = re.sub(r'//.*?$', '', content_zh, flags=re.MULTILINE)
-                        content_zh = re.sub(r'/\*.*?\*/', '', content_zh, flags=re.DOTALL)
-                        zh_data = json.loads(content_zh)
-                except json.JSONDecodeError:
-                    # 如果标准JSON解析失败，尝试使用更宽松的方式
-                    try:
-                        import json5
-                        with zip_ref.open(en_file) as f_en:
-                            en_data = json5.loads(f_en.read().decode('utf-8'))
-                        with zip_ref.open(zh_file) as f_zh:
-                            zh_data = json5.loads(f_zh.read().decode('utf-8'))
-                    except ImportError:
-                        print("警告: json5模块未安装，无法使用更宽松的解析方式")
-                        return result
-                    except Exception:
-                        print("错误: 无法解析语言文件")
-                        return result
-                
-                # 计算翻译完整度
-                en_keys = set(en_data.keys())
-                zh_keys = set(zh_data.keys())
-                result["en_keys"] = len(en_keys)
-                result["zh_keys"] = len(zh_keys)
-                
-                if len(en_keys) > 0:
-                    # 计算中文键占英文键的百分比
-                    common_keys = en_keys.intersection(zh_keys)
-                    result["percentage"] = len(common_keys) / len(en_keys) * 100
-                    
-                    # 如果中文翻译覆盖了95%以上的英文键，认为是完整的
-                    result["is_complete"] = result["percentage"] >= 95
-                
-                return result
-        except Exception as e:
-            print(f"检查翻译完整性时出错: {str(e)}")
-            return result
-    
-    def _check_lang_files(self, zip_path):
-        """检查mod中的语言文件情况"""
+        只遍历一次jar：同时记录语言文件情况、读取en_us/zh_cn的内容，
+        并按 assets/<命名空间>/lang 目录分别计算中文翻译完整度。
+        
+        Args:
+            zip_path: mod文件路径
+            check_completeness: 是否计算每个命名空间的翻译完整度
+            
+        Returns:
+            dict: 扫描结果，其中namespaces为每个包含en_us的语言目录的完整度信息，
+            lang_entries为en_us/zh_cn文件的内容，供提取时直接写出
+        """
         result = {
             "has_lang_files": False,
             "has_en_us": False,
             "has_zh_cn": False,
-            "lang_files": []
+            "lang_files": [],
+            "namespaces": [],
+            "lang_entries": []
         }
         
         try:
             with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                for file_info in zip_ref.infolist():
-                    if '/lang/' in file_info.filename and file_info.filename.endswith('.json'):
-                        result["has_lang_files"] = True
-                        lang_name = os.path.basename(file_info.filename).split('.')[0]
-                        result["lang_files"].append(lang_name)
-                        
-                        # 检查是否包含英文语言文件
-                        if lang_name == 'en_us':
-                            result["has_en_us"] = True
-                        # 检查是否包含中文语言文件
-                        elif lang_name == 'zh_cn':
-                            result["has_zh_cn"] = True
-            
-            return result
+                for source_ref, file_info, container in iter_lang_files(zip_ref):
+                    result["has_lang_files"] = True
+                    lang_name = os.path.basename(file_info.filename).split('.')[0]
+                    result["lang_files"].append(lang_name)
+                    
+                    # 检查是否包含英文语言文件
+                    if lang_name == 'en_us':
+                        result["has_en_us"] = True
+                    # 检查是否包含中文语言文件
+                    elif lang_name == 'zh_cn':
+                        result["has_zh_cn"] = True
+                    else:
+                        continue
+                    
+                    # 读取英文和中文语言文件内容（嵌套jar只在这里读取一次）
+                    result["lang_entries"].append({
+                        "path": file_info.filename,
+                        "container": container,
+                        "language": lang_name,
+                        "data": source_ref.read(file_info)
+                    })
         except Exception:
             # 如果无法读取zip文件，默认返回False
             return result
+        
+        # 按语言目录分组，计算每个命名空间的翻译完整度
+        groups = {}
+        for entry in result["lang_entries"]:
+            group_key = (entry["container"], os.path.dirname(entry["path"]))
+            groups.setdefault(group_key, {})[entry["language"]] = entry["data"]
+        
+        for (container, lang_dir), files in groups.items():
+            if "en_us" not in files:
+                continue
+            
+            namespace = {
+                "path": lang_dir,
+                "container": container,
+                "has_zh_cn": "zh_cn" in files,
+                "is_complete": False,
+                "en_keys": 0,
+                "zh_keys": 0,
+                "common_keys": 0,
+                "percentage": 0.0
+            }
+            
+            # 只有mod中有中文文件时才需要解析内容；没有中文文件的命名空间也要计入mod的整体完整率
+            if check_completeness and result["has_zh_cn"]:
+                source_name = f"{os.path.basename(zip_path)}!/{container + '!/' if container else ''}{lang_dir}"
+                en_keys = set(parse_json_with_comments(files["en_us"], f"{source_name}/en_us.json").keys())
+                namespace["en_keys"] = len(en_keys)
+                if namespace["has_zh_cn"]:
+                    zh_keys = set(parse_json_with_comments(files["zh_cn"], f"{source_name}/zh_cn.json").keys())
+                    namespace["zh_keys"] = len(zh_keys)
+                    namespace["common_keys"] = len(en_keys & zh_keys)
+                
+                if en_keys:
+                    # 计算中文键占英文键的百分比
+                    namespace["percentage"] = namespace["common_keys"] / len(en_keys) * 100
+                    # 如果中文翻译覆盖了95%以上的英文键，认为是完整的
+                    namespace["is_complete"] = namespace["percentage"] >= 95
+                else:
+                    # 英文文件为空，没有需要翻译的内容
+                    namespace["percentage"] = 100.0
+                    namespace["is_complete"] = True
+            
+            result["namespaces"].append(namespace)
+        
+        return result
     
-    def _extract_lang_files(self, zip_path, extract_dir, extract_zh_cn=False):
-        """提取语言文件，保持正确的路径结构"""
+    def _write_lang_files(self, lang_entries, extract_dir):
+        """将扫描时读取的语言文件写入提取目录，保持正确的路径结构
+        
+        嵌套jar中的语言文件写入 extract_dir/nested/<嵌套jar名>/ 下，
+        记录的path仍是其在嵌套jar内的路径，以便与顶层语言文件走同样的流程。
+        
+        Args:
+            lang_entries: _check_lang_files返回的lang_entries（可先按命名空间筛选）
+            extract_dir: 提取目录
+            
+        Returns:
+            list: 语言文件信息列表
+        """
         lang_files = []
         
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            # 查找所有语言文件
-            for file_info in zip_ref.infolist():
-                # 跳过目录
-                if file_info.filename.endswith('/'):
-                    continue
+        for entry in lang_entries:
+            try:
+                # 嵌套jar中的文件放到单独的目录，避免与顶层文件冲突
+                target_dir = extract_dir
+                container = entry["container"]
+                if container:
+                    nested_names = [self._sanitize_folder_name(os.path.splitext(os.path.basename(part))[0])
+                                    for part in container.split("!/")]
+                    target_dir = os.path.join(extract_dir, "nested", *nested_names)
+                target_path = os.path.join(target_dir, entry["path"])
                 
-                # 检查是否是语言文件
-                if '/lang/' in file_info.filename and file_info.filename.endswith('.json'):
-                    # 获取语言代码
-                    lang_code = os.path.basename(file_info.filename).split('.')[0]
-                    
-                    # 只提取英文和中文(如果需要)语言文件
-                    if lang_code == 'en_us' or (extract_zh_cn and lang_code == 'zh_cn'):
-                        try:
-                            # 提取文件
-                            source = zip_ref.open(file_info)
-                            target_path = os.path.join(extract_dir, file_info.filename)
-                            
-                            # 确保目标目录存在
-                            os.makedirs(os.path.dirname(target_path), exist_ok=True)
-                            
-                            # 写入文件
-                            with open(target_path, 'wb') as target:
-                                shutil.copyfileobj(source, target)
-                            source.close()
-                            
-                            # 记录语言文件信息
-                            lang_file_info = {
-                                "path": file_info.filename,
-                                "extracted_path": target_path,
-                                "language": lang_code
-                            }
-                            lang_files.append(lang_file_info)
-                        except Exception as e:
-                            print(f"警告: 无法提取语言文件 {file_info.filename}: {e}")
+                # 确保目标目录存在
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                
+                # 写入文件
+                with open(target_path, 'wb') as target:
+                    target.write(entry["data"])
+                
+                # 记录语言文件信息
+                lang_file_info = {
+                    "path": entry["path"],
+                    "extracted_path": target_path,
+                    "language": entry["language"]
+                }
+                if container:
+                    lang_file_info["container"] = container
+                lang_files.append(lang_file_info)
+            except Exception as e:
+                print(f"警告: 无法提取语言文件 {entry['path']}: {e}")
         
         return lang_files
 
-    def translate_with_ai(self):
-        """使用AI翻译待翻译的JSON文件"""
-        if not os.path.exists(self.fanyi_dir):
-            print("错误: 翻译文件夹不存在，请先处理mod文件")
-            return False
+    def _create_batch_controller(self):
+        """每次请求的条目数：开启自动调整时根据实际输出token数调整，否则固定为batch_size"""
+        batch_size = self.config.get("batch_size", 40)
+        if self.config.get("adaptive_batch_size", True):
+            return BatchSizeController(
+                batch_size,
+                minimum=min(5, batch_size),
+                maximum=max(batch_size, self.config.get("max_batch_size", 120)),
+                target_tokens=self.config.get("target_output_tokens", 2000)
+            )
+        return BatchSizeController(batch_size)
+    
+    def _build_translation_runtime(self):
+        """根据配置创建批次大小控制器和API端点池，并加载术语表
         
-        # 检查API配置
-        api_url = self.config.get('api_url')
-        api_key = self.config.get('api_key')
-        model_id = self.config.get('model_id')
+        Returns:
+            tuple: (批次大小控制器, API端点池, 请求间隔)，API配置不完整时返回None
+        """
+        endpoint_profiles = self.config.get_endpoints()
         wait_time = self.config.get('wait_time', 3)
-        
-        if not api_url or not api_key:
+        if not endpoint_profiles:
             print("错误: API配置不完整，请先完成配置")
-            return False
+            return None
         
-        # 加载索引文件
-        index_path = os.path.join(self.fanyi_dir, "index.json")
-        if not os.path.exists(index_path):
-            print("错误: 索引文件不存在，请先处理mod文件")
-            return False
+        for profile in endpoint_profiles:
+            print(f"API端点 {profile['name']}: {profile['api_url']}（模型 {profile['model_id']}，权重 {profile['weight']:g}"
+                  + (f"，每分钟最多 {profile['rpm']} 次请求" if profile['rpm'] else "") + "）")
         
-        try:
-            with open(index_path, 'r', encoding='utf-8') as f:
-                index = json.load(f)
-        except Exception as e:
-            print(f"错误: 无法读取索引文件: {str(e)}")
+        controller = self._create_batch_controller()
+        
+        # 并发请求数：开启自动调整时每个端点按AIMD调整，否则每个端点每次只发送一个请求，请求之间等待wait_time
+        adaptive = self.config.get("adaptive_concurrency", True)
+        if adaptive:
+            wait_time = 0
+        pool = EndpointPool(
+            [ApiEndpoint(profile["name"], profile["api_url"], profile["api_key"], profile["model_id"], profile["weight"], profile["rpm"],
+                         ConcurrencyController(maximum=profile["max_concurrency"] if adaptive else 1, adaptive=adaptive))
+             for profile in endpoint_profiles],
+            failure_threshold=self.config.get("endpoint_failure_threshold", 3),
+            cooldown=self.config.get("endpoint_cooldown", 60)
+        )
+        self._apply_token_prices()
+        
+        # 术语表
+        glossary_file = self.config.get("glossary_file")
+        self.glossary = Glossary.load(self.config.get_data_path(glossary_file)) if glossary_file else None
+        if self.glossary:
+            print(f"已加载术语表: {len(self.glossary.terms)} 个术语")
+        
+        # 翻译记忆：每批翻译时检索相似原文作为提示词中的示例
+        if self.config.get("translation_memory", True) and not self.memory.loaded:
+            self._load_translation_memory("translate")
+        return controller, pool, wait_time
+    
+    def estimate_translation(self):
+        """估算翻译等待翻译的条目所需的请求数、token数、时间和费用（不发送任何请求）
+        
+        按实际翻译时的方式把条目分批（同一路径、语义族不拆开，自动调整批次大小时用估算的输出token数调整），
+        为每批构建提示词并估算token数。请求耗时优先按以往翻译记录中每个输出token的平均耗时计算，
+        耗时按配置的并发数和每分钟请求数上限换算为总时间（自动调整并发时按最大并发数计算，是下限）。
+        
+        Returns:
+            dict: 估算结果，没有等待翻译的条目时返回None
+        """
+        if not self.store.exists():
+            print("错误: 翻译工作数据库不存在，请先处理mod文件")
+            return None
+        rows = self.store.pending_entries()
+        if not rows:
+            print("没有等待翻译的条目")
+            return None
+        
+        glossary_file = self.config.get("glossary_file")
+        glossary = Glossary.load(self.config.get_data_path(glossary_file)) if glossary_file else None
+        mask = self.config.get("mask_placeholders", True)
+        if self.config.get("translation_memory", True) and not self.memory.loaded:
+            self._load_translation_memory("translate")
+        
+        # 以往的请求记录：每个输出token的平均耗时
+        history = [batch for batch in self.metrics.batches if batch.get("success", True) and batch.get("completion_tokens")]
+        completion_total = sum(batch["completion_tokens"] for batch in history)
+        seconds_per_token = sum(batch["latency"] for batch in history) / completion_total if completion_total else None
+        
+        def output_tokens(item):
+            return estimate_tokens(item["key"]) + math.ceil(estimate_tokens(item["value"]) * OUTPUT_TOKEN_RATIO) + 4
+        
+        queue = collections.deque({"path": rel_path, "key": key, "value": value, "mods": mods}
+                                  for _, rel_path, key, value, _, mods in rows)
+        controller = self._create_batch_controller()
+        totals = collections.Counter()
+        by_mod = {}
+        while queue:
+            batch = self._take_batch(queue, controller.next_size())
+            to_translate = {item["key"]: mask_placeholders(item["value"])[0] if mask else item["value"] for item in batch}
+            glossary_terms = glossary.match([item["value"] for item in batch], self.config.get("glossary_max_terms", 60)) if glossary else {}
+            prompt = self._build_translation_prompt(to_translate, glossary_terms, self._select_prompt_examples(batch))
+            prompt_tokens = estimate_tokens(prompt)
+            completion_tokens = sum(output_tokens(item) for item in batch) + 2
+            controller.observe(len(batch), completion_tokens)
+            latency = (completion_tokens * seconds_per_token if seconds_per_token
+                       else DEFAULT_REQUEST_OVERHEAD + completion_tokens / DEFAULT_OUTPUT_TOKENS_PER_SECOND)
+            totals.update({"calls": 1, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens})
+            totals["latency"] += latency
+            
+            # 按条目数比例分摊到各个mod（与运行报告相同）
+            for item in batch:
+                mods = item["mods"] or ["未知"]
+                for mod_name in mods:
+                    share = 1 / len(mods) / len(batch)
+                    mod_totals = by_mod.setdefault(mod_name, collections.Counter())
+                    mod_totals.update({"entries": 1 / len(mods), "calls": share, "prompt_tokens": prompt_tokens * share,
+                                       "completion_tokens": completion_tokens * share})
+        
+        # 吞吐量：每个端点受并发数和每分钟请求数限制；不自动调整并发时还受请求间隔限制
+        adaptive = self.config.get("adaptive_concurrency", True)
+        mean_latency = totals["latency"] / totals["calls"]
+        profiles = self.config.get_endpoints() or [{"rpm": 0, "max_concurrency": self.config.get("max_concurrency", 8)}]
+        throughput = 0.0
+        for profile in profiles:
+            concurrency = profile["max_concurrency"] if adaptive else 1
+            rate = concurrency / mean_latency
+            if profile["rpm"]:
+                rate = min(rate, profile["rpm"] / 60)
+            throughput += rate
+        wait_time = self.config.get("wait_time", 3)
+        if not adaptive and wait_time:
+            throughput = min(throughput, 1 / wait_time)
+        
+        prices = (float(self.config.get("token_price_input", 0) or 0), float(self.config.get("token_price_output", 0) or 0))
+        def cost(values):
+            return (values["prompt_tokens"] * prices[0] + values["completion_tokens"] * prices[1]) / 1_000_000
+        
+        unique = len({value if isinstance(value, str) else json.dumps(value, ensure_ascii=False) for _, _, _, value, _, _ in rows})
+        estimate = {
+            "entries": len(rows),
+            "unique_sources": unique,
+            "calls": totals["calls"],
+            "prompt_tokens": round(totals["prompt_tokens"]),
+            "completion_tokens": round(totals["completion_tokens"]),
+            "mean_latency": round(mean_latency, 2),
+            "wall_time": round(totals["calls"] / throughput, 1),
+            "cost": round(cost(totals), 4) if any(prices) else None,
+            "mods": {name: {"entries": round(values["entries"], 1), "calls": round(values["calls"], 1),
+                            "prompt_tokens": round(values["prompt_tokens"]), "completion_tokens": round(values["completion_tokens"]),
+                            "cost": round(cost(values), 4) if any(prices) else None}
+                     for name, values in by_mod.items()}
+        }
+        
+        print("\n=== 翻译用量估算（不发送请求）===")
+        print(f"等待翻译: {estimate['entries']} 个条目，不同的原文 {unique} 个"
+              + (f"（{estimate['entries'] - unique} 个条目与其他条目原文相同，仍会分别翻译）" if unique < estimate['entries'] else ""))
+        print(f"API请求: 约 {estimate['calls']} 次（平均每批 {estimate['entries'] / estimate['calls']:.1f} 个条目）")
+        print(f"token: 输入约 {estimate['prompt_tokens']}，输出约 {estimate['completion_tokens']}（按字符数估算，与实际分词结果会有出入）")
+        basis = f"按以往 {len(history)} 次请求的速度" if seconds_per_token else "没有以往的请求记录，按默认速度"
+        print(f"耗时: 约 {format_duration(estimate['wall_time'])}（每次请求约 {estimate['mean_latency']:.1f}s，{basis}；"
+              + ("按最大并发数计算，实际并发从1逐步增加）" if adaptive else f"不自动调整并发，请求间隔 {wait_time}s）"))
+        if estimate["cost"] is not None:
+            print(f"费用: 约 {estimate['cost']:.4f}")
+        else:
+            print("费用: 未配置token价格（token_price_input、token_price_output）")
+        print("未计入校验失败后的重新翻译和失败重试")
+        
+        print("\n每个mod:")
+        for name, values in sorted(estimate["mods"].items(), key=lambda item: -item[1]["prompt_tokens"] - item[1]["completion_tokens"]):
+            print(f"  - {name}: {values['entries']:g} 个条目，约 {values['calls']:g} 次请求，"
+                  f"输入 {values['prompt_tokens']} / 输出 {values['completion_tokens']} token"
+                  + (f"，费用约 {values['cost']:.4f}" if values["cost"] is not None else ""))
+        return estimate
+    
+    def translate_with_ai(self):
+        """使用AI翻译工作数据库中等待翻译的条目"""
+        if not self.store.exists():
+            print("错误: 翻译工作数据库不存在，请先处理mod文件")
             return False
         
-        total_paths = len(index.get("paths", []))
-        if total_paths == 0:
+        paths = self.store.paths()
+        if not paths:
             print("错误: 没有找到需要翻译的路径")
             return False
         
         print(f"\n=== 开始AI翻译 ===")
-        print(f"共有 {total_paths} 个翻译路径需要处理")
+        runtime = self._build_translation_runtime()
+        if runtime is None:
+            return False
+        controller, pool, wait_time = runtime
+        print(f"共有 {len(paths)} 个翻译路径")
         
         # 统计
         stats = {
-            "total_files": 0,
-            "success_files": 0,
-            "failed_files": 0,
             "total_keys": 0,
-            "translated_keys": 0
+            "translated_keys": 0,
+            "failed_keys": 0,
+            "batches": 0,
+            "failed_batches": 0
         }
         
-        # 遍历每个翻译路径
-        for path_info in index.get("paths", []):
-            rel_path = path_info.get("path")
-            split_files = path_info.get("split_files", [])
-            
-            if not rel_path or not split_files:
-                continue
-            
+        # 按路径显示等待翻译的条目
+        pending_by_path = self.store.pending_counts()
+        mods_by_path = {rel_path: mods for _, rel_path, mods in paths}
+        for rel_path, count in pending_by_path.items():
             print(f"\n处理路径: {rel_path}")
-            print(f"来自mod: {', '.join(path_info.get('mods', ['未知']))}")
-            print(f"共有 {len(split_files)} 个翻译文件")
-            
-            # 创建对应的翻译结果目录
-            target_dir = os.path.join(self.fanyi_ok_dir, rel_path)
-            os.makedirs(target_dir, exist_ok=True)
-            
-            # 遍历每个分割文件
-            for file_name in split_files:
-                stats["total_files"] += 1
-                source_file = os.path.join(self.fanyi_dir, rel_path, file_name)
-                target_file = os.path.join(target_dir, file_name)
-                
-                if not os.path.exists(source_file):
-                    print(f"警告: 文件不存在: {source_file}")
-                    stats["failed_files"] += 1
-                    continue
-                
-                # 如果目标文件已存在，跳过翻译
-                if os.path.exists(target_file):
-                    print(f"跳过已翻译文件: {file_name}")
-                    # 统计已翻译的键数量
-                    try:
-                        with open(target_file, 'r', encoding='utf-8') as f:
-                            translated_data = json.load(f)
-                            stats["translated_keys"] += len(translated_data)
-                    except:
-                        pass
-                    stats["success_files"] += 1
+            print(f"来自mod: {', '.join(mods_by_path.get(rel_path) or ['未知'])}")
+            print(f"共有 {count} 个待翻译条目")
+        
+        # 条目按优先级翻译，中途停止时游戏中最常见的文本已经翻译完成
+        pending_by_priority = self.store.pending_by_priority()
+        if pending_by_priority:
+            print("\n翻译顺序: " + " → ".join(f"{KEY_PRIORITY_NAMES[priority]} {count}" for priority, count in pending_by_priority.items()))
+        
+        # 条目分批从数据库领取，可以同时运行工作进程（python mod_translator.py worker）分担翻译
+        if pending_by_path:
+            self._dispatch_translation_batches(None, controller, pool, stats, wait_time)
+        else:
+            print("\n没有等待翻译的条目")
+        
+        if pending_by_path and self.config.get("validate_translations", True):
+            self._run_validation_rounds(controller, pool, stats, wait_time)
+        
+        self.metrics.save(self.metrics_path)
+        
+        # 显示统计信息
+        remaining = self.store.status_counts().get(WorkStore.PENDING, 0)
+        self._print_translation_stats(stats)
+        if remaining:
+            print(f"仍有 {remaining} 个条目等待翻译，再次选择 4 时会继续翻译")
+        
+        if stats['translated_keys'] > 0 or (not pending_by_path and self.store.status_counts().get(WorkStore.TRANSLATED)):
+            print(f"\n翻译结果已保存到 {self.work_db_path}")
+            return True
+        else:
+            print("\n没有成功翻译任何条目")
+            return False
+    
+    def run_worker(self, wait=0, poll_interval=5):
+        """作为翻译工作进程运行：反复从工作数据库领取等待翻译的条目并翻译，直到没有可领取的条目
+        
+        多个工作进程（可以在不同的机器上）可以同时使用同一个工作数据库，条目通过租约分配，不会被重复翻译；
+        进程意外退出后，它领取的条目在租约过期后由其他进程收回。最后一个结束的工作进程负责校验翻译结果。
+        
+        Args:
+            wait: 没有可领取的条目时继续等待的秒数（等待其他进程的租约过期）
+            poll_interval: 等待期间检查可领取条目的间隔（秒）
+        
+        Returns:
+            bool: 是否翻译了任何条目
+        """
+        if not self.store.exists():
+            print(f"错误: 翻译工作数据库 {self.store.path} 不存在，请先处理mod文件")
+            return False
+        
+        print(f"\n=== 工作进程 {self.worker_id} 开始翻译 ===")
+        print(f"工作数据库: {self.store.path}")
+        runtime = self._build_translation_runtime()
+        if runtime is None:
+            return False
+        controller, pool, wait_time = runtime
+        
+        stats = {
+            "total_keys": 0,
+            "translated_keys": 0,
+            "failed_keys": 0,
+            "batches": 0,
+            "failed_batches": 0
+        }
+        given_up = set()  # 本进程已放弃的条目，不再领取
+        idle_since = time.monotonic()
+        try:
+            while True:
+                claimed = stats["total_keys"]
+                self._dispatch_translation_batches(None, controller, pool, stats, wait_time, given_up)
+                if stats["total_keys"] > claimed:
+                    idle_since = time.monotonic()
                     continue
-                
+                idle = time.monotonic() - idle_since
+                if idle >= wait:
+                    break
+                time.sleep(min(poll_interval, wait - idle))
+            
+            if stats["translated_keys"] and self.config.get("validate_translations", True) and not self.store.active_leases():
+                self._run_validation_rounds(controller, pool, stats, wait_time)
+        except KeyboardInterrupt:
+            print("\n工作进程已停止，未完成的条目已释放，可由其他工作进程继续翻译")
+        
+        self._print_translation_stats(stats)
+        remaining = self.store.status_counts().get(WorkStore.PENDING, 0)
+        if remaining:
+            print(f"仍有 {remaining} 个条目等待翻译")
+        return stats["translated_keys"] > 0
+    
+    def _run_validation_rounds(self, controller, pool, stats, wait_time):
+        """校验翻译结果，未通过的条目重新翻译；最后一轮只放弃有错误的译文"""
+        retry_rounds = self.config.get("validation_retry_rounds", 1)
+        for round_number in range(1, retry_rounds + 2):
+            retry_items = self._validate_translation_results(queue_retries=round_number <= retry_rounds)
+            if not retry_items:
+                break
+            print(f"\n=== 重新翻译未通过校验的 {len(retry_items)} 个条目（第 {round_number}/{retry_rounds} 轮）===")
+            self._dispatch_translation_batches(retry_items, controller, pool, stats, wait_time)
+    
+    @staticmethod
+    def _print_translation_stats(stats):
+        print("\n=== 翻译统计 ===")
+        print(f"翻译批次: {stats['batches']} 个，失败 {stats['failed_batches']} 个")
+        print(f"总条目数: {stats['total_keys']}")
+        print(f"已翻译条目: {stats['translated_keys']}")
+        print(f"翻译失败: {stats['failed_keys']} 个条目")
+    
+    def _validate_translation_results(self, queue_retries=True):
+        """校验全部AI翻译结果
+        
+        未通过校验的条目：queue_retries为True时全部重新翻译，其中有错误（占位符、格式代码、JSON片段）的条目
+        在得到新译文之前重新标记为等待翻译；queue_retries为False时有错误的译文被放弃（使用英文原文）。
+        校验报告写入TEMP目录下的validation_report.json。
+        
+        Args:
+            queue_retries: 是否重新翻译未通过的条目
+            
+        Returns:
+            list: 需要重新翻译的条目，格式同_dispatch_translation_batches的items参数
+        """
+        with self.metrics.stage("validate") as counters:
+            entries = {entry_id: (rel_path, key, source, translation, mods)
+                       for entry_id, rel_path, key, source, translation, mods in self.store.translated_entries()}
+            validator = TranslationValidator()
+            issues = validator.validate((entry_id, source, translation) for entry_id, (_, _, source, translation, _) in entries.items())
+            counters["entries"] += len(entries)
+            counters["issues"] += len(issues)
+        
+        print(f"\n=== 翻译结果校验 ===")
+        print(f"共校验 {len(entries)} 个条目，{len(issues)} 个未通过")
+        if not issues:
+            return []
+        
+        issue_counts = collections.Counter(issue for problems in issues.values() for issue in problems)
+        for issue, count in issue_counts.most_common():
+            level = "错误" if issue in TranslationValidator.ERRORS else "警告"
+            print(f"  - {TranslationValidator.ISSUE_NAMES[issue]}（{level}）: {count} 个")
+        
+        # 写入校验报告
+        report_path = os.path.join(self.temp_dir, "validation_report.json")
+        report = [
+            {"path": entries[entry_id][0], "key": entries[entry_id][1], "source": entries[entry_id][2],
+             "translation": entries[entry_id][3], "issues": problems}
+            for entry_id, problems in issues.items()
+        ]
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+        
+        # 有错误的译文不再输出；警告只记录问题，保留译文
+        errors = {entry_id: problems for entry_id, problems in issues.items()
+                  if any(issue in TranslationValidator.ERRORS for issue in problems)}
+        warnings = {entry_id: problems for entry_id, problems in issues.items() if entry_id not in errors}
+        self.store.mark_issues(errors, WorkStore.PENDING if queue_retries else WorkStore.REJECTED)
+        self.store.mark_issues(warnings)
+        
+        if not queue_retries:
+            if errors:
+                print(f"已放弃 {len(errors)} 个有错误的译文，合并时将使用英文原文")
+            print(f"详细信息见 {report_path}")
+            return []
+        
+        return [{"id": entry_id, "path": entries[entry_id][0], "key": entries[entry_id][1], "value": entries[entry_id][2],
+                 "mods": entries[entry_id][4], "attempts": collections.Counter()} for entry_id in issues]
+    
+    def _dispatch_translation_batches(self, items, controller, pool, stats, wait_time, given_up=None):
+        """并发发送翻译请求
+        
+        条目按优先级、路径和语义族顺序组成队列，每批的条目数由controller决定，每批发送给pool中负载最低的可用端点。
+        每批的译文在同一个事务中写入工作数据库；最终失败的条目保持等待翻译状态，下次运行时重新翻译。
+        
+        条目在翻译期间由本进程持有租约（后台线程定期续租），其他工作进程不会领取；
+        结束时（包括被中断时）释放全部租约。
+        
+        Args:
+            items: 条目列表，每个条目为 {"id", "path", "key", "value", "mods", "attempts"}，attempts为按原因（rate_limit限流、
+                request请求出错、malformed返回内容无法解析、placeholder占位符未保留、missing响应中缺少）分别计数的重试次数，
+                前三种在请求得到响应后清零；
+                为None时从工作数据库分批领取等待翻译的条目，队列快用完时继续领取
+            controller: 批次大小控制器
+            pool: API端点池
+            stats: 翻译统计
+            wait_time: 两次发送请求之间的最短间隔（秒）
+            given_up: 已放弃的条目ID集合，不再领取；本次放弃的条目也会加入其中
+        """
+        owner = self.worker_id
+        lease_seconds = self.config.get("lease_seconds", 120)
+        claim_size = self.config.get("claim_size", 200)
+        given_up = set() if given_up is None else given_up
+        queue = collections.deque()
+        claiming = items is None
+        
+        if not claiming:
+            leased = self.store.lease_entries([item["id"] for item in items], owner, lease_seconds)
+            queue.extend(item for item in items if item["id"] in leased)
+            if len(queue) < len(items):
+                print(f"跳过 {len(items) - len(queue)} 个正由其他工作进程翻译的条目")
+            stats["total_keys"] += len(queue)
+        
+        def claim():
+            # 从工作数据库领取下一批条目，没有可领取的条目时返回False
+            rows, reclaimed = self.store.claim_entries(owner, claim_size, lease_seconds, given_up)
+            if reclaimed:
+                print(f"收回了 {reclaimed} 个租约已过期的条目（领取它们的工作进程可能已退出）")
+            queue.extend({"id": entry_id, "path": rel_path, "key": key, "value": value, "mods": mods, "attempts": collections.Counter()}
+                         for entry_id, rel_path, key, value, _, mods in rows)
+            stats["total_keys"] += len(rows)
+            return bool(rows)
+        
+        # 心跳：翻译期间定期续租，避免条目被其他工作进程收回
+        stop_heartbeat = threading.Event()
+        
+        def heartbeat():
+            while not stop_heartbeat.wait(lease_seconds / 3):
                 try:
-                    # 读取待翻译文件
-                    with open(source_file, 'r', encoding='utf-8') as f:
-                        to_translate = json.load(f)
-                    
-                    if not to_translate:
-                        print(f"警告: 文件为空: {file_name}")
-                        stats["failed_files"] += 1
-                        continue
-                    
-                    keys_count = len(to_translate)
-                    stats["total_keys"] += keys_count
-                    print(f"翻译文件: {file_name} (包含 {keys_count} 个条目)")
+                    self.store.renew_leases(owner, lease_seconds)
+                except Exception as e:
+                    print(f"警告: 续租失败: {str(e)}")
+        
+        max_retries = self.config.get("max_retries", 3)
+        in_flight = {}
+        last_dispatch = 0.0
+        exhausted = not claiming
+        
+        def batch_paths(batch):
+            # 批次可以包含多个语言目录的条目：路径 -> 条目数（按在批次中出现的顺序）
+            return collections.Counter(item["path"] for item in batch)
+        
+        def batch_label(batch):
+            paths = batch_paths(batch)
+            return batch[0]["path"] + (f" 等 {len(paths)} 个路径" if len(paths) > 1 else "")
+        
+        def finish(batch, translated_json, endpoint, call_info, started_at):
+            # 在一个事务中记录批次和它的译文（条目全部重新排队时没有需要记录的内容）
+            if not batch:
+                return
+            results = {item["id"]: translated_json[item["key"]] for item in batch if translated_json and item["key"] in translated_json}
+            stats["batches"] += 1
+            if not results:
+                stats["failed_batches"] += 1
+            stats["translated_keys"] += len(results)
+            stats["failed_keys"] += len(batch) - len(results)
+            failed = [item["id"] for item in batch if item["id"] not in results]
+            given_up.update(failed)
+            try:
+                stored = self.store.record_batch(batch_paths(batch), endpoint.name, "done" if results else "failed", len(batch),
+                                                 call_info.get("usage"), call_info.get("finish_reason"), started_at, results, owner)
+                if stored < len(results):
+                    print(f"警告: {len(results) - stored} 个条目的租约已被其他工作进程收回，丢弃这些译文")
+                    stats["translated_keys"] -= len(results) - stored
+                if failed:
+                    self.store.release_leases(owner, failed)
+            except Exception as e:
+                print(f"警告: 保存 {batch_label(batch)} 的翻译结果时出错: {str(e)}")
+        
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+        try:
+            with self.metrics.stage("translate") as counters, \
+                    concurrent.futures.ThreadPoolExecutor(max_workers=pool.max_concurrency) as executor:
+                while True:
+                    # 队列快用完时从工作数据库继续领取条目
+                    if not exhausted and len(queue) < claim_size // 2:
+                        exhausted = not claim()
+                    if not queue and not in_flight:
+                        break
                     
-                    # 构建提示词
-                    prompt = self._build_translation_prompt(to_translate)
+                    # 在各端点的并发窗口内发送新的批次
+                    while queue and time.monotonic() - last_dispatch >= wait_time:
+                        endpoint = pool.acquire()
+                        if endpoint is None:
+                            break
+                        batch = self._take_batch(queue, controller.next_size())
+                        print(f"[并发 {pool.window:.1f}，进行中 {len(in_flight) + 1}，端点 {endpoint.name}] 翻译 {batch_label(batch)}"
+                              f" (包含 {len(batch)} 个条目)")
+                        in_flight[executor.submit(self._translate_batch, batch, endpoint)] = (batch, endpoint, time.time())
+                        last_dispatch = time.monotonic()
                     
-                    # 调用AI API进行翻译
-                    translated_json = self._call_ai_api(prompt, api_url, api_key, model_id)
+                    if not in_flight:
+                        # 所有端点暂停中（限流或熔断）或未到请求间隔
+                        time.sleep(max(0.01, pool.next_available_in(), wait_time - (time.monotonic() - last_dispatch)))
+                        continue
                     
-                    if translated_json:
-                        # 保存翻译结果
-                        with open(target_file, 'w', encoding='utf-8') as f:
-                            json.dump(translated_json, f, ensure_ascii=False, indent=4)
+                    done, _ = concurrent.futures.wait(in_flight, timeout=0.5, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        batch, endpoint, started_at = in_flight.pop(future)
+                        translated_json, call_info, prompt_bytes = future.result()
+                        counters["masked_placeholders"] += call_info.get("masked", 0)
+                        counters["glossary_terms"] += call_info.get("glossary_terms", 0)
+                        counters["prompt_examples"] += call_info.get("examples", 0)
+                        succeeded = translated_json is not None or call_info.get("finish_reason") == "length"
+                        pool.release(endpoint, call_info, succeeded)
+                        counters["bytes"] += prompt_bytes
+                        counters["entries"] += len(translated_json) if translated_json else 0
                         
-                        print(f"成功翻译文件: {file_name} (翻译 {len(translated_json)} 个条目)")
-                        stats["success_files"] += 1
-                        stats["translated_keys"] += len(translated_json)
-                    else:
-                        print(f"翻译失败: {file_name}")
-                        stats["failed_files"] += 1
-                    
-                    # 等待一段时间，避免API请求过于频繁
-                    time.sleep(wait_time)
-                    
-                except Exception as e:
-                    print(f"处理文件 {file_name} 时出错: {str(e)}")
-                    stats["failed_files"] += 1
+                        # 按条目数把token用量分摊到来源mod
+                        mod_shares = collections.Counter()
+                        for item in batch:
+                            mods = item["mods"] or ["未知"]
+                            for mod_name in mods:
+                                mod_shares[mod_name] += 1 / len(mods)
+                        usage = call_info.get("usage") or {}
+                        finish_reason = call_info.get("finish_reason")
+                        self.metrics.record_batch(mod_shares, usage, finish_reason, call_info.get("latency", 0.0),
+                                                  f"{batch_label(batch)} ({len(batch)})", endpoint.name, succeeded, batch_paths(batch))
+                        new_size = controller.observe(len(batch), usage.get("completion_tokens", 0), finish_reason)
+                        
+                        progress = f"[并发 {pool.window:.1f}，进行中 {len(in_flight)}，端点 {endpoint.name}]"
+                        if finish_reason == "length" and len(batch) > 1:
+                            # 输出被截断，缩小批次后重试这些条目
+                            print(f"{progress} 警告: 响应被截断，批次大小调整为 {new_size} 后重试")
+                            self.store.record_batch(batch_paths(batch), endpoint.name, "truncated", len(batch), usage, finish_reason, started_at)
+                            queue.extendleft(reversed(batch))
+                        elif translated_json is None:
+                            # 限流、请求出错、返回内容无法解析分别计数；批次中混有重试过的条目和新条目，
+                            # 按每个条目自己的重试次数决定重试还是放弃
+                            if call_info.get("status_code") in (429, 503):
+                                cause = "rate_limit"
+                            else:
+                                cause = "request" if call_info.get("error") else "malformed"
+                            retry_items = [item for item in batch if item["attempts"][cause] < max_retries]
+                            if retry_items:
+                                pause = endpoint.concurrency.pause_remaining()
+                                print(f"{progress} 请求失败，{f'{pause:.1f} 秒后' if pause else ''}重试 {len(retry_items)} 个条目"
+                                      f"（最多第 {max(item['attempts'][cause] for item in retry_items) + 1}/{max_retries} 次）"
+                                      + (f"，放弃 {len(batch) - len(retry_items)} 个已重试 {max_retries} 次的条目" if len(retry_items) < len(batch) else ""))
+                                for item in retry_items:
+                                    item["attempts"][cause] += 1
+                                self.store.record_batch(batch_paths(retry_items), endpoint.name, "retry", len(retry_items), usage, finish_reason, started_at)
+                                queue.extendleft(reversed(retry_items))
+                                self.metrics.record_retry()
+                            finish([item for item in batch if item not in retry_items], None, endpoint, call_info, started_at)
+                        else:
+                            if translated_json is not None:
+                                translated_count = sum(1 for item in batch if item["key"] in translated_json)
+                                print(f"{progress} 成功翻译 {translated_count} 个条目 (token: 输入 {usage.get('prompt_tokens', 0)}，"
+                                      f"输出 {usage.get('completion_tokens', 0)}，下一批 {new_size} 个条目)")
+                                
+                                # 请求已得到响应，限流和请求失败的次数只按连续失败计算
+                                for item in batch:
+                                    for cause in ("rate_limit", "request", "malformed"):
+                                        item["attempts"].pop(cause, None)
+                                
+                                # 占位符没有原样保留的条目单独重新翻译，超过重试次数后放弃（保留英文原文）
+                                broken = set(call_info.get("mask_failures", []))
+                                if broken:
+                                    counters["mask_failures"] += len(broken)
+                                    retry_items = [item for item in batch if item["key"] in broken and item["attempts"]["placeholder"] < max_retries]
+                                    for item in retry_items:
+                                        item["attempts"]["placeholder"] += 1
+                                    queue.extendleft(reversed(retry_items))
+                                    print(f"{progress} 警告: {len(broken)} 个条目的占位符未能原样保留，"
+                                          f"重新翻译 {len(retry_items)} 个" + (f"，放弃 {len(broken) - len(retry_items)} 个" if len(broken) > len(retry_items) else ""))
+                                    batch = [item for item in batch if item not in retry_items]
+                                
+                                # 响应中遗漏的条目重新翻译（否则会一直保持等待翻译状态）
+                                missing = [item for item in batch if item["key"] not in translated_json and item["key"] not in broken
+                                           and item["attempts"]["missing"] < max_retries]
+                                if missing:
+                                    counters["missing_keys"] += len(missing)
+                                    for item in missing:
+                                        item["attempts"]["missing"] += 1
+                                    queue.extendleft(reversed(missing))
+                                    print(f"{progress} 警告: 响应中缺少 {len(missing)} 个条目，重新翻译")
+                                    batch = [item for item in batch if item not in missing]
+                            finish(batch, translated_json, endpoint, call_info, started_at)
+        finally:
+            stop_heartbeat.set()
+            heartbeat_thread.join()
+            self.store.release_leases(owner)
+    
+    @staticmethod
+    def _take_batch(queue, size):
+        """从队列头部取出一批条目：键不重复，最多size个
         
-        # 显示统计信息
-        print("\n=== 翻译统计 ===")
-        print(f"总文件数: {stats['total_files']}")
-        print(f"成功翻译: {stats['success_files']} 个文件")
-        print(f"翻译失败: {stats['failed_files']} 个文件")
-        print(f"总条目数: {stats['total_keys']}")
-        print(f"已翻译条目: {stats['translated_keys']}")
+        队列按优先级排列，同一路径的同一优先级的条目往往不足一批，所以一个路径的条目不够时接着装入下一个路径的条目
+        填满批次（译文按条目ID保存）。批次末尾尽量不拆开同一语义族（例如物品名和它的提示文本），
+        除非这样会使批次缩小一半以上。
+        """
+        batch = [queue.popleft()]
+        keys = {batch[0]["key"]}
+        while queue and len(batch) < size:
+            item = queue[0]
+            if item["key"] in keys:
+                break
+            batch.append(queue.popleft())
+            keys.add(item["key"])
         
-        if stats['success_files'] > 0:
-            print(f"\n翻译结果已保存到 {self.fanyi_ok_dir}")
-            return True
-        else:
-            print("\n没有成功翻译任何文件")
-            return False
+        if queue and len(batch) == size and queue[0]["path"] == batch[-1]["path"]:
+            family = key_family(queue[0]["key"])[1]
+            cut = len(batch)
+            while cut > 0 and key_family(batch[cut - 1]["key"])[1] == family:
+                cut -= 1
+            if len(batch) / 2 <= cut < len(batch):
+                queue.extendleft(reversed(batch[cut:]))
+                batch = batch[:cut]
+        return batch
     
-    def _build_translation_prompt(self, to_translate):
-        """构建AI翻译的提示词"""
+    def _translate_batch(self, batch, endpoint):
+        """使用指定的端点翻译一批条目（在工作线程中运行）
+        
+        Returns:
+            tuple: (翻译结果或None, 请求信息, 提示词字节数)
+        """
+        to_translate = {item["key"]: item["value"] for item in batch}
+        call_info = {}
+        
+        # 把占位符替换为简短标记，避免AI改动占位符，也减少占位符密集文本的token数
+        masks = {}
+        if self.config.get("mask_placeholders", True):
+            for key, value in to_translate.items():
+                masked, tokens = mask_placeholders(value)
+                if tokens:
+                    to_translate[key] = masked
+                    masks[key] = tokens
+            call_info["masked"] = sum(len(tokens) for tokens in masks.values())
+        
+        # 只加入这批原文中出现的术语
+        glossary_terms = {}
+        if self.glossary:
+            glossary_terms = self.glossary.match([item["value"] for item in batch], self.config.get("glossary_max_terms", 60))
+            call_info["glossary_terms"] = len(glossary_terms)
+        
+        # 翻译记忆中相似原文的已有译文（发送批次时检索），作为示例使译法保持一致
+        examples = self._select_prompt_examples(batch)
+        call_info["examples"] = len(examples)
+        
+        prompt = self._build_translation_prompt(to_translate, glossary_terms, examples)
+        translated_json = self._call_ai_api(prompt, endpoint.api_url, endpoint.api_key, endpoint.model_id, call_info)
+        if not isinstance(translated_json, dict):
+            return None, call_info, len(prompt.encode('utf-8'))
+        
+        # 还原占位符，标记没有原样保留的条目交由调度重新翻译
+        call_info["mask_failures"] = []
+        for key, tokens in masks.items():
+            if key not in translated_json:
+                continue
+            restored = unmask_placeholders(translated_json[key], tokens)
+            if restored is None:
+                call_info["mask_failures"].append(key)
+                del translated_json[key]
+            else:
+                translated_json[key] = restored
+        return translated_json, call_info, len(prompt.encode('utf-8'))
+    
+    def _select_prompt_examples(self, batch):
+        """在翻译记忆中检索一批条目的相似原文，选出加入提示词的翻译示例
+        
+        批中不同的原文超过prompt_examples的两倍时，只均匀地检索其中prompt_examples的两倍条（检索的耗时与批次大小无关）。
+        每条原文取相似度不低于tm_suggest_threshold的几条记录，先取每条原文最相似的一条，再取各条原文的第二条……
+        同一轮中相似度高的优先，最多prompt_examples条，估算的token总数不超过prompt_examples_max_tokens。
+        
+        Returns:
+            dict: 原文 -> 已有译文
+        """
+        limit = self.config.get("prompt_examples", 8)
+        budget = self.config.get("prompt_examples_max_tokens", 400)
+        if not self.memory.loaded or limit <= 0:
+            return {}
+        suggest_threshold = self.config.get("tm_suggest_threshold", 0.4)
+        candidates = []
+        values = list(dict.fromkeys(item["value"] for item in batch))
+        for value in values[::max(1, math.ceil(len(values) / (limit * 2)))]:
+            matches = [match for match in self.memory.search(value, TranslationMemory.SUGGESTIONS) if match[0] >= suggest_threshold]
+            candidates.extend((rank, -score, source, target) for rank, (score, source, target) in enumerate(matches))
+        candidates.sort()
+        
+        examples = {}
+        for _, _, source, target in candidates:
+            if len(examples) >= limit:
+                break
+            cost = estimate_tokens(source) + estimate_tokens(target) + 4
+            if source in examples or cost > budget:
+                continue
+            examples[source] = target
+            budget -= cost
+        return examples
+    
+    def _apply_token_prices(self):
+        """把配置的token价格应用到运行统计，用于估算费用"""
+        self.metrics.token_prices = {
+            "prompt_tokens": float(self.config.get("token_price_input", 0) or 0),
+            "completion_tokens": float(self.config.get("token_price_output", 0) or 0)
+        }
+    
+    def _build_translation_prompt(self, to_translate, glossary_terms=None, examples=None):
+        """构建AI翻译的提示词
+        
+        Args:
+            to_translate: 待翻译的条目
+            glossary_terms: 本批原文中出现的术语及其固定译法
+            examples: 与本批原文相似的已有原文及其译文
+        """
         prompt = """你是一个专业的Minecraft模组翻译专家，精通中英文翻译。请将以下Minecraft模组中的英文文本翻译成简体中文。
 
 要求：
 1. 保持专业游戏术语的准确性，使用Minecraft中文社区常用的翻译
-2. 保留所有占位符（如%s, %d, %1$s等）和格式代码（如§a, §b等）
+2. 保留所有占位符（如%s, %d, %1$s等）、格式代码（如§a, §b等）和<0>、<1>形式的标记，标记可以按中文语序调整位置，但不能增删或修改
 3. 保留原文中的标点符号风格
 4. 直接输出JSON格式的翻译结果，不要有任何解释或额外文本
 5. 保持键名不变，只翻译值
 6. 不要翻译专有名词、命令和变量名
 7. 对于不确定的专有名词，保留英文原文
-
+"""
+        
+        # 添加本批用到的术语
+        if glossary_terms:
+            prompt += "8. 以下术语必须使用指定的译法（复数形式同样适用）：\n"
+            prompt += "\n".join(f"   - {source} → {target}" for source, target in glossary_terms.items())
+            prompt += "\n"
+        
+        # 相似原文的已有译文作为示例
+        if examples:
+            prompt += f"{9 if glossary_terms else 8}. 以下是与本批内容相似的已有翻译示例，相同的词语和句式请使用一致的译法：\n"
+            prompt += "\n".join(f"   - {json.dumps(source, ensure_ascii=False)} → {json.dumps(target, ensure_ascii=False)}"
+                                 for source, target in examples.items())
+            prompt += "\n"
+        
+        prompt += """
 以下是需要翻译的内容（JSON格式）：
 """
         
@@ -1343,22 +4519,38 @@ class ModTranslator:
         
         return prompt
     
-    def _call_ai_api(self, prompt, api_url, api_key, model_id):
-        """调用AI API进行翻译"""
+    def _call_ai_api(self, prompt, api_url, api_key, model_id, call_info=None):
+        """调用AI API进行翻译
+        
+        Args:
+            prompt: 提示词
+            api_url: API地址
+            api_key: API密钥
+            model_id: 模型ID
+            call_info: 可选的字典，用于返回本次请求的usage、finish_reason和latency
+            
+        Returns:
+            dict: 翻译结果，失败时返回None
+        """
+        if call_info is None:
+            call_info = {}
         try:
-            print(f"使用模型: {model_id}")
-            print(f"API URL: {api_url}")
+            openai = _import_optional("openai")
+            if openai is None:
+                return None
             
-            # 创建OpenAI客户端
-            client = OpenAI(
+            # 创建OpenAI客户端（重试由翻译调度统一处理，以便按限流情况调整并发）
+            client = openai.OpenAI(
                 api_key=api_key,
-                base_url=api_url
+                base_url=api_url,
+                max_retries=0
             )
             
             # 构建系统提示和用户提示
             system_message = "你是一个专业的Minecraft模组翻译助手，只输出翻译后的JSON格式内容，不包含任何其他文字。"
             
             # 发送请求
+            request_start = time.perf_counter()
             try:
                 completion = client.chat.completions.create(
                     model=model_id,
@@ -1370,8 +4562,19 @@ class ModTranslator:
                     response_format={"type": "json_object"}  # 强制输出JSON格式
                 )
                 
+                # 记录请求延迟和token用量
+                usage = getattr(completion, "usage", None)
+                call_info["latency"] = time.perf_counter() - request_start
+                call_info["usage"] = {
+                    "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+                    "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+                    "total_tokens": getattr(usage, "total_tokens", 0) or 0
+                } if usage else None
+                call_info["finish_reason"] = completion.choices[0].finish_reason
+                self.metrics.record_api_call(call_info["latency"], usage=call_info["usage"])
+                
                 # 提取响应内容
-                content = completion.choices[0].message.content
+                content = completion.choices[0].message.content or ""
                 
                 # 尝试解析JSON内容
                 try:
@@ -1384,11 +4587,20 @@ class ModTranslator:
                     translated_json = json.loads(content)
                     return translated_json
                 except json.JSONDecodeError:
+                    if call_info["finish_reason"] == "length":
+                        print("警告: AI返回的内容因长度限制被截断")
+                        return None
                     print("警告: 无法解析AI返回的JSON内容")
                     print(f"返回内容: {content[:200]}...")
                     return None
                 
             except Exception as api_error:
+                call_info["latency"] = time.perf_counter() - request_start
+                call_info["error"] = str(api_error)
+                call_info["status_code"] = getattr(api_error, "status_code", None)
+                response = getattr(api_error, "response", None)
+                call_info["retry_after"] = parse_retry_after(getattr(response, "headers", None))
+                self.metrics.record_api_call(call_info["latency"], success=False)
                 print(f"API调用错误: {str(api_error)}")
                 return None
                 
@@ -1398,21 +4610,8 @@ class ModTranslator:
     
     def merge_translations(self):
         """合并翻译结果，生成最终的zh_cn.json文件"""
-        if not os.path.exists(self.fanyi_ok_dir):
-            print("错误: 翻译结果文件夹不存在，请先完成翻译")
-            return False
-        
-        # 加载索引文件
-        index_path = os.path.join(self.fanyi_dir, "index.json")
-        if not os.path.exists(index_path):
-            print("错误: 索引文件不存在")
-            return False
-        
-        try:
-            with open(index_path, 'r', encoding='utf-8') as f:
-                index = json.load(f)
-        except Exception as e:
-            print(f"错误: 无法读取索引文件: {str(e)}")
+        if not self.store.exists():
+            print("错误: 翻译工作数据库不存在，请先处理mod文件并完成翻译")
             return False
         
         print("\n=== 开始合并翻译结果 ===")
@@ -1422,7 +4621,8 @@ class ModTranslator:
             "total_paths": 0,
             "merged_paths": 0,
             "total_keys": 0,
-            "merged_keys": 0
+            "merged_keys": 0,
+            "memory_pairs": 0
         }
         
         # 清空并创建输出目录
@@ -1431,59 +4631,44 @@ class ModTranslator:
         os.makedirs(self.output_dir, exist_ok=True)
         
         # 遍历每个翻译路径
-        for path_info in index.get("paths", []):
-            rel_path = path_info.get("path")
-            split_files = path_info.get("split_files", [])
+        for path_id, rel_path, _ in self.store.paths():
+            with self.metrics.stage("merge") as counters:
+                merged_data = self.store.path_results(path_id)
+                pending = self.store.status_counts(path_id).get(WorkStore.PENDING, 0)
+                counters["entries"] += len(merged_data)
             
-            if not rel_path or not split_files:
+            if not merged_data and not pending:
                 continue
-            
             stats["total_paths"] += 1
+            stats["total_keys"] += len(merged_data) + pending
             
-            # 源文件夹和目标文件夹
-            source_dir = os.path.join(self.fanyi_ok_dir, rel_path)
-            if not os.path.exists(source_dir):
-                print(f"警告: 翻译结果文件夹不存在: {rel_path}")
-                continue
-            
-            # 创建输出目录
-            output_path = os.path.join(self.output_dir, rel_path)
-            os.makedirs(output_path, exist_ok=True)
-            
-            # 合并所有分割文件
-            merged_data = {}
-            missing_files = []
-            
-            for file_name in split_files:
-                file_path = os.path.join(source_dir, file_name)
-                if os.path.exists(file_path):
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            merged_data.update(data)
-                            stats["total_keys"] += len(data)
-                    except Exception as e:
-                        print(f"警告: 无法读取文件 {file_path}: {str(e)}")
-                else:
-                    missing_files.append(file_name)
-            
-            if missing_files:
-                print(f"警告: 路径 {rel_path} 中有 {len(missing_files)} 个文件未找到翻译结果")
-                for file in missing_files[:5]:  # 只显示前5个
-                    print(f"  - {file}")
-                if len(missing_files) > 5:
-                    print(f"  - ... 等 {len(missing_files) - 5} 个文件")
+            if pending:
+                print(f"警告: 路径 {rel_path} 中有 {pending} 个条目尚未翻译")
             
             if merged_data:
                 # 写入合并后的zh_cn.json
+                output_path = os.path.join(self.output_dir, rel_path)
+                os.makedirs(output_path, exist_ok=True)
                 output_file = os.path.join(output_path, "zh_cn.json")
                 with open(output_file, 'w', encoding='utf-8') as f:
                     json.dump(merged_data, f, ensure_ascii=False, indent=4)
                 
+                # 更新原文快照，mod更新后原文未变化的条目可以沿用本次的翻译
+                if self.config.get("incremental_retranslation", True):
+                    self._update_snapshot(rel_path, self.store.path_sources(path_id), merged_data)
+                
                 stats["merged_paths"] += 1
                 stats["merged_keys"] += len(merged_data)
                 print(f"成功合并路径 {rel_path} 的翻译结果，共 {len(merged_data)} 个条目")
         
+        # 把译文和已有的中文加入翻译记忆
+        if self.config.get("translation_memory", True):
+            try:
+                stats["memory_pairs"] += self.memory.add(self.store.memory_pairs())
+            except Exception as e:
+                print(f"警告: 更新翻译记忆时出错: {str(e)}")
+            self.memory.unload()
+        
         # 复制根目录下的app文件夹内容到输出目录
         self._copy_app_content_to_output()
         
@@ -1493,6 +4678,8 @@ class ModTranslator:
         print(f"成功合并: {stats['merged_paths']} 个路径")
         print(f"总条目数: {stats['total_keys']}")
         print(f"合并条目: {stats['merged_keys']} 个")
+        if stats["memory_pairs"]:
+            print(f"翻译记忆: 加入或更新了 {stats['memory_pairs']} 条记录")
         
         if stats['merged_paths'] > 0:
             print(f"\n合并结果已保存到 {self.output_dir}")
@@ -1502,6 +4689,17 @@ class ModTranslator:
             if zip_result:
                 print(f"已将输出内容打包为: {zip_result}")
             
+            # 在资源包旁边写入运行报告
+            self._apply_token_prices()
+            self.metrics.print_summary()
+            self.metrics.save(self.metrics_path)
+            report_name = f"{os.path.splitext(zip_result)[0]}.report" if zip_result else f"运行报告_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            try:
+                report_paths = self.metrics.write_report(os.getcwd(), report_name, self.config.get("metrics_prometheus", False))
+                print(f"运行报告已保存到: {', '.join(os.path.basename(path) for path in report_paths)}")
+            except Exception as e:
+                print(f"写入运行报告时出错: {str(e)}")
+            
             print("你可以将翻译资源包加到游戏中，或者复制到mod的assets目录中")
             return True
         else:
@@ -1551,7 +4749,7 @@ class ModTranslator:
             print(f"输出文件: {zip_filename}")
             
             # 创建ZIP文件
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            with self.metrics.stage("zip") as counters, zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
                 # 获取输出目录的绝对路径
                 abs_output_dir = os.path.abspath(self.output_dir)
                 
@@ -1575,6 +4773,8 @@ class ModTranslator:
                         # 添加到ZIP
                         zipf.write(file_path, zip_path)
                         file_count += 1
+                        counters["bytes"] += os.path.getsize(file_path)
+                        counters["entries"] += 1
             
             print(f"打包完成，共添加 {file_count} 个文件")
             return zip_filename
@@ -1589,6 +4789,14 @@ def main_menu():
     
     while True:
         try:
+            # 后台检查发现新版本时提示（或按配置自动更新）
+            pending_update = translator.update_checker.take_pending_update()
+            if pending_update:
+                if translator.config.get('auto_update', False):
+                    check_for_updates(auto_update=True, version_info=pending_update)
+                else:
+                    print(f"\n提示: 发现新版本 {pending_update.get('version')}（当前 {VERSION_INFO['version']}），可选择 8 查看并更新")
+            
             print("\n=== Minecraft Mod 汉化工具 ===")
             print(f"版本: {VERSION_INFO['version']} ({VERSION_INFO['release_date']})")
             print("1. 选择mod文件")
@@ -1599,9 +4807,12 @@ def main_menu():
             print("6. 清理临时文件夹")
             print("7. 修改配置")
             print("8. 检查更新")
+            print("9. 监视mods文件夹（增量处理）")
+            print("s. 查看翻译进度")
+            print("e. 估算翻译用量（不发送请求）")
             print("0. 退出程序")
             
-            choice = input("\n请选择操作 [0-8]: ").strip()
+            choice = input("\n请选择操作 [0-9/s/e]: ").strip().lower()
             
             if choice == '0':
                 print("正在退出程序...")
@@ -1629,7 +4840,13 @@ def main_menu():
                 # 检查更新
                 print("\n=== 检查更新 ===")
                 auto_update = translator.config.get('auto_update', False)
-                check_for_updates(auto_update=auto_update)
+                check_for_updates(auto_update=auto_update, cache_path=translator.update_cache_path)
+            elif choice == '9':
+                translator.watch_mods_interactively()
+            elif choice == 's':
+                translator.show_work_status()
+            elif choice == 'e':
+                translator.estimate_translation()
             else:
                 print("无效的选择，请重试")
         except KeyboardInterrupt:
@@ -1639,24 +4856,47 @@ def main_menu():
             print(f"\n发生错误: {str(e)}")
             print("请重试或退出程序")
 
+def run_command(argv):
+    """命令行模式（不显示主菜单）
+    
+    python mod_translator.py worker [--db 路径] [--wait 秒数]
+        作为翻译工作进程运行，可以在多台机器上同时运行，共用同一个工作数据库
+    python mod_translator.py estimate [--db 路径]
+        估算翻译等待翻译的条目所需的请求数、token数、时间和费用，不发送请求
+    
+    Returns:
+        int: 退出码
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog="mod_translator.py", description="Minecraft Mod 汉化工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    worker_parser = subparsers.add_parser("worker", help="作为翻译工作进程运行，从工作数据库领取等待翻译的条目")
+    worker_parser.add_argument("--db", help="工作数据库路径（默认为TEMP目录下的work.db，可以是网络共享驱动器上的文件）")
+    worker_parser.add_argument("--wait", type=float, default=0,
+                               help="没有可领取的条目时继续等待的秒数，用于收回已退出的工作进程的条目（默认不等待）")
+    estimate_parser = subparsers.add_parser("estimate", help="估算翻译所需的请求数、token数、时间和费用（不发送请求）")
+    estimate_parser.add_argument("--db", help="工作数据库路径（默认为TEMP目录下的work.db）")
+    args = parser.parse_args(argv)
+    
+    # 只需要配置和工作数据库：不创建TEMP目录，也不在后台检查更新
+    config = Config()
+    db_path = os.path.abspath(args.db) if args.db else os.path.join(os.getcwd(), "TEMP", "work.db")
+    translator = ModTranslator(config, WorkStore(db_path, "DELETE" if config.get("shared_work_db", False) else "WAL"))
+    try:
+        if args.command == "estimate":
+            return 0 if translator.estimate_translation() else 1
+        return 0 if translator.run_worker(wait=args.wait) else 1
+    finally:
+        translator.store.close()
+
 if __name__ == "__main__":
     print("欢迎使用 Minecraft Mod 汉化工具")
     print(f"版本: {VERSION_INFO['version']} ({VERSION_INFO['release_date']})")
     
-    # 如果配置允许，在启动时检查更新
-    if REQUESTS_AVAILABLE:
-        # 尝试加载配置以获取auto_update设置
-        try:
-            config = Config()
-            auto_update = config.get('auto_update', False)
-            print("正在检查更新...")
-            check_for_updates(auto_update=auto_update)
-        except Exception as e:
-            print(f"检查更新时出错: {str(e)}")
-            # 如果配置加载失败，仍然检查更新但不自动更新
-            print("正在检查更新...")
-            check_for_updates()
+    if len(sys.argv) > 1:
+        sys.exit(run_command(sys.argv[1:]))
     
+    # 更新检查在ModTranslator中于后台进行，不阻塞主菜单
     try:
         main_menu()
     except Exception as e: